@@ -0,0 +1,60 @@
+"""
+Cache HTTP conditionnel (ETag / Last-Modified) des pages et API d'inventaire.
+
+L'ETag dérive de la version monotone du stockage (``inventory_version``) et
+de la version de l'application: une requête ``If-None-Match`` qui
+correspond reçoit un 304 avant tout chargement ou rendu. Seul l'ETag
+décide du 304 (``Last-Modified`` est à la seconde près, trop grossier pour
+des écritures rapprochées).
+
+Les pages qui affichent aussi les agrégats de capacité (interfaces et
+débits collectés compris) utilisent ``conditional_on(capacity_etag)``.
+"""
+from functools import wraps
+from typing import Callable
+
+from flask import make_response, request
+
+from app import app
+from app.inventory.store import inventory_last_modified, inventory_version
+
+
+def inventory_etag() -> str:
+    """Valeur d'ETag (faible) de l'état courant de l'inventaire."""
+    return f"inv-{app.config.get('VERSION', '0')}-{inventory_version()}"
+
+
+def capacity_etag() -> str:
+    """ETag de l'inventaire complété par l'état des agrégats de capacité (interfaces, débits)."""
+    from app.inventory.rollups import get_rollups
+
+    return f"{inventory_etag()}-cap{get_rollups().etag()}"
+
+
+def conditional_on(etag_func: Callable[[], str]) -> Callable[[Callable], Callable]:
+    """
+    Décorateur de vue GET: répond 304 si le client possède déjà l'ETag ``etag_func()``
+    courant, sinon ajoute ``ETag``, ``Last-Modified`` et ``Cache-Control: no-cache``
+    (revalidation systématique) aux réponses 200.
+    """
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = etag_func()
+            if request.if_none_match.contains_weak(etag):
+                resp = app.response_class(status=304)
+                resp.set_etag(etag, weak=True)
+                return resp
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code == 200:
+                resp.set_etag(etag, weak=True)
+                resp.last_modified = inventory_last_modified() or None
+                resp.cache_control.no_cache = True
+            return resp
+        return wrapper
+    return decorator
+
+
+def conditional_on_inventory(view: Callable) -> Callable:
+    """Voir ``conditional_on``, avec l'ETag de la version de l'inventaire."""
+    return conditional_on(inventory_etag)(view)
@@ -1,11 +1,116 @@
 """
 Module de consolidation d'inventaire et d'utilisation
+
+Jointure par hachage des interfaces sur les équipements: un premier passage
+sur les interfaces construit un index ``equipment_id`` -> totaux de ports
+(ports, actifs/inactifs, capacité, débit utilisé, pic d'utilisation), puis
+les équipements sont parcourus en flux et chaque ligne consolidée est
+produite par un générateur. La mémoire est proportionnelle au nombre
+d'équipements ayant des interfaces, jamais au nombre d'interfaces ni à la
+vue consolidée complète.
 """
-from app.inventory.models import Equipment
-from app.inventory.interfaces import Interface
-
-def consolidate_inventory():
-    equipments = Equipment.query.all()
-    interfaces = Interface.query.all()
-    # Placeholder: logique de consolidation à compléter
-    return equipments, interfaces
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Iterable, Iterator, Mapping, Optional
+
+from app.inventory.interface_store import iter_interfaces
+from app.inventory.rollups import get_rollups
+from app.inventory.store import iter_inventory
+from app.inventory.utilization import interface_key
+
+# Statuts (minuscules) d'une interface en service: ``Interface.status`` ou ifOperStatus
+ACTIVE_STATUSES = ('active', 'up')
+# Colonnes ajoutées à chaque équipement par ``consolidate_inventory``
+CONSOLIDATED_COLUMNS = ['ports', 'active_ports', 'inactive_ports', 'capacity_bps', 'used_bps',
+                        'utilization', 'peak_utilization']
+
+
+@dataclass
+class PortTotals:
+    """Totaux des interfaces d'un équipement, accumulés pendant la construction de l'index."""
+    ports: int = 0
+    active: int = 0
+    capacity_bps: float = 0.0
+    used_bps: float = 0.0
+    peak_utilization: Optional[float] = None
+
+    def add(self, speed: float, active: bool, used: Optional[float]) -> None:
+        self.ports += 1
+        self.active += active
+        self.capacity_bps += speed
+        if used is not None:
+            self.used_bps += used
+            if speed > 0:
+                utilization = 100.0 * used / speed
+                if self.peak_utilization is None or utilization > self.peak_utilization:
+                    self.peak_utilization = utilization
+
+    def columns(self) -> Dict[str, Any]:
+        """Valeurs de ``CONSOLIDATED_COLUMNS`` (utilisations en %, arrondies; None sans capacité ni mesure)."""
+        utilization = round(100.0 * self.used_bps / self.capacity_bps, 2) if self.capacity_bps else None
+        peak = None if self.peak_utilization is None else round(self.peak_utilization, 2)
+        return {'ports': self.ports, 'active_ports': self.active, 'inactive_ports': self.ports - self.active,
+                'capacity_bps': self.capacity_bps, 'used_bps': self.used_bps,
+                'utilization': utilization, 'peak_utilization': peak}
+
+
+def _join_key(value: Any) -> Any:
+    """Clé de jointure: les ID numériques lus sous forme de texte (imports Excel) deviennent entiers."""
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return value
+
+
+def _number(value: Any) -> float:
+    try:
+        return max(float(value or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def build_port_index(interfaces: Iterable[Mapping[str, Any]],
+                     usage: Optional[Mapping[Hashable, float]] = None) -> Dict[Any, PortTotals]:
+    """
+    Côté construction de la jointure: un passage sur les interfaces, totaux par ``equipment_id``.
+    Args:
+        interfaces: interfaces (champs de ``Interface``).
+        usage: débit courant (bit/s) par clé ``interface_key`` ((équipement, ifIndex)).
+    """
+    index: Dict[Any, PortTotals] = {}
+    for interface in interfaces:
+        equip_id = _join_key(interface.get('equipment_id'))
+        totals = index.get(equip_id)
+        if totals is None:
+            totals = index[equip_id] = PortTotals()
+        used = usage.get((equip_id, interface_key(interface)[1])) if usage else None
+        status = str(interface.get('status') or '').strip().lower()
+        totals.add(_number(interface.get('speed')), status in ACTIVE_STATUSES, used)
+    return index
+
+
+def consolidate_inventory(equipment: Optional[Iterable[Mapping[str, Any]]] = None,
+                          interfaces: Optional[Iterable[Mapping[str, Any]]] = None,
+                          usage: Optional[Mapping[Hashable, float]] = None,
+                          orphans: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Vue consolidée équipements + interfaces, produite ligne par ligne.
+
+    Args:
+        equipment: équipements (``iter_inventory()`` par défaut), parcourus en flux.
+        interfaces: interfaces (``iter_interfaces()`` par défaut), lues une fois pour l'index.
+        usage: débits courants par interface (par défaut ceux remontés par la collecte
+            dans les agrégats de capacité de ce processus).
+        orphans: produire aussi, en fin de flux, une ligne par ``equipment_id`` d'interfaces
+            absent de l'inventaire (``{'id': ..., 'orphan': True, ...}``).
+    Yields:
+        dict: champs de l'équipement et ``CONSOLIDATED_COLUMNS`` (0 port si aucune interface).
+    """
+    if usage is None:
+        usage = get_rollups().port_usage()
+    index = build_port_index(iter_interfaces() if interfaces is None else interfaces, usage)
+    for item in (iter_inventory() if equipment is None else equipment):
+        # Chaque entrée de l'index est consommée une fois: il ne reste à la fin que les orphelines
+        totals = index.pop(_join_key(item.get('id')), None) or PortTotals()
+        yield {**item, **totals.columns()}
+    if orphans:
+        for equip_id, totals in index.items():
+            yield {'id': equip_id, 'orphan': True, **totals.columns()}
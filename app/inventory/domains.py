@@ -1,15 +1,53 @@
 """
 Module d'organisation par domaine réseau
+
+Le domaine d'un équipement est son champ ``domain`` s'il est renseigné,
+sinon déduit de mots-clés du nom, du type ou de la localisation
+(``DOMAIN_KEYWORDS``). ``organize_by_domain`` lit les agrégats matérialisés
+de ``app.inventory.rollups`` au lieu de parcourir l'inventaire.
 """
-from app.inventory.models import Equipment
-
-def organize_by_domain():
-    # Placeholder: logique d'organisation à compléter
-    # Exemple: LAN, Backbone, Datacenter, Fabric IP, Cœur Internet
-    return {
-        'LAN': [],
-        'Backbone': [],
-        'Datacenter': [],
-        'Fabric IP': [],
-        'Cœur Internet': []
-    }
+import re
+from typing import Any, Dict, Mapping
+
+# Domaines réseau présentés, dans l'ordre d'affichage
+DOMAINS = ('LAN', 'Backbone', 'Datacenter', 'Fabric IP', 'Cœur Internet')
+UNCLASSIFIED = 'Non classé'
+
+# Mots-clés (minuscules) reconnus dans le nom, le type ou la localisation, non collés à d'autres lettres
+DOMAIN_KEYWORDS = {
+    'Cœur Internet': ('cœur internet', 'coeur internet', 'internet', 'peering', 'transit'),
+    'Fabric IP': ('fabric', 'fabric ip', 'spine', 'leaf'),
+    'Datacenter': ('datacenter', 'data center', 'datacentre'),
+    'Backbone': ('backbone', 'bbip', 'mpls', 'asbr'),
+    'LAN': ('lan', 'campus', 'agence', 'accès', 'acces', 'access'),
+}
+_DOMAIN_PATTERNS = {domain: re.compile(r'(?<![^\W\d_])(?:' + '|'.join(map(re.escape, words)) + r')(?![^\W\d_])')
+                    for domain, words in DOMAIN_KEYWORDS.items()}
+_CANONICAL = {d.lower(): d for d in DOMAINS}
+
+
+def domain_of(item: Mapping[str, Any]) -> str:
+    """Domaine d'un équipement: champ ``domain`` explicite, sinon mots-clés, sinon ``UNCLASSIFIED``."""
+    explicit = str(item.get('domain') or '').strip()
+    if explicit:
+        return _CANONICAL.get(explicit.lower(), explicit)
+    text = ' '.join(str(item.get(k) or '') for k in ('name', 'type', 'location')).lower()
+    for domain, pattern in _DOMAIN_PATTERNS.items():
+        if pattern.search(text):
+            return domain
+    return UNCLASSIFIED
+
+
+def organize_by_domain() -> Dict[str, Dict[str, Any]]:
+    """
+    Agrégats de capacité par domaine (équipements, ports, capacité, EoS), lus en O(1)
+    dans les agrégats matérialisés; les domaines de ``DOMAINS`` sont toujours présents.
+    Returns:
+        dict: domaine -> ``devices``, ``eos``, ``ports``, ``capacity_bps``, ``used_bps``, ``utilization``.
+    """
+    from app.inventory.rollups import empty_rollup, get_rollups
+
+    groups = get_rollups().rollup('domain')
+    result = {domain: groups.pop(domain, empty_rollup()) for domain in DOMAINS}
+    result.update(groups)
+    return result
@@ -0,0 +1,186 @@
+"""
+Pipeline d'import Excel en flux (openpyxl ``read_only``), commun aux imports
+d'équipements et d'interfaces.
+
+Les lignes sont lues une à une, associées aux champs via leurs en-têtes
+(casse, accents et espaces ignorés), validées par lots puis écrites dans un
+fichier tampon NDJSON. Une fois la feuille entièrement lue, le tampon est
+appliqué au stockage par lots de ``batch_size`` (``apply_mutations``), dont
+les résultats sont comptés au fil de l'eau: la mémoire reste constante quel
+que soit le nombre de lignes, et le verrou d'écriture n'est tenu que pendant
+l'application de chaque lot, jamais pendant la lecture du classeur.
+"""
+from __future__ import annotations
+
+import json
+import tempfile
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+try:
+    import openpyxl
+except Exception:  # keep offline even if openpyxl missing
+    openpyxl = None
+
+# Nombre de lignes validées entre deux rapports de progression
+IMPORT_BATCH_SIZE = 1000
+# Nombre maximal d'erreurs détaillées conservées dans le rapport
+MAX_REPORTED_ERRORS = 1000
+
+Record = Tuple[int, Dict[str, Any]]
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+def normalize_header(value: Any) -> str:
+    """Normalise un en-tête: minuscules, sans accents ni espaces superflus (« Modèle » -> « modele »)."""
+    text = unicodedata.normalize('NFKD', str(value or ''))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().replace('_', ' ').split())
+
+
+def cell_text(value: Any) -> str:
+    """Valeur de cellule en texte (les flottants entiers perdent leur « .0 »)."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def cell_int(value: Any, field: str, minimum: Optional[int] = None) -> Optional[int]:
+    """
+    Valeur de cellule en entier (None si vide).
+    Raises:
+        ValueError: valeur non entière ou inférieure à ``minimum``.
+    """
+    text = cell_text(value)
+    if not text:
+        return None
+    try:
+        number = int(text)
+    except ValueError:
+        try:
+            number = float(text)
+        except ValueError:
+            number = None
+        # « 12.0 » est accepté, « 1.5 » n'est pas tronqué en 1
+        if number is None or not number.is_integer():
+            raise ValueError(f'{field}: entier attendu, reçu {text!r}')
+        number = int(number)
+    if minimum is not None and number < minimum:
+        raise ValueError(f'{field}: doit être >= {minimum}')
+    return number
+
+
+def read_sheet(fichier_excel: str, header_map: Mapping[str, str],
+               sheet_name: Optional[str] = None) -> Tuple[Optional[int], Iterator[Record]]:
+    """
+    Ouvre une feuille en lecture seule et en flux.
+
+    Args:
+        fichier_excel: chemin du classeur.
+        header_map: en-tête normalisé (voir ``normalize_header``) -> champ cible.
+        sheet_name: feuille à lire (feuille active par défaut).
+    Returns:
+        tuple: (nombre estimé de lignes de données ou None, itérateur de
+        (numéro de ligne Excel, {champ: valeur})). Le classeur est fermé en fin de parcours.
+    Raises:
+        RuntimeError: openpyxl absent.
+        ValueError: feuille introuvable ou aucun en-tête reconnu.
+    """
+    if openpyxl is None:
+        raise RuntimeError("import Excel indisponible (openpyxl manquant)")
+    wb = openpyxl.load_workbook(fichier_excel, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.active
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        columns = [(i, header_map[normalize_header(h)]) for i, h in enumerate(header)
+                   if normalize_header(h) in header_map]
+        if not columns:
+            raise ValueError('aucun en-tête reconnu dans la première ligne')
+    except Exception:
+        wb.close()
+        raise
+    total = ws.max_row - 1 if ws.max_row else None
+
+    def records() -> Iterator[Record]:
+        try:
+            for row_number, row in enumerate(rows, start=2):
+                values = {field: row[i] if i < len(row) else None for i, field in columns}
+                if all(v is None or cell_text(v) == '' for v in values.values()):
+                    continue
+                yield row_number, values
+        finally:
+            wb.close()
+
+    return total, records()
+
+
+def run_import(records: Iterable[Record],
+               validate: Callable[[Dict[str, Any]], Dict[str, Any]],
+               apply: Callable[[Iterable[Any]], List[Dict[str, Any]]],
+               total: Optional[int] = None,
+               batch_size: int = IMPORT_BATCH_SIZE,
+               progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    Valide les lignes par lots puis les ajoute au stockage par lots de ``batch_size``.
+
+    Args:
+        records: (numéro de ligne, valeurs) produits par ``read_sheet``.
+        validate: valeurs -> données de l'enregistrement (ValueError si ligne invalide).
+        apply: fonction de type ``apply_mutations``.
+        total: nombre estimé de lignes (transmis à ``progress``).
+        batch_size: lignes par lot de validation et d'application.
+        progress: appelée avec (lignes lues, total) après chaque lot.
+    Returns:
+        dict: ``rows`` lues, ``imported``, ``rejected`` et ``errors``
+        (``{'row', 'error'}``, au plus ``MAX_REPORTED_ERRORS``).
+    """
+    report: Dict[str, Any] = {'rows': 0, 'imported': 0, 'rejected': 0, 'errors': []}
+
+    def reject(row_number: Optional[int], message: str) -> None:
+        report['rejected'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': row_number, 'error': message})
+
+    def fold(rows: List[int], operations: List[Dict[str, Any]]) -> None:
+        for row_number, result in zip(rows, apply(operations)):
+            if result.get('ok'):
+                report['imported'] += 1
+            else:
+                reject(row_number, result.get('error', 'rejeté'))
+
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as spool:
+        pending = 0
+        for row_number, values in records:
+            report['rows'] += 1
+            pending += 1
+            try:
+                data = validate(values)
+            except ValueError as exc:
+                reject(row_number, str(exc))
+            else:
+                line = [row_number, {'op': 'add', 'data': data}]
+                spool.write(json.dumps(line, ensure_ascii=False, default=str) + '\n')
+            if pending >= batch_size:
+                pending = 0
+                if progress:
+                    progress(report['rows'], total)
+        if progress and pending:
+            progress(report['rows'], total)
+
+        # Application par lots: ni les opérations ni leurs résultats ne sont gardés pour toute la feuille
+        spool.seek(0)
+        rows: List[int] = []
+        operations: List[Dict[str, Any]] = []
+        for line in spool:
+            row_number, operation = json.loads(line)
+            rows.append(row_number)
+            operations.append(operation)
+            if len(operations) >= batch_size:
+                fold(rows, operations)
+                rows, operations = [], []
+        if operations:
+            fold(rows, operations)
+    return report
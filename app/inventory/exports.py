@@ -0,0 +1,159 @@
+"""
+Exports de l'inventaire (offline) produits en flux.
+
+CSV : les lignes sont sérialisées au fil de l'eau depuis ``iter_inventory``
+et envoyées par blocs: la mémoire reste bornée et le premier octet part
+immédiatement, quelle que soit la taille de l'inventaire.
+
+XLSX : classeur construit en mode ``write_only`` d'openpyxl dans un fichier
+temporaire « spooled », puis conservé sur disque sous la version courante
+de l'inventaire: tant que l'inventaire ne change pas, les téléchargements
+suivants servent ce fichier sans le régénérer.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import os
+import shutil
+import tempfile
+import zlib
+from io import StringIO
+from typing import IO, Any, Callable, Iterable, Iterator, Mapping, Sequence, Union
+
+try:
+    import openpyxl
+except Exception:  # keep offline even if openpyxl missing
+    openpyxl = None
+
+from app.inventory.store import get_backend
+
+# Nombre de lignes CSV regroupées par bloc envoyé au client
+CSV_ROWS_PER_CHUNK = 500
+
+# Taille au-delà de laquelle le classeur en construction passe de la mémoire au disque
+XLSX_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def iter_csv(items: Iterable[Mapping[str, Any]], columns: Sequence[str],
+             rows_per_chunk: int = CSV_ROWS_PER_CHUNK) -> Iterator[str]:
+    """
+    Produit le CSV (en-tête puis lignes) par blocs de texte.
+    Args:
+        items: équipements à exporter.
+        columns: colonnes à écrire, dans l'ordre.
+        rows_per_chunk: nombre de lignes par bloc produit.
+    """
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    pending = 0
+    for it in items:
+        writer.writerow([it.get(k, '') for k in columns])
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    yield buf.getvalue()
+
+
+def gzip_stream(chunks: Iterable[str], encoding: str = 'utf-8', level: int = 6) -> Iterator[bytes]:
+    """Compresse un flux de blocs texte au format gzip, bloc par bloc."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode(encoding))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def build_xlsx(items: Iterable[Mapping[str, Any]], columns: Sequence[str], fileobj: IO[bytes]) -> None:
+    """Écrit le classeur (une feuille « Inventaire ») ligne par ligne en mode write-only."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Inventaire')
+    ws.append(list(columns))
+    for it in items:
+        ws.append([it.get(k, '') for k in columns])
+    wb.save(fileobj)
+
+
+def export_cache_dir() -> str:
+    """Dossier des exports mis en cache, à côté du stockage de l'inventaire."""
+    return os.path.join(os.path.dirname(get_backend().path) or '.', 'export-cache')
+
+
+def cached_xlsx(version: int, columns: Sequence[str],
+                items_factory: Callable[[], Iterable[Mapping[str, Any]]],
+                cache_dir: str = '') -> Union[str, IO[bytes]]:
+    """
+    Retourne l'export XLSX correspondant à ``version`` de l'inventaire.
+
+    Args:
+        version: version de l'inventaire (lue avant de parcourir les données).
+        columns: colonnes exportées (font partie de la clé de cache).
+        items_factory: fournit les équipements, appelé seulement si le cache est absent.
+        cache_dir: dossier du cache (``export_cache_dir()`` par défaut).
+    Returns:
+        str | IO[bytes]: chemin du fichier en cache, ou à défaut (dossier non
+        inscriptible) le fichier temporaire positionné au début.
+    """
+    cache_dir = cache_dir or export_cache_dir()
+    # Plusieurs inventaires peuvent partager un dossier: le nom du fichier source fait partie de la clé
+    stem = os.path.splitext(os.path.basename(get_backend().path))[0]
+    columns_key = hashlib.sha1(','.join(columns).encode('utf-8')).hexdigest()[:8]
+    prefix = f'{stem}@{version}@'
+    path = os.path.join(cache_dir, f'{prefix}{columns_key}.xlsx')
+    if os.path.exists(path):
+        return path
+
+    spool = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_MAX_SIZE)
+    build_xlsx(items_factory(), columns, spool)
+    spool.seek(0)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.inventory-', suffix='.tmp', dir=cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(spool, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            # Le nettoyage ci-dessous ne vise que les exports terminés: ne pas laisser le temporaire
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+    except OSError:
+        spool.seek(0)
+        return spool
+    spool.close()
+    _prune_exports(cache_dir, stem, version)
+    return path
+
+
+def _prune_exports(cache_dir: str, stem: str, version: int) -> None:
+    """Supprime les exports des versions antérieures à la précédente.
+
+    La version précédente est conservée: une requête concurrente peut avoir
+    reçu son chemin sans l'avoir encore ouvert.
+    """
+    versions = {}
+    for name in os.listdir(cache_dir):
+        parts = name.split('@')
+        if len(parts) != 3 or parts[0] != stem:
+            continue
+        try:
+            versions.setdefault(int(parts[1]), []).append(name)
+        except ValueError:
+            continue
+    older = sorted(v for v in versions if v < version)
+    for stale in older[:-1]:
+        for name in versions[stale]:
+            try:
+                os.unlink(os.path.join(cache_dir, name))
+            except OSError:
+                pass
@@ -1,24 +1,64 @@
-import pandas as pd
-from app.inventory.models import Equipment
-from app import db
-
-def importer_equipements_depuis_excel(fichier_excel):
-    df = pd.read_excel(fichier_excel)
-    for _, row in df.iterrows():
-        eq = Equipment(
-            name=row.get('Nom', ''),
-            type=row.get('Type', ''),
-            brand=row.get('Marque', ''),
-            model=row.get('Modèle', ''),
-            software_version=row.get('Version Logiciel', ''),
-            ip_address=row.get('IP', ''),
-            location=row.get('Localisation', ''),
-            support_status=row.get('Support', ''),
-            modules=row.get('Modules', '')
-        )
-        db.session.add(eq)
-    db.session.commit()
-    print('Importation terminée.')
+"""
+Module d'import des équipements depuis Excel (offline, sans pandas).
+
+Le classeur est lu en flux (openpyxl ``read_only``): la mémoire reste
+constante quelle que soit sa taille. Les lignes sont validées (nom requis,
+adresse IP valide), les lignes invalides sont rapportées avec leur numéro,
+et les équipements valides sont ajoutés à l'inventaire par lots de
+``batch_size`` une fois la feuille lue (``apply_mutations``, une écriture par lot).
+"""
+from __future__ import annotations
+
+import ipaddress
+from typing import Any, Dict, Optional
+
+from app.inventory.excel_rows import IMPORT_BATCH_SIZE, ProgressCallback, cell_text, read_sheet, run_import
+from app.inventory.store import apply_mutations
+
+# En-tête normalisé (voir excel_rows.normalize_header) -> champ de Equipment
+EQUIPMENT_HEADERS = {
+    'nom': 'name',
+    'type': 'type',
+    'marque': 'brand',
+    'modele': 'model',
+    'version logiciel': 'software_version',
+    'ip': 'ip_address',
+    'localisation': 'location',
+    'support': 'support_status',
+    'modules': 'modules',
+}
+
+
+def _equipment_from_row(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Valide une ligne et retourne l'équipement correspondant (ValueError si invalide)."""
+    data = {field: cell_text(values.get(field)) for field in EQUIPMENT_HEADERS.values()}
+    if not data['name']:
+        raise ValueError('Nom manquant')
+    if data['ip_address']:
+        try:
+            data['ip_address'] = str(ipaddress.ip_address(data['ip_address']))
+        except ValueError:
+            raise ValueError(f"IP invalide: {data['ip_address']!r}")
+    return data
+
+
+def importer_equipements_depuis_excel(fichier_excel: str, sheet_name: Optional[str] = None,
+                                      batch_size: int = IMPORT_BATCH_SIZE,
+                                      progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """Importe les équipements d'un fichier Excel dans l'inventaire.
+    Args:
+        fichier_excel (str): Chemin du fichier Excel à importer.
+        sheet_name (str): Feuille à lire (feuille active par défaut).
+        batch_size (int): Lignes validées entre deux appels à ``progress``.
+        progress (callable): Appelée avec (lignes lues, total estimé).
+    Returns:
+        dict: rapport ``rows``, ``imported``, ``rejected``, ``errors``.
+    """
+    total, records = read_sheet(fichier_excel, EQUIPMENT_HEADERS, sheet_name)
+    report = run_import(records, _equipment_from_row, apply_mutations,
+                        total=total, batch_size=batch_size, progress=progress)
+    print(f"Importation terminée: {report['imported']} équipement(s), {report['rejected']} ligne(s) rejetée(s).")
+    return report
 
 # Exemple d'utilisation :
 # importer_equipements_depuis_excel(r'C:\orange\IP Capacity Management (2).xlsx')
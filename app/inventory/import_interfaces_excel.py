@@ -1,23 +1,73 @@
 """
-Module d'import des interfaces réseau depuis Excel
+Module d'import des interfaces réseau depuis Excel (offline, sans pandas).
+
+Lecture en flux comme pour les équipements: chaque ligne doit référencer un
+équipement existant de l'inventaire (``EquipmentID``) et porter des valeurs
+numériques entières et positives; les interfaces valides sont ajoutées par lots.
 """
-import pandas as pd
-from app.inventory.interfaces import Interface
-from app import db
-
-def importer_interfaces_depuis_excel(fichier_excel):
-    df = pd.read_excel(fichier_excel)
-    for _, row in df.iterrows():
-        interface = Interface(
-            equipment_id=row.get('EquipmentID', None),
-            name=row.get('InterfaceName', ''),
-            ifIndex=row.get('ifIndex', None),
-            description=row.get('Description', ''),
-            speed=row.get('Speed', None),
-            status=row.get('Status', ''),
-            in_octets=row.get('InOctets', 0),
-            out_octets=row.get('OutOctets', 0)
-        )
-        db.session.add(interface)
-    db.session.commit()
-    print('Importation des interfaces terminée.')
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Set
+
+from app.inventory.excel_rows import (
+    IMPORT_BATCH_SIZE, ProgressCallback, cell_int, cell_text, read_sheet, run_import,
+)
+from app.inventory.interface_store import apply_interface_mutations
+from app.inventory.store import iter_inventory
+
+# En-tête normalisé (voir excel_rows.normalize_header) -> champ de Interface
+INTERFACE_HEADERS = {
+    'equipmentid': 'equipment_id',
+    'interfacename': 'name',
+    'ifindex': 'ifIndex',
+    'description': 'description',
+    'speed': 'speed',
+    'status': 'status',
+    'inoctets': 'in_octets',
+    'outoctets': 'out_octets',
+}
+
+
+def _interface_validator(equipment_ids: Set[int]):
+    """Construit la fonction de validation d'une ligne pour un ensemble d'équipements connus."""
+    def validate(values: Dict[str, Any]) -> Dict[str, Any]:
+        equipment_id = cell_int(values.get('equipment_id'), 'EquipmentID')
+        if equipment_id is None:
+            raise ValueError('EquipmentID manquant')
+        if equipment_id not in equipment_ids:
+            raise ValueError(f'EquipmentID {equipment_id} inconnu')
+        name = cell_text(values.get('name'))
+        if not name:
+            raise ValueError('InterfaceName manquant')
+        return {
+            'equipment_id': equipment_id,
+            'name': name,
+            'ifIndex': cell_int(values.get('ifIndex'), 'ifIndex', minimum=0),
+            'description': cell_text(values.get('description')),
+            'speed': cell_int(values.get('speed'), 'Speed', minimum=0),
+            'status': cell_text(values.get('status')),
+            'in_octets': cell_int(values.get('in_octets'), 'InOctets', minimum=0) or 0,
+            'out_octets': cell_int(values.get('out_octets'), 'OutOctets', minimum=0) or 0,
+        }
+    return validate
+
+
+def importer_interfaces_depuis_excel(fichier_excel: str, sheet_name: Optional[str] = None,
+                                     batch_size: int = IMPORT_BATCH_SIZE,
+                                     progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """Importe les interfaces d'un fichier Excel.
+    Args:
+        fichier_excel (str): Chemin du fichier Excel à importer.
+        sheet_name (str): Feuille à lire (feuille active par défaut).
+        batch_size (int): Lignes validées entre deux appels à ``progress``.
+        progress (callable): Appelée avec (lignes lues, total estimé).
+    Returns:
+        dict: rapport ``rows``, ``imported``, ``rejected``, ``errors``.
+    """
+    equipment_ids = {item['id'] for item in iter_inventory()}
+    total, records = read_sheet(fichier_excel, INTERFACE_HEADERS, sheet_name)
+    report = run_import(records, _interface_validator(equipment_ids), apply_interface_mutations,
+                        total=total, batch_size=batch_size, progress=progress)
+    print(f"Importation des interfaces terminée: {report['imported']} interface(s), "
+          f"{report['rejected']} ligne(s) rejetée(s).")
+    return report
@@ -0,0 +1,56 @@
+"""
+Stockage hors-ligne des interfaces réseau via un fichier JSON.
+
+Même moteur que l'inventaire (cache mémoire, journal, verrou de fichier),
+sur ``data/interfaces.json`` (surcharge via ``IPCM_INTERFACES_PATH``), avec
+un index sur ``equipment_id`` pour retrouver les ports d'un équipement.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Mapping
+
+from app.inventory.store import DATA_DIR, JsonInventoryBackend
+
+# Champs indexés des interfaces
+INTERFACE_INDEXED_FIELDS = ('equipment_id', 'status')
+
+_BACKENDS_LOCK = threading.Lock()
+_BACKENDS: Dict[str, JsonInventoryBackend] = {}
+
+
+def _interfaces_path() -> str:
+    """Chemin effectif du fichier des interfaces (variable d'environnement relue à chaque appel)."""
+    return os.environ.get('IPCM_INTERFACES_PATH') or os.path.join(DATA_DIR, 'interfaces.json')
+
+
+def get_interface_backend() -> JsonInventoryBackend:
+    """Retourne le moteur des interfaces (instance partagée par chemin)."""
+    path = _interfaces_path()
+    with _BACKENDS_LOCK:
+        backend = _BACKENDS.get(path)
+        if backend is None:
+            backend = JsonInventoryBackend(path, indexed_fields=INTERFACE_INDEXED_FIELDS)
+            _BACKENDS[path] = backend
+        return backend
+
+
+def load_interfaces() -> List[Dict[str, Any]]:
+    """Charge toutes les interfaces (copies modifiables)."""
+    return get_interface_backend().load()
+
+
+def iter_interfaces() -> Iterator[Mapping[str, Any]]:
+    """Parcourt les interfaces en lecture seule."""
+    return get_interface_backend().iter_items()
+
+
+def interfaces_for_equipment(equipment_id: int) -> List[Dict[str, Any]]:
+    """Interfaces d'un équipement (via l'index ``equipment_id``)."""
+    return get_interface_backend().query({'equipment_id': [equipment_id]})['items']
+
+
+def apply_interface_mutations(operations: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Applique un lot d'opérations sur les interfaces (voir ``store.normalize_operation``)."""
+    return get_interface_backend().apply(operations)
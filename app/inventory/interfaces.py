@@ -1,18 +1,24 @@
+"""Modèle des interfaces réseau (offline, sans base de données).
+
+Ce module fournit une simple dataclass Interface, rattachée à un
+équipement par ``equipment_id``. Aucune dépendance à SQLAlchemy ni à un
+objet `db`; la persistance est assurée par ``app.inventory.interface_store``.
 """
-Module de gestion des interfaces réseau
-"""
-from app import db
 
-class Interface(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'))
-    name = db.Column(db.String(100))
-    ifIndex = db.Column(db.Integer)
-    description = db.Column(db.String(200))
-    speed = db.Column(db.Integer)
-    status = db.Column(db.String(50))
-    in_octets = db.Column(db.BigInteger)
-    out_octets = db.Column(db.BigInteger)
+from dataclasses import dataclass
+
+
+@dataclass
+class Interface:
+    id: int | None = None
+    equipment_id: int | None = None
+    name: str = ""
+    ifIndex: int | None = None
+    description: str = ""
+    speed: int | None = None
+    status: str = ""
+    in_octets: int = 0
+    out_octets: int = 0
 
-    def __repr__(self):
+    def __repr__(self) -> str:
         return f'<Interface {self.name} ({self.status})>'
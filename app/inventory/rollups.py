@@ -0,0 +1,287 @@
+"""
+Agrégats de capacité matérialisés par domaine, site, marque et type d'équipement.
+
+Pour chaque valeur de ``DIMENSIONS`` (domaine déduit par ``domain_of``,
+``location``, ``brand``, ``type``), ``CapacityRollups`` tient le nombre
+d'équipements, d'équipements en fin de support (EoS), de ports, la capacité
+totale (somme des débits nominaux des interfaces) et la capacité utilisée
+(débit du sens le plus chargé, remonté par la chaîne de collecte).
+
+Les agrégats sont corrigés par différence à chaque lot de mutations de
+l'inventaire ou des interfaces (``store.add_mutation_listener``) et à chaque
+lot de débits (``record_rates``): une lecture ne parcourt jamais
+l'inventaire. Une version de stockage inattendue (écriture d'un autre
+processus, ``save_inventory``) provoque une reconstruction complète à la
+lecture suivante.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from app.inventory.domains import UNCLASSIFIED, domain_of
+from app.inventory.interface_store import get_interface_backend
+from app.inventory.store import Change, InventoryBackend, add_mutation_listener, get_backend
+
+# Regroupements matérialisés: domaine puis champs de l'équipement
+DIMENSIONS = ('domain', 'location', 'brand', 'type')
+# Compteurs de chaque groupe (les deux derniers en bit/s)
+FIELDS = ('devices', 'eos', 'ports', 'capacity_bps', 'used_bps')
+_COUNTS = ('devices', 'eos', 'ports')
+
+# Mentions (minuscules) d'un statut de support en fin de vie, non collées à d'autres lettres
+EOS_MARKERS = ('eos', 'eol', 'end of support', 'end of life', 'fin de support', 'fin de vie')
+_EOS_PATTERN = re.compile(r'(?<![^\W\d_])(?:' + '|'.join(map(re.escape, EOS_MARKERS)) + r')(?![^\W\d_])')
+
+_ROLLUPS_LOCK = threading.Lock()
+_ROLLUPS: Dict[Tuple[InventoryBackend, InventoryBackend], 'CapacityRollups'] = {}
+
+
+def is_end_of_support(item: Mapping[str, Any]) -> bool:
+    """Vrai si le statut de support annonce une fin de support ou de vie (``EoS 2027``...)."""
+    return bool(_EOS_PATTERN.search(str(item.get('support_status') or '').lower()))
+
+
+def groups_of(item: Mapping[str, Any]) -> Tuple[str, ...]:
+    """Valeur de chaque dimension de ``DIMENSIONS`` pour un équipement (``UNCLASSIFIED`` si vide)."""
+    return (domain_of(item), *(str(item.get(f) or '').strip() or UNCLASSIFIED for f in DIMENSIONS[1:]))
+
+
+def _speed(value: Any) -> float:
+    """Débit nominal d'une interface (bit/s); 0 si absent ou illisible."""
+    try:
+        return max(float(value or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _as_row(totals: Sequence[float]) -> Dict[str, Any]:
+    row: Dict[str, Any] = {f: int(round(v)) if f in _COUNTS else v for f, v in zip(FIELDS, totals)}
+    row['utilization'] = round(100.0 * row['used_bps'] / row['capacity_bps'], 2) if row['capacity_bps'] else None
+    return row
+
+
+def empty_rollup() -> Dict[str, Any]:
+    """Agrégat d'un groupe vide."""
+    return _as_row([0.0] * len(FIELDS))
+
+
+def _version(backend: InventoryBackend) -> int:
+    """Version du stockage, 0 s'il n'existe pas encore (sans le créer)."""
+    return backend.version() if os.path.exists(backend.path) else 0
+
+
+class CapacityRollups:
+    """Agrégats de capacité d'un inventaire et de ses interfaces, tenus à jour par différence."""
+
+    def __init__(self, inventory: InventoryBackend, interfaces: InventoryBackend) -> None:
+        self.inventory = inventory
+        self.interfaces = interfaces
+        self._lock = threading.Lock()
+        self._versions: Tuple[int, int] = (-1, -1)
+        self._stale = True
+        # Débits par interface collectée (equipment_id, ifIndex) et par équipement, hors reconstruction
+        self._port_used: Dict[Hashable, float] = {}
+        self._used: Dict[Any, float] = {}
+        self._usage_generation = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._equipment: Dict[Any, Tuple[Tuple[str, ...], bool]] = {}
+        self._ports_of: Dict[Any, Tuple[Any, float]] = {}  # ID d'interface -> (équipement, débit nominal)
+        self._ports: Dict[Any, List[float]] = {}  # équipement -> [ports, capacité]
+        self._groups: Dict[str, Dict[str, List[float]]] = {d: {} for d in DIMENSIONS}
+        self._total = [0.0] * len(FIELDS)
+
+    # --- Mise à jour par différence (verrou tenu) -----------------------------
+
+    def _contribution(self, equip_id: Any) -> Optional[Tuple[Tuple[str, ...], List[float]]]:
+        known = self._equipment.get(equip_id)
+        if known is None:
+            return None
+        groups, eos = known
+        ports, capacity = self._ports.get(equip_id, (0.0, 0.0))
+        return groups, [1.0, float(eos), ports, capacity, self._used.get(equip_id, 0.0)]
+
+    def _add(self, contribution: Optional[Tuple[Tuple[str, ...], List[float]]], sign: float) -> None:
+        if contribution is None:
+            return
+        groups, values = contribution
+        for dimension, value in zip(DIMENSIONS, groups):
+            totals = self._groups[dimension].setdefault(value, [0.0] * len(FIELDS))
+            for i, v in enumerate(values):
+                totals[i] += sign * v
+            if totals[0] < 0.5:
+                del self._groups[dimension][value]
+        for i, v in enumerate(values):
+            self._total[i] += sign * v
+
+    def _shift(self, before: Optional[Tuple[Tuple[str, ...], List[float]]], equip_id: Any) -> None:
+        """Remplace la contribution ``before`` d'un équipement par sa contribution actuelle."""
+        self._add(before, -1.0)
+        self._add(self._contribution(equip_id), 1.0)
+
+    def _set_equipment(self, before: Optional[Mapping[str, Any]], after: Optional[Mapping[str, Any]]) -> None:
+        if before is not None and (after is None or after.get('id') != before.get('id')):
+            old = self._contribution(before.get('id'))
+            self._equipment.pop(before.get('id'), None)
+            self._shift(old, before.get('id'))
+        if after is not None and after.get('id') is not None:
+            equip_id = after['id']
+            old = self._contribution(equip_id)
+            self._equipment[equip_id] = (groups_of(after), is_end_of_support(after))
+            self._shift(old, equip_id)
+
+    def _drop_port(self, interface_id: Any) -> None:
+        entry = self._ports_of.pop(interface_id, None)
+        if entry is None:
+            return
+        equip_id, speed = entry
+        old = self._contribution(equip_id)
+        ports = self._ports[equip_id]
+        ports[0] -= 1
+        ports[1] -= speed
+        if ports[0] < 0.5:
+            del self._ports[equip_id]
+        self._shift(old, equip_id)
+
+    def _set_port(self, interface_id: Any, equip_id: Any, speed: float) -> None:
+        self._drop_port(interface_id)  # idempotent: une interface n'est comptée qu'une fois
+        old = self._contribution(equip_id)
+        self._ports_of[interface_id] = (equip_id, speed)
+        ports = self._ports.setdefault(equip_id, [0.0, 0.0])
+        ports[0] += 1
+        ports[1] += speed
+        self._shift(old, equip_id)
+
+    def _set_interface(self, before: Optional[Mapping[str, Any]], after: Optional[Mapping[str, Any]]) -> None:
+        if before is not None:
+            self._drop_port(before.get('id'))
+        if after is not None and after.get('id') is not None:
+            self._set_port(after['id'], after.get('equipment_id'), _speed(after.get('speed')))
+
+    def on_mutation(self, backend: InventoryBackend, changes: List[Change], version: int) -> None:
+        """Rappel de ``store.add_mutation_listener``: applique un lot s'il suit la version connue."""
+        if backend is self.inventory:
+            index, apply = 0, self._set_equipment
+        elif backend is self.interfaces:
+            index, apply = 1, self._set_interface
+        else:
+            return
+        with self._lock:
+            if self._stale or self._versions[index] != version - 1:
+                # Écriture manquée (autre processus, remplacement complet): reconstruction à la lecture
+                self._stale = True
+                return
+            for before, after in changes:
+                apply(before, after)
+            versions = list(self._versions)
+            versions[index] = version
+            self._versions = (versions[0], versions[1])
+
+    def record_usage(self, keys: Iterable[Hashable], used_bps: Iterable[float]) -> int:
+        """
+        Met à jour le débit courant des interfaces collectées.
+        Args:
+            keys: clés ``(equipment_id, ifIndex)`` (ou ID d'équipement).
+            used_bps: débit du sens le plus chargé (bit/s); NaN ignoré.
+        Returns:
+            int: nombre d'équipements dont la capacité utilisée a changé.
+        """
+        with self._lock:
+            touched: Dict[Any, Any] = {}
+            for key, value in zip(keys, used_bps):
+                value = float(value)
+                if value != value or self._port_used.get(key) == value:
+                    continue
+                equip_id = key[0] if isinstance(key, tuple) else key
+                if equip_id not in touched:
+                    touched[equip_id] = self._contribution(equip_id)
+                self._used[equip_id] = self._used.get(equip_id, 0.0) + value - self._port_used.get(key, 0.0)
+                self._port_used[key] = value
+            for equip_id, before in touched.items():
+                self._shift(before, equip_id)
+            if touched:
+                self._usage_generation += 1
+            return len(touched)
+
+    def record_rates(self, batch: Any) -> int:
+        """``record_usage`` à partir d'un ``RateBatch`` de ``CounterRateEngine``."""
+        return self.record_usage(batch.keys, batch.used_bps.tolist())
+
+    def port_usage(self) -> Dict[Hashable, float]:
+        """Dernier débit (bit/s) de chaque interface collectée, par clé ``(equipment_id, ifIndex)``."""
+        with self._lock:
+            return dict(self._port_used)
+
+    # --- Lecture -------------------------------------------------------------
+
+    def _sync(self) -> Tuple[int, int]:
+        """Reconstruit les agrégats si une écriture n'a pas été notifiée; retourne les versions."""
+        versions = (_version(self.inventory), _version(self.interfaces))
+        with self._lock:
+            if not self._stale and versions == self._versions:
+                return versions
+        # Lecture hors verrou: un rappel de mutation peut attendre le verrou entre-temps
+        items = list(self.inventory.iter_items()) if versions[0] else []
+        ports = list(self.interfaces.iter_items()) if versions[1] else []
+        with self._lock:
+            self._reset()
+            for item in items:
+                self._set_equipment(None, item)
+            for port in ports:
+                self._set_interface(None, port)
+            self._versions, self._stale = versions, False
+        return versions
+
+    def rollup(self, dimension: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Agrégats d'une dimension, sans parcours de l'inventaire.
+        Returns:
+            dict: valeur -> ``devices``, ``eos``, ``ports``, ``capacity_bps``, ``used_bps``, ``utilization`` (%).
+        Raises:
+            ValueError: dimension inconnue.
+        """
+        if dimension not in DIMENSIONS:
+            raise ValueError(f'regroupement inconnu: {dimension}')
+        self._sync()
+        with self._lock:
+            return {value: _as_row(totals) for value, totals in self._groups[dimension].items()}
+
+    def totals(self) -> Dict[str, Any]:
+        """Agrégat de tout l'inventaire."""
+        self._sync()
+        with self._lock:
+            return _as_row(self._total)
+
+    def etag(self) -> str:
+        """
+        Identifiant de l'état des agrégats (clé de cache HTTP). Les débits collectés étant
+        propres au processus, leur génération n'y figure qu'avec le PID, et seulement s'il y en a.
+        """
+        inventory_version, interfaces_version = self._sync()
+        tag = f'{inventory_version}.{interfaces_version}'
+        with self._lock:
+            if self._usage_generation:
+                tag += f'.{os.getpid()}.{self._usage_generation}'
+        return tag
+
+
+def _dispatch(backend: InventoryBackend, changes: List[Change], version: int) -> None:
+    for rollups in list(_ROLLUPS.values()):
+        rollups.on_mutation(backend, changes, version)
+
+
+def get_rollups() -> CapacityRollups:
+    """Agrégats de l'inventaire et des interfaces configurés (instance partagée par couple de moteurs)."""
+    key = (get_backend(), get_interface_backend())
+    with _ROLLUPS_LOCK:
+        rollups = _ROLLUPS.get(key)
+        if rollups is None:
+            rollups = _ROLLUPS[key] = CapacityRollups(*key)
+        return rollups
+
+
+add_mutation_listener(_dispatch)
@@ -0,0 +1,241 @@
+"""
+Moteur SQLite de l'inventaire (bibliothèque standard ``sqlite3``, sans ORM).
+
+Sélectionné par ``IPCM_INVENTORY_BACKEND=sqlite`` ou par un chemin
+``IPCM_INVENTORY_PATH`` se terminant par ``.db``/``.sqlite``. Chaque
+mutation ne touche qu'une ligne: pas de réécriture complète du fichier,
+ce qui permet de gérer plus de 100 000 équipements.
+
+- Mode WAL: les lectures ne bloquent pas les écritures (multi-processus).
+- Une colonne texte par champ de ``Equipment``; les champs inconnus ou non
+  textuels sont conservés en JSON dans la colonne ``extra``.
+- Index sur les champs de ``INDEXED_FIELDS``; requêtes paramétrées à texte
+  constant, donc préparées une seule fois par connexion.
+- Écritures en ``BEGIN IMMEDIATE``: un lot ``apply_mutations`` forme une
+  seule transaction, sérialisée avec celles des autres processus, qui
+  incrémente la version de la table ``meta``.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import fields as dataclass_fields
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from app.inventory.models import Equipment
+from app.inventory.store import (
+    INDEXED_FIELDS, Change, InventoryBackend, decode_cursor, encode_cursor, normalize_operation,
+)
+
+# Colonnes dédiées (hors ID), dérivées du modèle Equipment
+COLUMNS = [f.name for f in dataclass_fields(Equipment) if f.name != 'id']
+
+# Nombre de lignes lues par lot lors des parcours complets
+FETCH_SIZE = 1000
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS equipment ('
+    'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+    + ', '.join(f'{c} TEXT' for c in COLUMNS)
+    + ', extra TEXT)',
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+    "INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 1)",
+] + [f'CREATE INDEX IF NOT EXISTS idx_equipment_{c} ON equipment({c})' for c in INDEXED_FIELDS]
+
+_SELECT_ALL = f"SELECT id, {', '.join(COLUMNS)}, extra FROM equipment"
+_SELECT_ONE = _SELECT_ALL + ' WHERE id = ?'
+_INSERT = (f"INSERT INTO equipment (id, {', '.join(COLUMNS)}, extra) "
+           f"VALUES ({', '.join('?' * (len(COLUMNS) + 2))})")
+_UPDATE = (f"UPDATE equipment SET id = ?, {', '.join(f'{c} = ?' for c in COLUMNS)}, extra = ? "
+           "WHERE id = ?")
+_DELETE = 'DELETE FROM equipment WHERE id = ?'
+_SELECT_VERSION = "SELECT value FROM meta WHERE key = 'version'"
+_BUMP_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'version'"
+
+
+def _is_scalar(value: Any) -> bool:
+    """Valeur stockable telle quelle dans une colonne texte (les autres types vont dans ``extra``)."""
+    return value is None or isinstance(value, str)
+
+
+def _to_row(item: Mapping[str, Any]) -> Tuple[Any, ...]:
+    """Convertit un équipement en paramètres (id, colonnes..., extra) pour ``_INSERT``."""
+    extra = {k: v for k, v in item.items()
+             if k != 'id' and (k not in COLUMNS or not _is_scalar(v))}
+    values = [item.get(c) if _is_scalar(item.get(c)) else None for c in COLUMNS]
+    return (item.get('id'), *values, json.dumps(extra, ensure_ascii=False) if extra else None)
+
+
+def _from_row(row: Sequence[Any]) -> Dict[str, Any]:
+    """Convertit une ligne ``_SELECT_ALL`` en équipement (les colonnes NULL sont omises)."""
+    item: Dict[str, Any] = {'id': row[0]}
+    for column, value in zip(COLUMNS, row[1:-1]):
+        if value is not None:
+            item[column] = value
+    if row[-1]:
+        item.update(json.loads(row[-1]))
+    return item
+
+
+def _field_expression(field: str) -> Tuple[str, Tuple[Any, ...]]:
+    """Expression SQL (et paramètres) désignant un champ, colonne dédiée ou clé de ``extra``."""
+    if field == 'id' or field in COLUMNS:
+        return field, ()
+    return 'json_extract(extra, ?)', (f'$."{field}"',)
+
+
+class SqliteInventoryBackend(InventoryBackend):
+    """Inventaire stocké dans une base SQLite locale (une connexion par thread)."""
+
+    kind = 'sqlite'
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connexion du thread courant, recréée après un fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # isolation_level=None: transactions explicites (BEGIN IMMEDIATE pour les écritures)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Transaction d'écriture: verrou réservé dès le début, validée ou annulée en bloc."""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        changes_before = conn.total_changes
+        try:
+            yield conn
+            if conn.total_changes != changes_before:
+                conn.execute(_BUMP_VERSION)
+                self._local.version = conn.execute(_SELECT_VERSION).fetchone()[0]
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def load(self) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(_SELECT_ALL + ' ORDER BY id').fetchall()
+        return [_from_row(r) for r in rows]
+
+    def iter_items(self) -> Iterator[Mapping[str, Any]]:
+        cur = self._connection().execute(_SELECT_ALL + ' ORDER BY id')
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield MappingProxyType(_from_row(row))
+
+    def query(self, filters: Optional[Mapping[str, Sequence[str]]] = None, sort: str = 'id',
+              descending: bool = False, cursor: Optional[str] = None, limit: Optional[int] = None,
+              fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        position = decode_cursor(cursor) if cursor else None
+        where: List[str] = []
+        params: List[Any] = []
+        for field, values in (filters or {}).items():
+            expr, expr_params = _field_expression(field)
+            values = [str(v) for v in values]
+            clause = f"{expr} IN ({', '.join('?' * len(values))})" if values else '0'
+            clause_params = [*expr_params, *values] if values else []
+            if '' in values:
+                # Champ absent = chaîne vide, comme pour le moteur JSON
+                clause = f'({clause} OR {expr} IS NULL)'
+                clause_params.extend(expr_params)
+            params.extend(clause_params)
+            where.append(clause)
+        conn = self._connection()
+        where_sql = (' WHERE ' + ' AND '.join(where)) if where else ''
+        total = conn.execute('SELECT COUNT(*) FROM equipment' + where_sql, params).fetchone()[0]
+
+        sort_expr, sort_params = _field_expression(sort)
+        if sort != 'id':
+            sort_expr = f"COALESCE({sort_expr}, '')"
+        page_where, page_params = list(where), list(params)
+        if position is not None:
+            (_, value), last_id = position
+            page_where.append(f"({sort_expr}, id) {'<' if descending else '>'} (?, ?)")
+            page_params.extend([*sort_params, value, last_id])
+        direction = 'DESC' if descending else 'ASC'
+        sql = (_SELECT_ALL + (' WHERE ' + ' AND '.join(page_where) if page_where else '')
+               + f' ORDER BY {sort_expr} {direction}, id {direction}')
+        page_params.extend(sort_params)
+        if limit is not None:
+            sql += ' LIMIT ?'
+            page_params.append(limit + 1)
+        page = [_from_row(r) for r in conn.execute(sql, page_params).fetchall()]
+
+        next_cursor = None
+        if limit is not None and len(page) > limit:
+            page = page[:limit]
+            value = page[-1].get(sort)
+            kind = 0 if isinstance(value, (int, float)) and not isinstance(value, bool) else 1
+            next_cursor = encode_cursor(((kind, value if kind == 0 else ('' if value is None else str(value))),
+                                         page[-1]['id']))
+        if fields:
+            wanted = ['id'] + [f for f in fields if f != 'id']
+            page = [{f: it[f] for f in wanted if f in it} for it in page]
+        return {'items': page, 'total': total, 'next_cursor': next_cursor}
+
+    def apply(self, operations: Iterable[Any]) -> List[Dict[str, Any]]:
+        results: List[Dict[str, Any]] = []
+        changes: List[Change] = []
+        with self._write() as conn:
+            for operation in operations:
+                try:
+                    op = normalize_operation(operation)
+                except ValueError as exc:
+                    results.append(self._rejected(operation, exc))
+                    continue
+                if op['op'] == 'add':
+                    eq = {k: v for k, v in op['data'].items() if k != 'id'}
+                    equip_id = conn.execute(_INSERT, _to_row(eq)).lastrowid
+                    eq['id'] = equip_id
+                    results.append({'op': 'add', 'id': equip_id, 'ok': True, 'item': eq})
+                    changes.append((None, dict(eq)))
+                    continue
+                row = conn.execute(_SELECT_ONE, (op['id'],)).fetchone()
+                if row is not None:
+                    before = _from_row(row)
+                    if op['op'] == 'update':
+                        updated = {**before, **op['changes']}
+                        conn.execute(_UPDATE, (*_to_row(updated), op['id']))
+                        changes.append((before, updated))
+                    else:
+                        conn.execute(_DELETE, (op['id'],))
+                        changes.append((before, None))
+                found = row is not None
+                results.append({'op': op['op'], 'id': op['id'], 'ok': True} if found else self._not_found(op))
+        if changes:
+            self._notify(changes, self._local.version)
+        return results
+
+    def replace_all(self, items: List[Dict[str, Any]]) -> None:
+        with self._write() as conn:
+            conn.execute('DELETE FROM equipment')
+            conn.executemany(_INSERT, (_to_row(it) for it in items))
+
+    def version(self) -> int:
+        return self._connection().execute(_SELECT_VERSION).fetchone()[0]
+
+    def _storage_files(self) -> List[str]:
+        return [self.path, self.path + '-wal']
+
+    def compact(self) -> None:
+        conn = self._connection()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('PRAGMA optimize')
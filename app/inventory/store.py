@@ -2,76 +2,887 @@
 Stockage hors-ligne de l'inventaire via un fichier JSON.
 Pas de base de données. Persistance simple dans c:/orange/data/inventory.json
 Ce module fournit les fonctions CRUD pour l'inventaire offline.
+
+Le contenu du fichier est gardé en mémoire et n'est relu que lorsque sa
+signature (inode, taille, mtime) change, par exemple après l'écriture d'un
+autre processus. Les lectures renvoient des copies ou des vues en lecture
+seule afin que les appelants ne puissent pas altérer ce cache.
+
+Mode journalisé (``IPCM_INVENTORY_JOURNAL=1``) : chaque mutation est ajoutée
+sous forme d'une ligne JSON dans ``<inventaire>.journal`` au lieu de réécrire
+tout le fichier. L'état courant est le dernier instantané (le fichier JSON)
+sur lequel on rejoue le journal. Une compaction réécrit l'instantané et vide
+le journal dès que celui-ci dépasse un seuil.
+
+Index : l'état en mémoire est indexé par ID, et des index secondaires
+(valeur -> IDs) sont maintenus sur ``INDEXED_FIELDS``. ``query_inventory``
+s'appuie dessus pour filtrer, trier et paginer (curseur opaque) sans
+parcourir tout l'inventaire.
+
+Moteurs : ces fonctions délèguent à un ``InventoryBackend``. Le moteur JSON
+ci-dessus est utilisé par défaut; ``IPCM_INVENTORY_BACKEND=sqlite`` (ou un
+chemin ``IPCM_INVENTORY_PATH`` en ``.db``/``.sqlite``) sélectionne le moteur
+SQLite de ``app.inventory.sqlite_store``, sans changement pour les appelants.
+
+Concurrence : les lectures-modifications-écritures du moteur JSON se font
+sous un verrou consultatif (``<inventaire>.lock``) partagé entre processus,
+et les instantanés sont écrits dans un fichier temporaire puis renommés
+atomiquement. ``apply_mutations`` applique un lot d'opérations sous un seul
+verrou avec une seule écriture.
+
+Notifications : ``add_mutation_listener`` enregistre un rappel appelé après
+chaque lot de mutations appliqué par ce processus, avec les paires
+(avant, après) des équipements modifiés et la version atteinte; les agrégats
+matérialisés (``app.inventory.rollups``) s'en servent pour rester à jour
+sans relire l'inventaire.
+
+Version : chaque moteur tient un compteur de version monotone, partagé entre
+processus (fichier ``<inventaire>.version`` pour JSON, table ``meta`` pour
+SQLite), incrémenté à chaque écriture. Il sert de clé de cache HTTP (ETag)
+et d'export, et se lit sans charger l'inventaire.
 """
 from __future__ import annotations
 
+import base64
+import copy
+import bisect
+import hashlib
 import json
+import logging
 import os
-from typing import List, Dict, Any
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Mapping, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
 # Permet la surcharge via variable d'environnement pour les tests ou custom
 INVENTORY_PATH = os.environ.get('IPCM_INVENTORY_PATH') or os.path.join(DATA_DIR, 'inventory.json')
 
+# Nombre minimal d'entrées de journal avant compaction (le seuil effectif croît
+# avec la taille de l'inventaire pour garder un coût amorti constant par écriture)
+JOURNAL_COMPACT_THRESHOLD = 1000
+
+# Champs disposant d'un index secondaire (valeur -> ensemble d'IDs)
+INDEXED_FIELDS = ('ip_address', 'type', 'brand', 'location', 'support_status')
+
+# Extensions de fichier sélectionnant le moteur SQLite
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# Moteurs instanciés, un par (type, chemin), protégés par un verrou (serveurs multi-threads)
+_BACKENDS_LOCK = threading.Lock()
+_BACKENDS: Dict[Tuple[str, str], 'InventoryBackend'] = {}
+
+# (avant, après) d'un enregistrement modifié: avant None pour un ajout, après None pour une suppression
+Change = Tuple[Optional[Mapping[str, Any]], Optional[Mapping[str, Any]]]
+MutationListener = Callable[['InventoryBackend', List[Change], int], None]
+_MUTATION_LISTENERS: List[MutationListener] = []
+
+
+def _backend_kind() -> str:
+    """Type de moteur demandé: variable ``IPCM_INVENTORY_BACKEND`` ou extension du chemin."""
+    kind = os.environ.get('IPCM_INVENTORY_BACKEND', '').strip().lower()
+    if kind:
+        return kind
+    path = os.environ.get('IPCM_INVENTORY_PATH', '')
+    return 'sqlite' if path.lower().endswith(SQLITE_EXTENSIONS) else 'json'
+
+
+def _inventory_path(kind: str = 'json') -> str:
+    """Retourne le chemin effectif de l'inventaire (variable d'environnement relue à chaque appel)."""
+    default_name = 'inventory.db' if kind == 'sqlite' else 'inventory.json'
+    return os.environ.get('IPCM_INVENTORY_PATH') or os.path.join(DATA_DIR, default_name)
+
+
+def _journal_path(path: str) -> str:
+    """Chemin du journal des mutations associé à un inventaire."""
+    return path + '.journal'
+
 
-def _ensure_store() -> None:
+def _journal_enabled() -> bool:
+    """Indique si les mutations doivent être journalisées plutôt que réécrire le fichier."""
+    return os.environ.get('IPCM_INVENTORY_JOURNAL', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def _compact_threshold(record_count: int) -> int:
+    """Seuil d'entrées de journal déclenchant une compaction."""
+    minimum = int(os.environ.get('IPCM_JOURNAL_COMPACT_THRESHOLD') or JOURNAL_COMPACT_THRESHOLD)
+    return max(minimum, record_count)
+
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """Verrou exclusif consultatif inter-processus, porté par ``<path>.lock``."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.lock', 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _atomic_write_json(path: str, data: Any, indent: Optional[int] = 2) -> None:
+    """Écrit ``data`` dans un fichier temporaire voisin puis le renomme sur ``path``."""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _ensure_store(path: Optional[str] = None) -> None:
     """Crée le dossier et le fichier inventaire si absent."""
-    os.makedirs(DATA_DIR, exist_ok=True)
-    os.makedirs(os.path.dirname(INVENTORY_PATH), exist_ok=True)
-    if not os.path.exists(INVENTORY_PATH):
-        with open(INVENTORY_PATH, 'w', encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
+    path = path or _inventory_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if not os.path.exists(path):
+        _atomic_write_json(path, [])
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """Signature (inode, taille, mtime en ns) du fichier, ou None s'il n'existe pas."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _version_path(path: str) -> str:
+    """Chemin du fichier de version associé à un inventaire JSON."""
+    return path + '.version'
+
+
+def _read_version(path: str) -> Optional[Dict[str, Any]]:
+    """Lit ``{'version': n, 'signature': ...}`` du fichier de version (None si absent ou illisible)."""
+    try:
+        with open(_version_path(path), 'r', encoding='utf-8') as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return record if isinstance(record, dict) and isinstance(record.get('version'), int) else None
+
+
+def _file_size(path: str) -> int:
+    """Taille du fichier en octets (0 s'il n'existe pas)."""
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _empty_state(path: Optional[str] = None,
+                 indexed_fields: Sequence[str] = INDEXED_FIELDS) -> Dict[str, Any]:
+    """État du cache: équipements indexés par ID (ordre d'insertion conservé)."""
+    return {'path': path, 'signature': None, 'journal_offset': 0, 'journal_entries': 0,
+            'records': {}, 'max_id': 0, 'anonymous': 0,
+            'indexes': {field: {} for field in indexed_fields}, 'orders': {}}
+
+
+def _index_value(value: Any) -> str:
+    """Clé d'index d'une valeur de champ (les filtres HTTP sont des chaînes)."""
+    return '' if value is None else str(value)
+
+
+def _index_record(state: Dict[str, Any], key: Any, item: Mapping[str, Any]) -> None:
+    """Ajoute un équipement aux index secondaires."""
+    for field, index in state['indexes'].items():
+        index.setdefault(_index_value(item.get(field)), set()).add(key)
+
+
+def _unindex_record(state: Dict[str, Any], key: Any, item: Mapping[str, Any]) -> None:
+    """Retire un équipement des index secondaires."""
+    for field, index in state['indexes'].items():
+        value = _index_value(item.get(field))
+        keys = index.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[value]
+
+
+def _detached(item: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Copie d'un équipement qui ne partage rien avec l'état en cache.
+    Les listes et objets imbriqués sont copiés en profondeur; les valeurs
+    scalaires (cas courant) sont immuables et reprises telles quelles.
+    """
+    return {k: copy.deepcopy(v) if isinstance(v, (list, dict)) else v for k, v in item.items()}
+
+
+def _read_only(item: Dict[str, Any]) -> Mapping[str, Any]:
+    """Vue en lecture seule d'un équipement, copiée seulement s'il contient des valeurs imbriquées."""
+    if any(isinstance(v, (list, dict)) for v in item.values()):
+        item = _detached(item)
+    return MappingProxyType(item)
+
+
+def _put_record(state: Dict[str, Any], item: Dict[str, Any]) -> None:
+    """Insère ou remplace un équipement dans l'état en mémoire."""
+    records = state['records']
+    key = item.get('id')
+    if key is None:
+        # Équipement sans ID (fichier édité à la main): clé synthétique pour ne rien perdre
+        state['anonymous'] += 1
+        key = ('_', state['anonymous'])
+    previous = records.get(key)
+    if previous is not None:
+        _unindex_record(state, key, previous)
+    records[key] = item
+    _index_record(state, key, item)
+    state['orders'].clear()
+    if isinstance(item.get('id'), int):
+        state['max_id'] = max(state['max_id'], item['id'])
+
+
+def _drop_record(state: Dict[str, Any], key: Any) -> bool:
+    """Supprime un équipement de l'état en mémoire et de ses index."""
+    item = state['records'].pop(key, None)
+    if item is None:
+        return False
+    _unindex_record(state, key, item)
+    state['orders'].clear()
+    return True
+
+
+def _apply_entry(state: Dict[str, Any], entry: Dict[str, Any]) -> bool:
+    """
+    Applique une entrée de journal à l'état en mémoire.
+    Les opérations sont idempotentes pour tolérer un rejeu partiel.
+    Returns:
+        bool: True si l'état a été modifié.
+    """
+    records = state['records']
+    op = entry.get('op')
+    if op == 'add':
+        _put_record(state, entry['item'])
+        return True
+    if op == 'update':
+        current = records.get(entry.get('id'))
+        if current is None:
+            return False
+        # Nouveau dict: les vues déjà distribuées restent cohérentes
+        updated = {**current, **entry.get('changes', {})}
+        if updated.get('id') != entry['id']:
+            _drop_record(state, entry['id'])
+        _put_record(state, updated)
+        return True
+    if op == 'delete':
+        return _drop_record(state, entry.get('id'))
+    return False
+
+
+def _replay_journal(state: Dict[str, Any], journal_path: str) -> None:
+    """
+    Rejoue le journal à partir de l'offset déjà consommé.
+    Une dernière ligne sans retour chariot (écriture en cours) est laissée pour plus tard.
+    """
+    try:
+        with open(journal_path, 'rb') as f:
+            f.seek(state['journal_offset'])
+            data = f.read()
+    except FileNotFoundError:
+        return
+    end = data.rfind(b'\n') + 1
+    for line in data[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # Ligne corrompue (crash pendant l'écriture): ignorée
+            continue
+        _apply_entry(state, entry)
+        state['journal_entries'] += 1
+    state['journal_offset'] += end
+
+
+def _load_state(path: str, indexed_fields: Sequence[str] = INDEXED_FIELDS) -> Dict[str, Any]:
+    """Reconstruit l'état complet: instantané JSON puis rejeu du journal."""
+    for _ in range(3):
+        signature = _file_signature(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        state = _empty_state(path, indexed_fields)
+        for it in items:
+            _put_record(state, it)
+        _replay_journal(state, _journal_path(path))
+        # Une compaction concurrente a pu remplacer l'instantané pendant la lecture
+        if _file_signature(path) == signature:
+            break
+    state['signature'] = signature
+    return state
+
+
+def _sort_key(item: Mapping[str, Any], field: str) -> Tuple[Tuple[int, Any], int]:
+    """Clé de tri totale: valeur du champ (nombres avant textes) puis ID."""
+    value = item.get(field)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        primary: Tuple[int, Any] = (0, value)
+    else:
+        primary = (1, _index_value(value))
+    equip_id = item.get('id')
+    return primary, (equip_id if isinstance(equip_id, int) else -1)
+
+
+def _sorted_order(state: Dict[str, Any], field: str) -> Tuple[List[Any], List[Any]]:
+    """Ordre trié (clés de tri, clés d'équipements) sur un champ, mis en cache jusqu'à la prochaine mutation."""
+    order = state['orders'].get(field)
+    if order is None:
+        pairs = sorted(((_sort_key(it, field), key) for key, it in state['records'].items()),
+                       key=lambda pair: pair[0])
+        order = ([p[0] for p in pairs], [p[1] for p in pairs])
+        state['orders'][field] = order
+    return order
+
+
+def encode_cursor(sort_key: Tuple[Tuple[int, Any], int]) -> str:
+    """Encode la position d'un équipement dans un curseur opaque (base64 URL)."""
+    raw = json.dumps(sort_key, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Tuple[int, Any], int]:
+    """Décode un curseur produit par ``encode_cursor`` (ValueError si invalide)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        (kind, value), equip_id = json.loads(raw)
+        kind, equip_id = int(kind), int(equip_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError('curseur invalide') from exc
+    # La valeur doit avoir le type de sa catégorie (voir ``_sort_key``), sinon la comparaison échoue
+    numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+    if not ((kind == 0 and numeric) or (kind == 1 and isinstance(value, str))):
+        raise ValueError('curseur invalide')
+    return (kind, value), equip_id
+
+
+def _write_snapshot(state: Dict[str, Any]) -> None:
+    """Réécrit l'instantané complet et supprime le journal devenu inutile."""
+    path = state['path']
+    _atomic_write_json(path, list(state['records'].values()))
+    journal_path = _journal_path(path)
+    if os.path.exists(journal_path):
+        # Tronqué après le remplacement de l'instantané: rejouer l'ancien journal
+        # sur le nouvel instantané reste sans effet (opérations idempotentes)
+        with open(journal_path, 'wb'):
+            pass
+    state.update(signature=_file_signature(path), journal_offset=0, journal_entries=0)
+
+
+def _append_journal(state: Dict[str, Any], entries: List[Dict[str, Any]]) -> None:
+    """Ajoute des mutations au journal en une écriture (coût indépendant de la taille de l'inventaire)."""
+    data = ''.join(json.dumps(e, ensure_ascii=False, separators=(',', ':')) + '\n' for e in entries)
+    raw = data.encode('utf-8')
+    with open(_journal_path(state['path']), 'ab') as f:
+        f.write(raw)
+    state['journal_offset'] += len(raw)
+    state['journal_entries'] += len(entries)
+    if state['journal_entries'] >= _compact_threshold(len(state['records'])):
+        _write_snapshot(state)
+
+
+MUTATION_OPS = ('add', 'update', 'delete')
+
+
+def normalize_operation(operation: Any) -> Dict[str, Any]:
+    """
+    Valide une opération de ``apply_mutations`` et la met sous forme canonique:
+    ``{'op': 'add', 'data': {...}}``, ``{'op': 'update', 'id': 3, 'changes': {...}}``
+    ou ``{'op': 'delete', 'id': 3}``.
+    Raises:
+        ValueError: opération mal formée.
+    """
+    if not isinstance(operation, Mapping):
+        raise ValueError('opération invalide: objet attendu')
+    op = operation.get('op')
+    if op not in MUTATION_OPS:
+        raise ValueError(f"opération inconnue: {op!r} (attendu: {', '.join(MUTATION_OPS)})")
+    if op == 'add':
+        data = operation.get('data')
+        if not isinstance(data, Mapping):
+            raise ValueError("'data' doit être un objet")
+        return {'op': op, 'data': _detached(data)}
+    equip_id = operation.get('id')
+    if isinstance(equip_id, bool) or not isinstance(equip_id, int):
+        raise ValueError("'id' doit être un entier")
+    if op == 'delete':
+        return {'op': op, 'id': equip_id}
+    changes = operation.get('changes')
+    if not isinstance(changes, Mapping):
+        raise ValueError("'changes' doit être un objet")
+    if 'id' in changes:
+        raise ValueError("'id' ne peut pas être modifié")
+    return {'op': op, 'id': equip_id, 'changes': _detached(changes)}
+
+
+class InventoryBackend(ABC):
+    """Interface commune des moteurs de stockage de l'inventaire."""
+
+    #: Nom du moteur (valeur de ``IPCM_INVENTORY_BACKEND``)
+    kind = ''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    @abstractmethod
+    def load(self) -> List[Dict[str, Any]]:
+        """Retourne tous les équipements (copies modifiables)."""
+
+    def iter_items(self) -> Iterator[Mapping[str, Any]]:
+        """Parcourt les équipements en lecture seule."""
+        for it in self.load():
+            yield MappingProxyType(it)
+
+    @abstractmethod
+    def query(self, filters: Optional[Mapping[str, Sequence[str]]] = None, sort: str = 'id',
+              descending: bool = False, cursor: Optional[str] = None, limit: Optional[int] = None,
+              fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Voir ``query_inventory``."""
+
+    @abstractmethod
+    def apply(self, operations: Iterable[Any]) -> List[Dict[str, Any]]:
+        """
+        Applique un lot d'opérations (voir ``normalize_operation``) de façon
+        atomique vis-à-vis des autres écrivains, avec une seule persistance.
+        Returns:
+            list: un résultat par opération (``ok``, ``id``, ``item`` ou ``error``).
+        """
+
+    @staticmethod
+    def _rejected(operation: Any, exc: Exception) -> Dict[str, Any]:
+        """Résultat d'une opération mal formée."""
+        op = operation.get('op') if isinstance(operation, Mapping) else None
+        return {'op': op, 'ok': False, 'error': str(exc)}
+
+    @staticmethod
+    def _not_found(op: Dict[str, Any]) -> Dict[str, Any]:
+        """Résultat d'une mise à jour ou suppression sur un ID absent."""
+        return {'op': op['op'], 'id': op['id'], 'ok': False, 'error': 'équipement introuvable'}
+
+    def add(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Ajoute un équipement et le retourne avec son ID."""
+        result = self.apply([{'op': 'add', 'data': data}])[0]
+        if not result['ok']:
+            raise ValueError(result['error'])
+        return result['item']
+
+    def update(self, equip_id: int, changes: Dict[str, Any]) -> bool:
+        """
+        Met à jour un équipement; False s'il n'existe pas.
+        Raises:
+            ValueError: modifications invalides (``normalize_operation``).
+        """
+        operation = normalize_operation({'op': 'update', 'id': equip_id, 'changes': changes})
+        return self.apply([operation])[0]['ok']
+
+    def delete(self, equip_id: int) -> bool:
+        """Supprime un équipement; False s'il n'existe pas."""
+        return self.apply([{'op': 'delete', 'id': equip_id}])[0]['ok']
+
+    @abstractmethod
+    def replace_all(self, items: List[Dict[str, Any]]) -> None:
+        """Remplace tout l'inventaire."""
+
+    def _notify(self, changes: List[Change], version: int) -> None:
+        """Transmet un lot de mutations appliqué aux rappels enregistrés (leurs erreurs sont journalisées)."""
+        if not _MUTATION_LISTENERS:
+            return
+        # Vues en lecture seule: les enregistrements peuvent être ceux du cache mémoire
+        changes = [tuple(None if it is None else _read_only(it) for it in pair) for pair in changes]
+        for listener in list(_MUTATION_LISTENERS):
+            try:
+                listener(self, changes, version)
+            except Exception:
+                logger.exception('rappel de mutation en échec (%s)', self.path)
+
+    def compact(self) -> None:
+        """Réorganise le stockage (sans effet par défaut)."""
+
+    def invalidate(self) -> None:
+        """Oublie tout état mis en cache (sans effet par défaut)."""
+
+    def _storage_files(self) -> List[str]:
+        """Fichiers dont le contenu constitue l'état stocké."""
+        return [self.path]
+
+    def signature(self) -> str:
+        """Empreinte courte de l'état stocké (change à chaque écriture), calculée sans lire le contenu."""
+        stats = [_file_signature(p) for p in self._storage_files()]
+        return hashlib.sha1(repr(stats).encode('ascii')).hexdigest()[:16]
+
+    @abstractmethod
+    def version(self) -> int:
+        """Compteur de version monotone de l'inventaire, partagé entre processus."""
+
+    def last_modified(self) -> float:
+        """Date (epoch) de la dernière écriture du stockage."""
+        mtimes = [os.path.getmtime(p) for p in self._storage_files() if os.path.exists(p)]
+        return max(mtimes, default=0.0)
+
+
+class JsonInventoryBackend(InventoryBackend):
+    """
+    Moteur par défaut: fichier JSON, cache mémoire indexé et journal optionnel.
+    Générique sur des enregistrements à ID entier (réutilisé pour les interfaces).
+    """
+
+    kind = 'json'
+
+    def __init__(self, path: str, indexed_fields: Sequence[str] = INDEXED_FIELDS) -> None:
+        super().__init__(path)
+        self.indexed_fields = tuple(indexed_fields)
+        self._lock = threading.RLock()
+        self._cache: Dict[str, Any] = {}
+
+    def _state(self) -> Dict[str, Any]:
+        """
+        Retourne l'état interne en cache, rechargé ou complété si les fichiers ont changé.
+        Seules les mutations de cette classe le modifient; il n'est jamais exposé tel quel.
+        """
+        with self._lock:
+            _ensure_store(self.path)
+            # La signature est lue avant le contenu: une écriture concurrente
+            # provoquera au pire un rechargement supplémentaire, jamais un cache périmé.
+            signature = _file_signature(self.path)
+            if self._cache.get('signature') != signature:
+                self._cache = _load_state(self.path, self.indexed_fields)
+                return self._cache
+            journal_size = _file_size(_journal_path(self.path))
+            if journal_size < self._cache['journal_offset']:
+                # Journal tronqué par une compaction d'un autre processus
+                self._cache = _load_state(self.path, self.indexed_fields)
+            elif journal_size > self._cache['journal_offset']:
+                # Mutations ajoutées par un autre processus: rejeu incrémental
+                _replay_journal(self._cache, _journal_path(self.path))
+            return self._cache
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache = {}
+
+    def _storage_files(self) -> List[str]:
+        return [self.path, _journal_path(self.path)]
+
+    def _record_version(self, bump: bool = True) -> int:
+        """
+        Enregistre la version courante avec la signature des fichiers (verrou de fichier requis).
+        Args:
+            bump: incrémenter la version (False: seule la signature est mise à jour, ex. compaction).
+        """
+        record = _read_version(self.path)
+        version = (record['version'] if record else 0) + (1 if bump or record is None else 0)
+        _atomic_write_json(_version_path(self.path), {'version': version, 'signature': self.signature()},
+                           indent=None)
+        return version
+
+    def version(self) -> int:
+        record = _read_version(self.path)
+        if record is not None and record.get('signature') == self.signature():
+            return record['version']
+        with self._lock, _file_lock(self.path):
+            # Relu sous verrou: un écrivain a pu terminer entre-temps
+            record = _read_version(self.path)
+            if record is not None and record.get('signature') == self.signature():
+                return record['version']
+            # Fichier modifié hors de ce module (ou version jamais enregistrée)
+            _ensure_store(self.path)
+            return self._record_version()
+
+    def load(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [_detached(it) for it in self._state()['records'].values()]
+
+    def iter_items(self) -> Iterator[Mapping[str, Any]]:
+        with self._lock:
+            items = list(self._state()['records'].values())
+        for it in items:
+            yield _read_only(it)
+
+    def query(self, filters: Optional[Mapping[str, Sequence[str]]] = None, sort: str = 'id',
+              descending: bool = False, cursor: Optional[str] = None, limit: Optional[int] = None,
+              fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        position = decode_cursor(cursor) if cursor else None
+        with self._lock:
+            state = self._state()
+            records = state['records']
+            candidates: Optional[Set[Any]] = None
+            scan_filters = []
+            for field, values in (filters or {}).items():
+                values = [_index_value(v) for v in values]
+                if field in state['indexes']:
+                    index = state['indexes'][field]
+                    matched = set().union(*(index.get(v, ()) for v in values))
+                    candidates = matched if candidates is None else candidates & matched
+                else:
+                    scan_filters.append((field, set(values)))
+
+            def accept(it: Mapping[str, Any]) -> bool:
+                return all(_index_value(it.get(f)) in vals for f, vals in scan_filters)
+
+            membership = candidates
+            if candidates is not None and len(candidates) * 8 < len(records):
+                # Peu de résultats: on ne trie que les candidats
+                pairs = sorted(((_sort_key(records[k], sort), k) for k in candidates), key=lambda p: p[0])
+                sort_keys, keys = [p[0] for p in pairs], [p[1] for p in pairs]
+                membership = None
+            else:
+                sort_keys, keys = _sorted_order(state, sort)
+
+            if descending:
+                stop = bisect.bisect_left(sort_keys, position) if position else len(keys)
+                walk: Iterable[int] = range(stop - 1, -1, -1)
+            else:
+                start = bisect.bisect_right(sort_keys, position) if position else 0
+                walk = range(start, len(keys))
+
+            page: List[Dict[str, Any]] = []
+            next_cursor = None
+            for i in walk:
+                key = keys[i]
+                if membership is not None and key not in membership:
+                    continue
+                it = records[key]
+                if scan_filters and not accept(it):
+                    continue
+                if limit is not None and len(page) >= limit:
+                    next_cursor = encode_cursor(_sort_key(page[-1], sort))
+                    break
+                page.append(it)
+
+            if scan_filters:
+                pool = (records[k] for k in candidates) if candidates is not None else records.values()
+                total = sum(1 for it in pool if accept(it))
+            else:
+                total = len(candidates) if candidates is not None else len(records)
+
+        if fields:
+            wanted = ['id'] + [f for f in fields if f != 'id']
+            items = [_detached({f: it[f] for f in wanted if f in it}) for it in page]
+        else:
+            items = [_detached(it) for it in page]
+        return {'items': items, 'total': total, 'next_cursor': next_cursor}
+
+    @contextmanager
+    def _mutation(self) -> Iterator[Dict[str, Any]]:
+        """
+        Section critique d'écriture: verrou de thread puis verrou de fichier,
+        état rafraîchi depuis le disque une fois le verrou obtenu.
+        """
+        with self._lock, _file_lock(self.path):
+            yield self._state()
+
+    def _persist(self, state: Dict[str, Any], entries: List[Dict[str, Any]]) -> None:
+        """Persiste des mutations déjà appliquées en mémoire (journal ou réécriture complète)."""
+        try:
+            if _journal_enabled():
+                _append_journal(state, entries)
+            else:
+                _write_snapshot(state)
+        except BaseException:
+            # L'état mémoire est en avance sur le disque: on l'abandonne
+            self.invalidate()
+            raise
+
+    def apply(self, operations: Iterable[Any]) -> List[Dict[str, Any]]:
+        results: List[Dict[str, Any]] = []
+        entries: List[Dict[str, Any]] = []
+        changes: List[Change] = []
+        with self._mutation() as state:
+            for operation in operations:
+                try:
+                    op = normalize_operation(operation)
+                except ValueError as exc:
+                    results.append(self._rejected(operation, exc))
+                    continue
+                if op['op'] == 'add':
+                    eq = {**op['data'], 'id': state['max_id'] + 1}
+                    entry: Dict[str, Any] = {'op': 'add', 'item': eq}
+                    result = {'op': 'add', 'id': eq['id'], 'ok': True, 'item': _detached(eq)}
+                    before = None
+                else:
+                    entry = op
+                    result = {'op': op['op'], 'id': op['id'], 'ok': True}
+                    before = state['records'].get(op['id'])
+                if _apply_entry(state, entry):
+                    entries.append(entry)
+                    results.append(result)
+                    after = eq if op['op'] == 'add' else ({**before, **op['changes']} if op['op'] == 'update' else None)
+                    changes.append((before, after))
+                else:
+                    results.append(self._not_found(op))
+            if entries:
+                self._persist(state, entries)
+                self._notify(changes, self._record_version())
+        return results
+
+    def replace_all(self, items: List[Dict[str, Any]]) -> None:
+        with self._lock, _file_lock(self.path):
+            _ensure_store(self.path)
+            state = _empty_state(self.path, self.indexed_fields)
+            for it in items:
+                _put_record(state, _detached(it))
+            _write_snapshot(state)
+            self._cache = state
+            self._record_version()
+
+    def compact(self) -> None:
+        with self._mutation() as state:
+            _write_snapshot(state)
+            self._record_version(bump=False)
+
+
+def get_backend() -> InventoryBackend:
+    """
+    Retourne le moteur de stockage configuré (instance partagée par type et chemin).
+    Raises:
+        ValueError: type de moteur inconnu.
+    """
+    kind = _backend_kind()
+    path = _inventory_path(kind)
+    with _BACKENDS_LOCK:
+        backend = _BACKENDS.get((kind, path))
+        if backend is None:
+            if kind == 'json':
+                backend = JsonInventoryBackend(path)
+            elif kind == 'sqlite':
+                from app.inventory.sqlite_store import SqliteInventoryBackend
+                backend = SqliteInventoryBackend(path)
+            else:
+                raise ValueError(f'moteur d\'inventaire inconnu: {kind}')
+            _BACKENDS[(kind, path)] = backend
+        return backend
+
+
+def add_mutation_listener(listener: MutationListener) -> None:
+    """
+    Enregistre ``listener(backend, changes, version)``, appelé après chaque lot de mutations
+    appliqué par ce processus (tous moteurs, y compris celui des interfaces). Les écritures
+    d'autres processus et ``save_inventory`` ne sont pas notifiées: comparer ``version``
+    à la version connue permet de détecter un écart.
+    """
+    if listener not in _MUTATION_LISTENERS:
+        _MUTATION_LISTENERS.append(listener)
+
+
+def remove_mutation_listener(listener: MutationListener) -> None:
+    """Retire un rappel enregistré par ``add_mutation_listener``."""
+    if listener in _MUTATION_LISTENERS:
+        _MUTATION_LISTENERS.remove(listener)
+
+
+def invalidate_cache() -> None:
+    """Vide le cache mémoire; le prochain accès relira le stockage."""
+    get_backend().invalidate()
 
 
 def load_inventory() -> List[Dict[str, Any]]:
-    """Charge l'inventaire depuis le fichier JSON local."""
-    _ensure_store()
-    with open(INVENTORY_PATH, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Charge l'inventaire (copie modifiable des équipements en cache)."""
+    return get_backend().load()
+
+
+def iter_inventory() -> Iterator[Mapping[str, Any]]:
+    """
+    Parcourt l'inventaire sans copie, via des vues en lecture seule.
+    À privilégier pour l'affichage et les exports.
+    """
+    return get_backend().iter_items()
+
+
+def query_inventory(filters: Optional[Mapping[str, Sequence[str]]] = None,
+                    sort: str = 'id',
+                    descending: bool = False,
+                    cursor: Optional[str] = None,
+                    limit: Optional[int] = None,
+                    fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    Interroge l'inventaire avec filtres, tri, pagination par curseur et projection.
+
+    Args:
+        filters: champ -> valeurs acceptées (égalité textuelle, OU entre valeurs,
+            ET entre champs). Les champs de ``INDEXED_FIELDS`` passent par les index.
+        sort: champ de tri (ID en départage).
+        descending: tri décroissant.
+        cursor: curseur ``next_cursor`` renvoyé par la page précédente.
+        limit: taille de page (None = tout).
+        fields: champs à renvoyer (l'ID est toujours inclus).
+    Returns:
+        dict: ``items`` (copies), ``total`` (nombre de résultats filtrés) et
+        ``next_cursor`` (None sur la dernière page).
+    Raises:
+        ValueError: curseur invalide.
+    """
+    return get_backend().query(filters, sort, descending, cursor, limit, fields)
+
+
+def inventory_version() -> int:
+    """Version courante de l'inventaire (incrémentée à chaque écriture, sans charger les données)."""
+    return get_backend().version()
+
+
+def inventory_last_modified() -> float:
+    """Date (epoch) de la dernière écriture de l'inventaire."""
+    return get_backend().last_modified()
+
+
+def compact_inventory() -> None:
+    """Force la compaction: écrit un nouvel instantané et vide le journal."""
+    get_backend().compact()
 
 
 def save_inventory(items: List[Dict[str, Any]]) -> None:
     """Sauvegarde la liste d'équipements dans le fichier JSON local."""
-    _ensure_store()
-    with open(INVENTORY_PATH, 'w', encoding='utf-8') as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
+    get_backend().replace_all(items)
 
 
-def _next_id(items: List[Dict[str, Any]]) -> int:
-    """Retourne le prochain ID disponible pour un nouvel équipement."""
-    return (max([it.get('id', 0) for it in items]) + 1) if items else 1
+def apply_mutations(operations: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    Applique un lot d'ajouts/mises à jour/suppressions sous un seul verrou,
+    avec une seule persistance (voir ``normalize_operation`` pour le format).
+    Returns:
+        list: un résultat par opération, dans l'ordre.
+    """
+    return get_backend().apply(operations)
 
 
 def add_equipment(data: Dict[str, Any]) -> Dict[str, Any]:
     """Ajoute un nouvel équipement à l'inventaire."""
-    items = load_inventory()
-    eq = {**data}
-    eq['id'] = _next_id(items)
-    items.append(eq)
-    save_inventory(items)
-    return eq
+    return get_backend().add(data)
 
 
 def update_equipment(equip_id: int, changes: Dict[str, Any]) -> bool:
     """Met à jour un équipement existant par son ID."""
-    items = load_inventory()
-    found = False
-    for it in items:
-        if it.get('id') == equip_id:
-            it.update(changes)
-            found = True
-            break
-    if found:
-        save_inventory(items)
-    return found
+    return get_backend().update(equip_id, changes)
 
 
 def delete_equipment(equip_id: int) -> bool:
     """Supprime un équipement de l'inventaire par son ID."""
-    """Supprime un équipement de l'inventaire par son ID."""
-    current_items = load_inventory()
-    new_items = [it for it in current_items if it.get('id') != equip_id]
-    if len(new_items) != len(current_items):
-        save_inventory(new_items)
-        return True
-    return False
+    return get_backend().delete(equip_id)
@@ -1,12 +1,201 @@
 """
-Module de visualisation et calcul d'utilisation des interfaces
+Calcul des débits et de l'utilisation des interfaces à partir des compteurs SNMP.
+
+``CounterRateEngine`` garde le dernier échantillon de chaque interface
+(compteurs d'octets et horodatage) et calcule, pour tout un cycle de
+collecte en une seule passe NumPy, les débits entrant/sortant en bit/s et
+l'utilisation en % du débit nominal (``speed``, en bit/s, dérivé de
+ifHighSpeed par ``app.snmp.tables``).
+
+- Bouclage: la différence de deux compteurs est prise modulo 2^64 ou 2^32
+  (``counter_bits`` de la ligne, 64 par défaut pour ifHC*Octets).
+- Remise à zéro (redémarrage, effacement des compteurs): un compteur 64
+  bits qui décroît, ou un débit calculé supérieur au débit nominal, ne
+  donne pas de valeur; l'échantillon sert de nouvelle référence.
+- Premier échantillon d'une interface, ou horodatage non croissant: pas de
+  valeur non plus.
+
+NumPy est requis (import optionnel, comme openpyxl pour les exports).
 """
-from app.inventory.interfaces import Interface
-from app.snmp.collector import collect_interface_data
-
-def calculate_utilization(interface):
-    # Placeholder: à compléter avec la logique de calcul
-    if interface.speed:
-        utilization = ((interface.in_octets + interface.out_octets) / interface.speed) * 100
-        return round(utilization, 2)
-    return 0
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence
+
+try:
+    import numpy as np
+except Exception:  # keep offline even if numpy missing
+    np = None
+
+# État d'un échantillon dans un lot
+STATUS_OK, STATUS_FIRST, STATUS_RESET, STATUS_STALE = 0, 1, 2, 3
+STATUS_NAMES = ('ok', 'first', 'reset', 'stale')
+
+# Tolérance au-delà du débit nominal avant de considérer le débit comme impossible
+RESET_SPEED_MARGIN = 1.05
+
+_MASK32 = 0xFFFFFFFF
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def interface_key(row: Mapping[str, Any]) -> Hashable:
+    """Clé d'une interface: (équipement, ifIndex), à défaut (équipement, nom)."""
+    index = row.get('ifIndex')
+    return row.get('equipment_id'), index if index is not None else row.get('name')
+
+
+@dataclass
+class RateBatch:
+    """Résultat d'un lot: tableaux alignés sur les lignes fournies (NaN si pas de valeur)."""
+    keys: List[Hashable]
+    in_bps: Any
+    out_bps: Any
+    in_utilization: Any
+    out_utilization: Any
+    status: Any
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def utilization(self) -> Any:
+        """Utilisation du sens le plus chargé (%)."""
+        return np.fmax(self.in_utilization, self.out_utilization)
+
+    @property
+    def used_bps(self) -> Any:
+        """Débit du sens le plus chargé (bit/s)."""
+        return np.fmax(self.in_bps, self.out_bps)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Lignes sérialisables (None à la place de NaN)."""
+        def value(x: float) -> Optional[float]:
+            return None if math.isnan(x) else round(float(x), 3)
+        return [{'key': key, 'in_bps': value(i), 'out_bps': value(o),
+                 'in_utilization': value(iu), 'out_utilization': value(ou), 'status': STATUS_NAMES[s]}
+                for key, i, o, iu, ou, s in zip(self.keys, self.in_bps.tolist(), self.out_bps.tolist(),
+                                                self.in_utilization.tolist(), self.out_utilization.tolist(),
+                                                self.status.tolist())]
+
+
+class CounterRateEngine:
+    """Débits et utilisation par interface, calculés par lots à partir des compteurs cumulés."""
+
+    def __init__(self, capacity: int = 1024,
+                 key: Callable[[Mapping[str, Any]], Hashable] = interface_key) -> None:
+        if np is None:
+            raise RuntimeError("calcul des débits indisponible (numpy manquant)")
+        self.key = key
+        self._slots: Dict[Hashable, int] = {}
+        self._prev_in = np.zeros(capacity, dtype=np.uint64)
+        self._prev_out = np.zeros(capacity, dtype=np.uint64)
+        self._prev_time = np.full(capacity, np.nan)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._prev_time)
+        if needed <= capacity:
+            return
+        size = max(needed, capacity * 2)
+        self._prev_in = np.concatenate([self._prev_in, np.zeros(size - capacity, dtype=np.uint64)])
+        self._prev_out = np.concatenate([self._prev_out, np.zeros(size - capacity, dtype=np.uint64)])
+        self._prev_time = np.concatenate([self._prev_time, np.full(size - capacity, np.nan)])
+
+    def _slot_indexes(self, keys: Sequence[Hashable]) -> Any:
+        slots = self._slots
+        indexes = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            slot = slots.get(key)
+            if slot is None:
+                slot = slots[key] = len(slots)
+            indexes[i] = slot
+        self._grow(len(slots))
+        return indexes
+
+    def forget(self, keys: Iterable[Hashable]) -> None:
+        """Oublie l'échantillon précédent des interfaces données (le prochain sera un premier échantillon)."""
+        for key in keys:
+            slot = self._slots.get(key)
+            if slot is not None:
+                self._prev_time[slot] = np.nan
+
+    def update(self, rows: Sequence[Mapping[str, Any]], timestamp: Optional[float] = None) -> RateBatch:
+        """
+        Ajoute les échantillons d'un cycle de collecte et calcule les débits.
+
+        Args:
+            rows: lignes ``Interface`` (``in_octets``, ``out_octets``, ``speed`` en bit/s,
+                ``counter_bits`` optionnel, ``timestamp`` optionnel par ligne).
+            timestamp: horodatage (s) des lignes qui n'en ont pas (maintenant par défaut).
+        Returns:
+            RateBatch: débits (bit/s), utilisation (%) et état de chaque ligne.
+        """
+        n = len(rows)
+        now = time.time() if timestamp is None else float(timestamp)
+        keys = [self.key(r) for r in rows]
+        idx = self._slot_indexes(keys)
+        stamp = np.fromiter((r.get('timestamp', now) for r in rows), dtype=np.float64, count=n)
+        cur_in = np.fromiter((int(r.get('in_octets') or 0) & _MASK64 for r in rows), dtype=np.uint64, count=n)
+        cur_out = np.fromiter((int(r.get('out_octets') or 0) & _MASK64 for r in rows), dtype=np.uint64, count=n)
+        speed = np.fromiter((float(r.get('speed') or 0) for r in rows), dtype=np.float64, count=n)
+        is64 = np.fromiter((int(r.get('counter_bits') or 64) == 64 for r in rows), dtype=bool, count=n)
+
+        prev_in, prev_out, prev_time = self._prev_in[idx], self._prev_out[idx], self._prev_time[idx]
+        first = np.isnan(prev_time)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            elapsed = stamp - prev_time
+            stale = ~first & ~(elapsed > 0)
+            # Soustraction non signée: le bouclage 2^64 est implicite, 2^32 par masque
+            mask = np.where(is64, np.uint64(_MASK64), np.uint64(_MASK32))
+            in_bps = ((cur_in - prev_in) & mask).astype(np.float64) * 8.0 / elapsed
+            out_bps = ((cur_out - prev_out) & mask).astype(np.float64) * 8.0 / elapsed
+            decreased = (cur_in < prev_in) | (cur_out < prev_out)
+            too_fast = (speed > 0) & ((in_bps > speed * RESET_SPEED_MARGIN) | (out_bps > speed * RESET_SPEED_MARGIN))
+            reset = ~first & ~stale & ((is64 & decreased) | too_fast)
+            status = np.select([first, stale, reset], [STATUS_FIRST, STATUS_STALE, STATUS_RESET], STATUS_OK)
+            invalid = status != STATUS_OK
+            in_bps[invalid] = np.nan
+            out_bps[invalid] = np.nan
+            has_speed = speed > 0
+            in_util = np.where(has_speed, in_bps / speed * 100.0, np.nan)
+            out_util = np.where(has_speed, out_bps / speed * 100.0, np.nan)
+
+        # Nouvelle référence pour chaque interface, sauf échantillon hors d'ordre
+        keep = ~stale
+        self._prev_in[idx[keep]] = cur_in[keep]
+        self._prev_out[idx[keep]] = cur_out[keep]
+        self._prev_time[idx[keep]] = stamp[keep]
+        return RateBatch(keys, in_bps, out_bps, in_util, out_util, status.astype(np.int8))
+
+    def update_from_results(self, results: Iterable[Any], timestamp: Optional[float] = None) -> RateBatch:
+        """Lot à partir de ``PollResult`` de collecte d'interfaces (``values['interfaces']``)."""
+        rows = [row for result in results if result.ok for row in result.values.get('interfaces', ())]
+        return self.update(rows, timestamp)
+
+
+def calculate_utilization(interface: Any, engine: Optional[CounterRateEngine] = None,
+                          timestamp: Optional[float] = None) -> Optional[float]:
+    """
+    Utilisation (%) du sens le plus chargé d'une interface depuis son échantillon précédent.
+
+    Un débit demande deux échantillons: l'échantillon précédent est tenu par ``engine``,
+    qui appartient à l'appelant. Sans moteur, ou au premier échantillon (remise à zéro,
+    horodatage non croissant, débit nominal inconnu), la fonction retourne None: des
+    compteurs cumulés seuls ne donnent pas d'utilisation. Préférer
+    ``CounterRateEngine.update`` sur tout un cycle de collecte.
+    Args:
+        interface: objet ``Interface`` ou dict de mêmes champs.
+        engine: moteur de débits tenant les échantillons précédents.
+        timestamp: horodatage (s) de l'échantillon, maintenant par défaut.
+    Returns:
+        float | None: utilisation arrondie à 0,01 %, None si elle n'est pas calculable.
+    """
+    if engine is None:
+        return None
+    row = interface if isinstance(interface, Mapping) else vars(interface)
+    value = float(engine.update([row], timestamp).utilization[0])
+    return None if math.isnan(value) else round(value, 2)
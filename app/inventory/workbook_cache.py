@@ -0,0 +1,240 @@
+"""
+Chargement de classeurs Excel avec instantané binaire en cache.
+
+L'analyse XLSX est l'étape la plus lente de l'ingestion, alors que les
+mêmes classeurs (« IP Capacity Management ») sont relus sans cesse.
+``load_workbook_snapshot`` analyse chaque feuille une seule fois, en
+parallèle (un processus par feuille), et enregistre le résultat sous forme
+colonnaire (une liste de valeurs par colonne) dans un fichier pickle nommé
+d'après l'empreinte SHA-256 du contenu du classeur. Les chargements suivants
+d'un classeur inchangé se limitent à hacher le fichier et relire ce pickle;
+dans un même processus, l'empreinte n'est recalculée que si la signature
+(inode, taille, mtime) du fichier change.
+
+Le cache (``data/workbook-cache``, surcharge via ``IPCM_WORKBOOK_CACHE_DIR``)
+ne contient que des fichiers produits par l'application: un pickle n'est
+jamais lu depuis une autre source.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import openpyxl
+except Exception:  # keep offline even if openpyxl missing
+    openpyxl = None
+
+from app.inventory.store import DATA_DIR
+
+# Incrémenté quand la structure de l'instantané change (invalide les anciens fichiers)
+SNAPSHOT_FORMAT = 1
+
+# Lignes examinées pour trouver la ligne d'en-tête (sous un éventuel titre)
+HEADER_SCAN_ROWS = 20
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+_DIGESTS_LOCK = threading.Lock()
+_DIGESTS: Dict[str, Tuple[Tuple[int, int, int], str]] = {}
+
+
+@dataclass
+class SheetTable:
+    """Feuille analysée, stockée par colonnes."""
+    name: str
+    header: List[str]
+    columns: List[List[Any]] = field(default_factory=list)
+    # Numéro (Excel) de la ligne d'en-tête; les données commencent juste après
+    header_row: int = 1
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def column(self, name: str) -> List[Any]:
+        """Valeurs d'une colonne, par nom d'en-tête (KeyError si absente)."""
+        try:
+            return self.columns[self.header.index(name)]
+        except ValueError:
+            raise KeyError(name)
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        """Parcourt les lignes sous forme de dictionnaires {en-tête: valeur}."""
+        for values in zip(*self.columns):
+            yield dict(zip(self.header, values))
+
+
+@dataclass
+class WorkbookSnapshot:
+    """Contenu analysé d'un classeur: feuilles par nom, dans l'ordre du classeur."""
+    digest: str
+    sheets: Dict[str, SheetTable]
+
+    def sheet(self, name: Optional[str] = None) -> SheetTable:
+        """Feuille ``name`` (la première par défaut)."""
+        return self.sheets[name] if name else next(iter(self.sheets.values()))
+
+
+def workbook_cache_dir() -> str:
+    """Dossier des instantanés (variable d'environnement relue à chaque appel)."""
+    return os.environ.get('IPCM_WORKBOOK_CACHE_DIR') or os.path.join(DATA_DIR, 'workbook-cache')
+
+
+def file_digest(path: str) -> str:
+    """Empreinte SHA-256 du fichier, mémorisée tant que sa signature ne change pas."""
+    st = os.stat(path)
+    signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+    key = os.path.abspath(path)
+    with _DIGESTS_LOCK:
+        cached = _DIGESTS.get(key)
+    if cached and cached[0] == signature:
+        return cached[1]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _DIGESTS_LOCK:
+        _DIGESTS[key] = (signature, digest)
+    return digest
+
+
+def _header_label(value: Any, position: int, seen: Dict[str, int]) -> str:
+    """Libellé d'en-tête nettoyé, unique dans la feuille (« col7 » si vide)."""
+    label = ' '.join(str(value).split()) if value is not None else ''
+    label = label or f'col{position + 1}'
+    if label in seen:
+        seen[label] += 1
+        label = f'{label}.{seen[label]}'
+    else:
+        seen[label] = 0
+    return label
+
+
+def _parse_sheet(path: str, sheet_name: str) -> SheetTable:
+    """
+    Analyse une feuille (exécutée dans un processus du pool).
+
+    L'en-tête est la première ligne portant au moins deux valeurs, ce qui saute
+    une ligne de titre fusionnée. Les colonnes sans en-tête ni valeur et les
+    lignes vides de fin sont écartées.
+    """
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header: Tuple[Any, ...] = ()
+        header_row = 0
+        for header_row, row in enumerate(rows, start=1):
+            if sum(v is not None for v in row) >= 2 or header_row >= HEADER_SCAN_ROWS:
+                header = row
+                break
+        width = len(header)
+        columns: List[List[Any]] = [[] for _ in range(width)]
+        filled = 0
+        for row in rows:
+            for i in range(width):
+                columns[i].append(row[i] if i < len(row) else None)
+            if any(v is not None for v in row[:width]):
+                filled = len(columns[0]) if width else 0
+    finally:
+        wb.close()
+    seen: Dict[str, int] = {}
+    labels, kept = [], []
+    for i, value in enumerate(header):
+        values = columns[i][:filled]
+        if value is None and all(v is None for v in values):
+            continue
+        labels.append(_header_label(value, i, seen))
+        kept.append(values)
+    return SheetTable(name=sheet_name, header=labels, columns=kept, header_row=header_row or 1)
+
+
+def _parse_workbook(path: str, workers: Optional[int]) -> Dict[str, SheetTable]:
+    """Analyse toutes les feuilles, en parallèle s'il y en a plusieurs."""
+    wb = openpyxl.load_workbook(path, read_only=True)
+    names = list(wb.sheetnames)
+    wb.close()
+    if len(names) > 1 and workers != 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(names))) as pool:
+                tables = list(pool.map(_parse_sheet, [path] * len(names), names))
+            return dict(zip(names, tables))
+        except (OSError, BrokenProcessPool):
+            pass  # environnement sans multiprocessing: analyse séquentielle
+    return {name: _parse_sheet(path, name) for name in names}
+
+
+def _snapshot_path(path: str, digest: str, cache_dir: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f'{stem}@{digest[:32]}@v{SNAPSHOT_FORMAT}.pickle')
+
+
+def _read_snapshot(snapshot_path: str, digest: str) -> Optional[WorkbookSnapshot]:
+    try:
+        with open(snapshot_path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(snapshot, WorkbookSnapshot) or snapshot.digest != digest:
+        return None
+    return snapshot
+
+
+def _write_snapshot(snapshot_path: str, snapshot: WorkbookSnapshot) -> None:
+    """Écrit l'instantané atomiquement et supprime ceux des contenus précédents du même fichier."""
+    cache_dir = os.path.dirname(snapshot_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.workbook-', suffix='.tmp', dir=cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, snapshot_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+    except (OSError, pickle.PicklingError):
+        return  # cache non inscriptible: le résultat reste utilisable
+    stem = os.path.basename(snapshot_path).split('@', 1)[0]
+    for name in os.listdir(cache_dir):
+        if name.startswith(f'{stem}@') and name != os.path.basename(snapshot_path):
+            try:
+                os.unlink(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def load_workbook_snapshot(path: str, workers: Optional[int] = None,
+                           cache_dir: str = '') -> WorkbookSnapshot:
+    """
+    Retourne le contenu analysé d'un classeur, depuis le cache si son contenu n'a pas changé.
+
+    Args:
+        path: chemin du classeur.
+        workers: processus d'analyse (``1`` pour une analyse séquentielle).
+        cache_dir: dossier des instantanés (``workbook_cache_dir()`` par défaut).
+    Returns:
+        WorkbookSnapshot: feuilles analysées et empreinte du contenu.
+    Raises:
+        RuntimeError: openpyxl absent et aucun instantané disponible.
+    """
+    digest = file_digest(path)
+    snapshot_path = _snapshot_path(path, digest, cache_dir or workbook_cache_dir())
+    snapshot = _read_snapshot(snapshot_path, digest)
+    if snapshot is not None:
+        return snapshot
+    if openpyxl is None:
+        raise RuntimeError("analyse Excel indisponible (openpyxl manquant)")
+    snapshot = WorkbookSnapshot(digest=digest, sheets=_parse_workbook(path, workers))
+    _write_snapshot(snapshot_path, snapshot)
+    return snapshot
@@ -4,9 +4,30 @@ Module d'analyse prédictive de capacité (offline, sans dépendances lourdes).
 Fonctions :
 - predict_capacity(data, periods): Régression linéaire simple pour estimer les périodes futures.
 Entrée : liste de tuples (date, valeur). Sortie : liste de valeurs prédites (float).
+- batch_predict_capacity(values, periods, mask): même modèle pour des milliers de séries à la fois
+  (tableau 2-D, une série par ligne, longueurs inégales via un masque), calculé avec NumPy.
+- OnlineLinearRegression / OnlineRegressionBank: même modèle mis à jour en O(1) par échantillon
+  (oubli exponentiel ou fenêtre glissante en option), pour une série ou toute la flotte.
+- predict_capacity_timed / saturation_dates / rank_saturation: régression sur les dates réelles
+  (relevés irréguliers), date de franchissement de 80 % / 100 % et classement de la flotte.
+- online_saturation_rows: mêmes lignes lues directement dans un OnlineRegressionBank (sans réajustement).
+- ForecastCache: cache LRU/durée de vie des prévisions par (série, dernier échantillon, paramètres).
 """
 
-from typing import Iterable, List, Tuple
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except Exception:  # keep offline even if numpy missing
+    np = None
 
 
 def _linear_regression_coeffs(y: Iterable[float]) -> Tuple[float, float]:
@@ -60,3 +81,702 @@ def predict_capacity(data: List[Tuple[str, float]], periods: int = 12) -> List[f
     n = len(y_series)
     preds = [m * (n + i) + b for i in range(periods)]
     return preds
+
+
+def pad_series(series: Sequence[Sequence[float]]) -> Tuple[Any, Any]:
+    """
+    Aligne des séries de longueurs inégales à gauche dans un tableau 2-D.
+    Args:
+        series: une séquence de valeurs par série.
+    Returns:
+        Tuple[ndarray, ndarray]: (valeurs float64 complétées par NaN, masque des valeurs présentes)
+    """
+    if np is None:
+        raise RuntimeError("prévision par lots indisponible (numpy manquant)")
+    width = max((len(s) for s in series), default=0)
+    values = np.full((len(series), width), np.nan)
+    for i, s in enumerate(series):
+        values[i, :len(s)] = s
+    return values, ~np.isnan(values)
+
+
+def _batch_inputs(values: Any, mask: Any, x: Any = None) -> Tuple[Any, Any]:
+    if np is None:
+        raise RuntimeError("prévision par lots indisponible (numpy manquant)")
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    mask = ~np.isnan(values) if mask is None else np.asarray(mask, dtype=bool) & ~np.isnan(values)
+    if mask.shape != values.shape:
+        raise ValueError('le masque doit avoir la forme des valeurs')
+    if x is not None and np.ndim(x) == 2:
+        x = np.asarray(x, dtype=np.float64)
+        if x.shape != values.shape:
+            raise ValueError('les abscisses doivent avoir la forme des valeurs')
+        mask &= ~np.isnan(x)
+    return values, mask
+
+
+def _batch_fit(values: Any, mask: Any, x: Any) -> Tuple[Any, Any, Any]:
+    """
+    Moindres carrés par ligne sur des abscisses décalées par ligne (``origin``: première
+    abscisse présente), pour garder la précision avec des horodatages.
+    Returns:
+        Tuple[ndarray, ndarray, ndarray]: (pentes, ordonnées à l'origine décalée, origines)
+    """
+    weights = mask.astype(np.float64)
+    y = np.where(mask, values, 0.0)
+    n = weights.sum(axis=1)
+    safe_n = np.maximum(n, 1.0)
+    mean_y = y.sum(axis=1) / safe_n
+    if x is None or np.ndim(x) == 1:
+        # Abscisses communes: sommes par ligne en produits matrice-vecteur
+        shared = np.arange(values.shape[1], dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+        if shared.shape != (values.shape[1],):
+            raise ValueError('une abscisse par colonne attendue')
+        first = shared[0] if len(shared) else 0.0
+        shared = shared - first
+        origin = np.full(len(values), first)
+        mean_x = (weights @ shared) / safe_n
+        sxx = weights @ (shared * shared) - n * mean_x * mean_x
+        sxy = y @ shared - n * mean_x * mean_y
+    else:
+        present = mask.any(axis=1)
+        origin = np.where(present, np.asarray(x)[np.arange(len(values)), np.argmax(mask, axis=1)], 0.0)
+        shifted = np.where(mask, np.asarray(x) - origin[:, None], 0.0)
+        mean_x = shifted.sum(axis=1) / safe_n
+        sxx = (shifted * shifted).sum(axis=1) - n * mean_x * mean_x
+        sxy = (y * shifted).sum(axis=1) - n * mean_x * mean_y
+    spread = np.where(sxx > 1e-9 * np.maximum(n, 1.0) * np.maximum(mean_x * mean_x, 1.0), sxx, 0.0)
+    slopes = np.where(spread > 0, sxy / np.where(spread > 0, spread, 1.0), 0.0)
+    return slopes, mean_y - slopes * mean_x, origin
+
+
+def batch_linear_regression_coeffs(values: Any, mask: Optional[Any] = None, x: Optional[Any] = None) -> Tuple[Any, Any]:
+    """
+    Coefficients (pente, ordonnée) des moindres carrés pour chaque ligne, en une passe NumPy.
+
+    Sans ``x``, l'abscisse d'une valeur est son indice de colonne: pour des séries alignées à
+    gauche (``pad_series``), c'est exactement le modèle de ``_linear_regression_coeffs``;
+    un trou au milieu d'une série compte comme un pas de temps manquant.
+    Args:
+        values: tableau (séries x pas); NaN = absent.
+        mask: booléens, True pour les valeurs à utiliser (défaut: non-NaN).
+        x: abscisses (horodatages...), une par colonne (1-D) ou une par valeur (2-D).
+    Returns:
+        Tuple[ndarray, ndarray]: (pentes, ordonnées). Moins de 2 points: pente nulle et
+        ordonnée égale à la moyenne (0 sans point), comme la version par série.
+    """
+    values, mask = _batch_inputs(values, mask, x)
+    slopes, intercepts, origin = _batch_fit(values, mask, x)
+    return slopes, intercepts - slopes * origin
+
+
+def batch_predict_capacity(values: Any, periods: int = 12, mask: Optional[Any] = None) -> Any:
+    """
+    Prévisions des ``periods`` pas suivant la dernière valeur présente de chaque ligne.
+    Args:
+        values: tableau (séries x pas), voir ``batch_linear_regression_coeffs``.
+        periods: nombre de pas à prédire.
+        mask: valeurs à utiliser (défaut: non-NaN).
+    Returns:
+        ndarray: (séries x periods); NaN pour une série sans valeur.
+    """
+    values, mask = _batch_inputs(values, mask)
+    slopes, intercepts = batch_linear_regression_coeffs(values, mask)
+    present = mask.any(axis=1)
+    last = np.where(present, values.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1), -1)
+    steps = last[:, None] + 1 + np.arange(periods)
+    forecast = slopes[:, None] * steps + intercepts[:, None]
+    forecast[~present] = np.nan
+    return forecast
+
+
+class OnlineLinearRegression:
+    """
+    Régression linéaire incrémentale d'une série: chaque échantillon met à jour pente et
+    ordonnée en O(1), sans relire l'historique.
+
+    L'état est celui des moindres carrés pondérés sous forme centrée (poids total, moyennes,
+    co-moments), mis à jour à la Welford: stable numériquement même avec des abscisses
+    horodatées. Options (exclusives):
+    - ``forgetting``: facteur d'oubli exponentiel appliqué aux poids à chaque échantillon
+      (1.0 = aucun oubli, même résultat que ``_linear_regression_coeffs``);
+    - ``half_life``: oubli selon l'écart d'abscisse (poids divisé par 2 tous les ``half_life``);
+    - ``window``: seules les ``window`` dernières valeurs comptent (fenêtre glissante).
+    """
+    __slots__ = ('forgetting', 'half_life', 'window', 'count', 'weight', 'mean_x', 'mean_y',
+                 'cxx', 'cxy', 'last_x', '_points')
+
+    def __init__(self, forgetting: float = 1.0, half_life: Optional[float] = None,
+                 window: Optional[int] = None) -> None:
+        _check_online_options(forgetting, half_life, window)
+        self.forgetting, self.half_life, self.window = forgetting, half_life, window
+        self.count = 0
+        self.weight = self.mean_x = self.mean_y = self.cxx = self.cxy = 0.0
+        self.last_x: Optional[float] = None
+        self._points: Optional[deque] = deque() if window else None
+
+    def _add(self, x: float, y: float, decay: float) -> None:
+        self.weight *= decay
+        self.cxx *= decay
+        self.cxy *= decay
+        self.weight += 1.0
+        dx = x - self.mean_x
+        self.mean_x += dx / self.weight
+        self.mean_y += (y - self.mean_y) / self.weight
+        self.cxx += dx * (x - self.mean_x)
+        self.cxy += dx * (y - self.mean_y)
+
+    def _remove(self, x: float, y: float) -> None:
+        weight = self.weight - 1.0
+        if weight <= 0:
+            self.weight = self.mean_x = self.mean_y = self.cxx = self.cxy = 0.0
+            return
+        mean_x = (self.weight * self.mean_x - x) / weight
+        mean_y = (self.weight * self.mean_y - y) / weight
+        self.cxx -= (x - mean_x) * (x - self.mean_x)
+        self.cxy -= (x - mean_x) * (y - self.mean_y)
+        self.weight, self.mean_x, self.mean_y = weight, mean_x, mean_y
+
+    def _rebuild(self) -> None:
+        """Recalcule l'état depuis la fenêtre (borne la dérive des soustractions successives)."""
+        points = list(self._points)
+        self.weight = self.mean_x = self.mean_y = self.cxx = self.cxy = 0.0
+        for x, y in points:
+            self._add(x, y, 1.0)
+
+    def update(self, y: float, x: Optional[float] = None) -> None:
+        """Ajoute une valeur; abscisse par défaut = rang de l'échantillon (0, 1, 2...)."""
+        x = float(self.count if x is None else x)
+        y = float(y)
+        if self.half_life is not None and self.last_x is not None:
+            decay = 0.5 ** (max(x - self.last_x, 0.0) / self.half_life)
+        else:
+            decay = self.forgetting
+        self._add(x, y, decay)
+        self.count += 1
+        self.last_x = x
+        if self._points is not None:
+            self._points.append((x, y))
+            if len(self._points) > self.window:
+                self._remove(*self._points.popleft())
+            if self.count % self.window == 0:
+                self._rebuild()
+
+    def coeffs(self) -> Tuple[float, float]:
+        """(pente, ordonnée); moins de 2 abscisses distinctes: pente nulle, ordonnée = moyenne."""
+        if self.cxx <= 1e-12 * max(self.weight, 1.0):
+            return 0.0, self.mean_y
+        slope = self.cxy / self.cxx
+        return slope, self.mean_y - slope * self.mean_x
+
+    def predict(self, periods: int = 12, step: float = 1.0) -> List[float]:
+        """Valeurs prédites aux ``periods`` abscisses suivant la dernière, espacées de ``step``."""
+        if self.last_x is None:
+            return []
+        m, b = self.coeffs()
+        return [m * (self.last_x + step * (i + 1)) + b for i in range(periods)]
+
+
+def _check_online_options(forgetting: float, half_life: Optional[float], window: Optional[int]) -> None:
+    if not 0 < forgetting <= 1:
+        raise ValueError('forgetting doit être dans ]0, 1]')
+    if half_life is not None and half_life <= 0:
+        raise ValueError('half_life doit être positif')
+    if window is not None and window < 2:
+        raise ValueError('window doit valoir au moins 2')
+    if sum((forgetting < 1, half_life is not None, window is not None)) > 1:
+        raise ValueError('forgetting, half_life et window sont exclusifs')
+
+
+class OnlineRegressionBank:
+    """
+    ``OnlineLinearRegression`` pour toute une flotte: un état par série dans des tableaux
+    NumPy, mis à jour pour un cycle de collecte entier en une passe.
+    """
+
+    def __init__(self, capacity: int = 1024, forgetting: float = 1.0, half_life: Optional[float] = None,
+                 window: Optional[int] = None) -> None:
+        if np is None:
+            raise RuntimeError("prévision en continu indisponible (numpy manquant)")
+        _check_online_options(forgetting, half_life, window)
+        self.forgetting, self.half_life, self.window = forgetting, half_life, window
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: List[Hashable] = []
+        self._state = self._empty(capacity)
+
+    def _empty(self, capacity: int) -> Dict[str, Any]:
+        state = {name: np.zeros(capacity) for name in ('weight', 'mean_x', 'mean_y', 'cxx', 'cxy')}
+        state['count'] = np.zeros(capacity, dtype=np.int64)
+        state['last_x'] = np.full(capacity, np.nan)
+        if self.window:
+            state['ring_x'] = np.zeros((capacity, self.window))
+            state['ring_y'] = np.zeros((capacity, self.window))
+        return state
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def keys(self) -> List[Hashable]:
+        return list(self._keys)
+
+    def _rows(self, keys: Sequence[Hashable]) -> Any:
+        rows = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            row = self._slots.get(key)
+            if row is None:
+                row = self._slots[key] = len(self._keys)
+                self._keys.append(key)
+            rows[i] = row
+        capacity = len(self._state['count'])
+        if len(self._keys) > capacity:
+            grown = self._empty(max(len(self._keys), capacity * 2))
+            for name, column in self._state.items():
+                grown[name][:capacity] = column
+            self._state = grown
+        return rows
+
+    def update(self, keys: Sequence[Hashable], values: Any, x: Any = None) -> int:
+        """
+        Ajoute une valeur par série (clés distinctes).
+        Args:
+            keys: clés des séries.
+            values: valeurs alignées sur ``keys``; NaN ignoré.
+            x: abscisse commune ou alignée (défaut: rang de l'échantillon de chaque série).
+        Returns:
+            int: nombre de valeurs retenues.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        rows = self._rows(keys)
+        keep = ~np.isnan(values)
+        rows, y = rows[keep], values[keep]
+        s = self._state
+        count = s['count'][rows]
+        x = count.astype(np.float64) if x is None else \
+            np.broadcast_to(np.asarray(x, dtype=np.float64), keep.shape)[keep]
+        last = s['last_x'][rows]
+        if self.half_life is not None:
+            decay = np.where(np.isnan(last), 1.0, 0.5 ** (np.maximum(x - last, 0.0) / self.half_life))
+        else:
+            decay = np.full(len(rows), self.forgetting)
+        weight = s['weight'][rows] * decay + 1.0
+        dx = x - s['mean_x'][rows]
+        mean_x = s['mean_x'][rows] + dx / weight
+        mean_y = s['mean_y'][rows] + (y - s['mean_y'][rows]) / weight
+        cxx = s['cxx'][rows] * decay + dx * (x - mean_x)
+        cxy = s['cxy'][rows] * decay + dx * (y - mean_y)
+        if self.window:
+            slot = count % self.window
+            full = count >= self.window
+            old_x, old_y = s['ring_x'][rows, slot], s['ring_y'][rows, slot]
+            # Retrait de la valeur sortie de la fenêtre (inverse de l'ajout)
+            removed = np.where(full, weight - 1.0, weight)
+            safe = np.where(removed > 0, removed, 1.0)
+            new_mean_x = np.where(full, (weight * mean_x - old_x) / safe, mean_x)
+            new_mean_y = np.where(full, (weight * mean_y - old_y) / safe, mean_y)
+            cxx = np.where(full, cxx - (old_x - new_mean_x) * (old_x - mean_x), cxx)
+            cxy = np.where(full, cxy - (old_x - new_mean_x) * (old_y - mean_y), cxy)
+            weight, mean_x, mean_y = removed, new_mean_x, new_mean_y
+            s['ring_x'][rows, slot] = x
+            s['ring_y'][rows, slot] = y
+        s['weight'][rows], s['mean_x'][rows], s['mean_y'][rows] = weight, mean_x, mean_y
+        s['cxx'][rows], s['cxy'][rows] = cxx, cxy
+        s['count'][rows] = count + 1
+        s['last_x'][rows] = x
+        if self.window:
+            self._rebuild(rows[(count + 1) % self.window == 0])
+        return int(len(rows))
+
+    def _rebuild(self, rows: Any) -> None:
+        """Recalcule l'état des séries ``rows`` depuis leur fenêtre pleine."""
+        if not len(rows):
+            return
+        s = self._state
+        xs, ys = s['ring_x'][rows], s['ring_y'][rows]
+        mean_x, mean_y = xs.mean(axis=1), ys.mean(axis=1)
+        dx = xs - mean_x[:, None]
+        s['weight'][rows] = float(self.window)
+        s['mean_x'][rows], s['mean_y'][rows] = mean_x, mean_y
+        s['cxx'][rows] = (dx * dx).sum(axis=1)
+        s['cxy'][rows] = (dx * (ys - mean_y[:, None])).sum(axis=1)
+
+    def _select(self, keys: Optional[Iterable[Hashable]]) -> Tuple[List[Hashable], Any]:
+        selected = list(self._keys) if keys is None else [k for k in keys if k in self._slots]
+        return selected, np.fromiter((self._slots[k] for k in selected), dtype=np.intp, count=len(selected))
+
+    def coeffs(self, keys: Optional[Iterable[Hashable]] = None) -> Tuple[List[Hashable], Any, Any]:
+        """(clés, pentes, ordonnées) des séries demandées (toutes par défaut)."""
+        selected, rows = self._select(keys)
+        s = self._state
+        cxx, weight = s['cxx'][rows], s['weight'][rows]
+        defined = cxx > 1e-12 * np.maximum(weight, 1.0)
+        slopes = np.where(defined, s['cxy'][rows] / np.where(defined, cxx, 1.0), 0.0)
+        return selected, slopes, s['mean_y'][rows] - slopes * s['mean_x'][rows]
+
+    def last(self, keys: Optional[Iterable[Hashable]] = None) -> Tuple[List[Hashable], Any, Any]:
+        """(clés, dernières abscisses, nombres de valeurs retenues) des séries demandées."""
+        selected, rows = self._select(keys)
+        return selected, self._state['last_x'][rows], self._state['count'][rows]
+
+    def predict(self, periods: int = 12, step: float = 1.0,
+                keys: Optional[Iterable[Hashable]] = None) -> Tuple[List[Hashable], Any]:
+        """(clés, prévisions séries x periods) aux abscisses suivant la dernière de chaque série."""
+        selected, slopes, intercepts = self.coeffs(keys)
+        _, rows = self._select(selected)
+        steps = self._state['last_x'][rows][:, None] + step * (1 + np.arange(periods))
+        return selected, slopes[:, None] * steps + intercepts[:, None]
+
+    def forget(self, keys: Iterable[Hashable]) -> None:
+        """Réinitialise l'état des séries données."""
+        _, rows = self._select(keys)
+        empty = self._empty(1)
+        for name, column in self._state.items():
+            column[rows] = empty[name][0]
+
+
+# Seuils d'utilisation (%) dont on estime la date de franchissement
+SATURATION_THRESHOLDS = (80.0, 100.0)
+SECONDS_PER_DAY = 86400.0
+# Classement de flotte: réparti entre processus à partir de POOL_MIN_SERIES séries
+POOL_MIN_SERIES = 20000
+POOL_CHUNK_SERIES = 5000
+
+
+def _as_timestamp(value: Any) -> float:
+    """
+    Horodatage (s, UTC) d'une date: nombre, ``datetime`` (naïf = UTC), ``date`` ou texte ISO 8601.
+    Raises:
+        ValueError: date non reconnue.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc).timestamp()
+    raise ValueError(f'date non reconnue: {value!r}')
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='seconds')
+
+
+def _timed_fit(points: Sequence[Tuple[float, float]]) -> Tuple[float, float, float]:
+    """(pente par seconde, ordonnée à l'origine décalée, origine) sur des horodatages réels."""
+    origin = points[0][0]
+    n = len(points)
+    mean_x = sum(t - origin for t, _ in points) / n
+    mean_y = sum(v for _, v in points) / n
+    sxx = sum((t - origin - mean_x) ** 2 for t, _ in points)
+    sxy = sum((t - origin - mean_x) * (v - mean_y) for t, v in points)
+    slope = sxy / sxx if sxx > 0 else 0.0
+    return slope, mean_y - slope * mean_x, origin
+
+
+def _timed_points(data: Iterable[Tuple[Any, float]]) -> List[Tuple[float, float]]:
+    return sorted((_as_timestamp(d), float(v)) for d, v in data)
+
+
+def predict_capacity_timed(data: List[Tuple[Any, float]], periods: int = 12,
+                           step: Optional[float] = None) -> List[Tuple[str, float]] | None:
+    """
+    Comme ``predict_capacity``, mais en régressant sur les dates réelles: un relevé manqué
+    ne fausse plus la pente.
+    Args:
+        data: tuples (date, valeur); date = horodatage, ``datetime``/``date`` ou texte ISO.
+        periods: nombre de points à prédire.
+        step: écart (s) entre points prédits (défaut: écart médian des relevés, sinon 1 jour).
+    Returns:
+        List[Tuple[str, float]] | None: (date ISO UTC, valeur prédite), None si data vide.
+    """
+    if not data:
+        return None
+    points = _timed_points(data)
+    slope, intercept, origin = _timed_fit(points)
+    if step is None:
+        gaps = sorted(b[0] - a[0] for a, b in zip(points, points[1:]) if b[0] > a[0])
+        step = gaps[len(gaps) // 2] if gaps else SECONDS_PER_DAY
+    last = points[-1][0]
+    return [(_iso(last + step * (i + 1)), slope * (last + step * (i + 1) - origin) + intercept)
+            for i in range(periods)]
+
+
+def _crossing(slope: float, intercept: float, origin: float, last: float, threshold: float) -> Optional[float]:
+    """Horodatage où la droite atteint ``threshold`` (dernier relevé si déjà atteint, None si jamais)."""
+    if slope * (last - origin) + intercept >= threshold:
+        return last
+    if slope <= 0:
+        return None
+    return origin + (threshold - intercept) / slope
+
+
+def saturation_dates(data: List[Tuple[Any, float]],
+                     thresholds: Sequence[float] = SATURATION_THRESHOLDS) -> Dict[float, Optional[str]]:
+    """Date (ISO UTC) où la tendance d'une série franchit chaque seuil; None si elle ne le franchit pas."""
+    points = _timed_points(data)
+    if not points:
+        return {t: None for t in thresholds}
+    slope, intercept, origin = _timed_fit(points)
+    result = {}
+    for threshold in thresholds:
+        crossing = _crossing(slope, intercept, origin, points[-1][0], threshold)
+        result[threshold] = None if crossing is None else _iso(crossing)
+    return result
+
+
+def batch_saturation(times: Any, values: Any, mask: Optional[Any] = None,
+                     thresholds: Sequence[float] = SATURATION_THRESHOLDS) -> Dict[str, Any]:
+    """
+    Tendance sur horodatages réels et franchissement des seuils pour chaque ligne.
+    Args:
+        times: horodatages (s), même forme que ``values`` (NaN = absent).
+        values: utilisation (%), une série par ligne.
+    Returns:
+        dict: ``slope_per_day``, ``current`` (tendance au dernier relevé), ``last_time``,
+        ``samples``, et ``crossing`` {seuil: horodatages, NaN si jamais} — tableaux par ligne.
+    """
+    values, mask = _batch_inputs(values, mask, times)
+    times = np.asarray(times, dtype=np.float64)
+    slopes, intercepts, origin = _batch_fit(values, mask, times)
+    last = np.where(mask, times, -np.inf).max(axis=1)
+    present = mask.any(axis=1)
+    last = np.where(present, last, np.nan)
+    current = slopes * (last - origin) + intercepts
+    crossing = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for threshold in thresholds:
+            ahead = origin + (threshold - intercepts) / slopes
+            crossing[threshold] = np.where(current >= threshold, last, np.where(slopes > 0, ahead, np.nan))
+    return {'slope_per_day': slopes * SECONDS_PER_DAY, 'current': current, 'last_time': last,
+            'samples': mask.sum(axis=1), 'crossing': crossing}
+
+
+def _saturation_rows(keys: List[Hashable], series: List[Tuple[Sequence[float], Sequence[float]]],
+                     thresholds: Sequence[float]) -> List[Dict[str, Any]]:
+    """Lignes de tendance d'un paquet de séries (exécuté dans un processus de travail)."""
+    times, _ = pad_series([t for t, _ in series])
+    values, mask = pad_series([v for _, v in series])
+    result = batch_saturation(times, values, mask, thresholds)
+    rows = []
+    for i, key in enumerate(keys):
+        if not result['samples'][i]:
+            continue
+        row = {'key': key, 'current': float(result['current'][i]),
+               'slope_per_day': float(result['slope_per_day'][i]),
+               'last_time': float(result['last_time'][i]), 'samples': int(result['samples'][i])}
+        for threshold in thresholds:
+            crossing = float(result['crossing'][threshold][i])
+            row[f'crossing_{threshold:g}'] = None if math.isnan(crossing) else crossing
+        rows.append(row)
+    return rows
+
+
+def saturation_rows(series: Mapping[Hashable, Tuple[Sequence[float], Sequence[float]]],
+                    thresholds: Sequence[float] = SATURATION_THRESHOLDS,
+                    workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Tendance et franchissements des seuils de chaque série, sans classement ni délais.
+
+    Au-delà de ``POOL_MIN_SERIES`` séries, les paquets de ``POOL_CHUNK_SERIES`` sont traités
+    dans un ``ProcessPoolExecutor`` (séquentiel si ``workers=1`` ou multiprocessing indisponible).
+    Les lignes ne dépendent pas de l'instant de la requête: elles peuvent être mises en cache.
+    """
+    if np is None:
+        raise RuntimeError("prévision par lots indisponible (numpy manquant)")
+    items = [(key, (list(t), list(v))) for key, (t, v) in series.items()]
+    chunks = [items[i:i + POOL_CHUNK_SERIES] for i in range(0, len(items), POOL_CHUNK_SERIES)]
+    args = [([k for k, _ in chunk], [s for _, s in chunk], tuple(thresholds)) for chunk in chunks]
+    if len(items) >= POOL_MIN_SERIES and len(chunks) > 1 and workers != 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(chunks))) as pool:
+                return [row for part in pool.map(_saturation_rows, *zip(*args)) for row in part]
+        except (OSError, BrokenProcessPool):
+            pass  # environnement sans multiprocessing: calcul séquentiel
+    return [row for a in args for row in _saturation_rows(*a)]
+
+
+def online_saturation_rows(bank: OnlineRegressionBank, thresholds: Sequence[float] = SATURATION_THRESHOLDS,
+                           x_unit: float = SECONDS_PER_DAY, min_samples: int = 2) -> List[Dict[str, Any]]:
+    """
+    Lignes de ``saturation_rows`` lues dans les pentes et ordonnées tenues par un
+    ``OnlineRegressionBank``, sans réajustement: O(1) par série.
+    Args:
+        bank: régressions en continu, abscisses en ``x_unit`` secondes (jours par défaut).
+        min_samples: valeurs retenues minimales pour qu'une série apparaisse.
+    """
+    keys, slopes, intercepts = bank.coeffs()
+    _, last_x, counts = bank.last(keys)
+    current = slopes * last_x + intercepts
+    crossing = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for threshold in thresholds:
+            ahead = (threshold - intercepts) / slopes
+            crossing[threshold] = x_unit * np.where(current >= threshold, last_x,
+                                                    np.where(slopes > 0, ahead, np.nan))
+    rows = []
+    for i in np.flatnonzero(counts >= min_samples).tolist():
+        row = {'key': keys[i], 'current': float(current[i]),
+               'slope_per_day': float(slopes[i]) * SECONDS_PER_DAY / x_unit,
+               'last_time': float(last_x[i]) * x_unit, 'samples': int(counts[i])}
+        for threshold in thresholds:
+            value = float(crossing[threshold][i])
+            row[f'crossing_{threshold:g}'] = None if math.isnan(value) else value
+        rows.append(row)
+    return rows
+
+
+def rank_rows(rows: Iterable[Dict[str, Any]], thresholds: Sequence[float] = SATURATION_THRESHOLDS,
+              top: Optional[int] = None, now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Ajoute ``days_to_<seuil>`` (délai depuis ``now``) aux lignes de tendance et les classe."""
+    now = time.time() if now is None else now
+    ranked = []
+    for row in rows:
+        row = dict(row)
+        for threshold in thresholds:
+            crossing = row[f'crossing_{threshold:g}']
+            row[f'days_to_{threshold:g}'] = None if crossing is None else \
+                max(crossing - now, 0.0) / SECONDS_PER_DAY
+        ranked.append(row)
+    first = f'days_to_{thresholds[0]:g}'
+    ranked.sort(key=lambda r: (r[first] if r[first] is not None else math.inf, -r['current']))
+    return ranked[:top] if top is not None else ranked
+
+
+def rank_saturation(series: Mapping[Hashable, Tuple[Sequence[float], Sequence[float]]],
+                    thresholds: Sequence[float] = SATURATION_THRESHOLDS, top: Optional[int] = None,
+                    now: Optional[float] = None, workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Classe les séries de la flotte par proximité de la saturation (premier seuil le plus tôt).
+    Args:
+        series: par clé, (horodatages, utilisations en %).
+        thresholds: seuils (%), le premier sert au classement.
+        top: nombre de lignes retournées (toutes par défaut).
+        now: référence (s) des délais ``days_to_<seuil>`` (maintenant par défaut).
+        workers: processus de calcul (voir ``saturation_rows``).
+    Returns:
+        List[dict]: ``key``, ``current``, ``slope_per_day``, ``last_time``, ``samples``,
+        ``crossing_<seuil>`` (horodatage ou None) et ``days_to_<seuil>``.
+    """
+    return rank_rows(saturation_rows(series, thresholds, workers), thresholds, top, now)
+
+
+class ForecastCache:
+    """
+    Cache LRU borné, avec durée de vie, des résultats de prévision par série.
+
+    La clé associe l'identifiant de la série, l'horodatage de son dernier échantillon
+    et les paramètres du modèle: un nouvel échantillon change la clé, et l'enregistrement
+    d'un résultat plus récent efface ceux, périmés, de la même série. ``invalidate``
+    efface explicitement une série (historique oublié, recalcul forcé).
+    """
+
+    def __init__(self, maxsize: int = 65536, ttl: Optional[float] = 900.0) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize doit être >= 1")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl doit être > 0 (ou None)")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Tuple[Hashable, float, Hashable], Tuple[float, Any]]' = OrderedDict()
+        self._by_series: Dict[Hashable, set] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: Tuple[Hashable, float, Hashable]) -> None:
+        self._entries.pop(key, None)
+        keys = self._by_series.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_series[key[0]]
+
+    def _lookup(self, key: Tuple[Hashable, float, Hashable], now: float) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl is not None and now - entry[0] > self.ttl:
+            self._drop(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def get(self, series_id: Hashable, last_time: float, params: Hashable = ()) -> Tuple[bool, Any]:
+        """(trouvé, valeur) pour une série à son dernier échantillon ``last_time``."""
+        with self._lock:
+            return self._lookup((series_id, float(last_time), params), time.monotonic())
+
+    def get_many(self, last_times: Mapping[Hashable, float],
+                 params: Hashable = ()) -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+        """Résultats en cache ``{série: valeur}`` et liste des séries à recalculer."""
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for series_id, last_time in last_times.items():
+                hit, value = self._lookup((series_id, float(last_time), params), now)
+                if hit:
+                    found[series_id] = value
+                else:
+                    missing.append(series_id)
+        return found, missing
+
+    def put(self, series_id: Hashable, last_time: float, params: Hashable, value: Any) -> None:
+        """Enregistre un résultat; ceux de la même série à un échantillon antérieur sont effacés."""
+        self.put_many({series_id: (last_time, value)}, params)
+
+    def put_many(self, results: Mapping[Hashable, Tuple[float, Any]], params: Hashable = ()) -> None:
+        """Enregistre ``{série: (dernier horodatage, valeur)}`` pour les mêmes paramètres."""
+        now = time.monotonic()
+        with self._lock:
+            for series_id, (last_time, value) in results.items():
+                key = (series_id, float(last_time), params)
+                for stale in [k for k in self._by_series.get(series_id, ()) if k[1] < key[1]]:
+                    self._drop(stale)
+                    self.invalidations += 1
+                self._entries[key] = (now, value)
+                self._entries.move_to_end(key)
+                self._by_series.setdefault(series_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def cached(self, series_id: Hashable, last_time: float, params: Hashable,
+               compute: Callable[[], Any]) -> Any:
+        """Valeur en cache, sinon ``compute()`` enregistrée puis retournée."""
+        hit, value = self.get(series_id, last_time, params)
+        if not hit:
+            value = compute()
+            self.put(series_id, last_time, params, value)
+        return value
+
+    def invalidate(self, series_ids: Iterable[Hashable]) -> int:
+        """Efface tous les résultats des séries données; retourne le nombre d'entrées effacées."""
+        dropped = 0
+        with self._lock:
+            for series_id in series_ids:
+                for key in list(self._by_series.get(series_id, ())):
+                    self._drop(key)
+                    dropped += 1
+            self.invalidations += dropped
+        return dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_series.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs du cache (pour ``/metrics``)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'ttl_s': self.ttl,
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                    'evictions': self.evictions, 'expirations': self.expirations,
+                    'invalidations': self.invalidations}
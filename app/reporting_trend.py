@@ -1,8 +1,31 @@
 """
 Module d'exportation des rapports de tendance d'utilisation (offline).
 Permet d'exporter des données de tendance au format Excel ou CSV.
+
+Les rapports de capacité par fenêtre de facturation (p95/p99 d'utilisation
+par interface, équipement, site ou domaine) sont lus dans les sketches de
+la chaîne de collecte (``app.timeseries.sketch.SketchBank``).
 """
-import pandas as pd
+import csv
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+try:
+    import pandas as pd
+except Exception:  # keep offline even if pandas missing
+    pd = None
+
+try:
+    import openpyxl
+except Exception:  # keep offline even if openpyxl missing
+    openpyxl = None
+
+from app.inventory.domains import UNCLASSIFIED, domain_of
+from app.inventory.store import iter_inventory
+
+# Regroupements proposés pour les centiles: champ de l'équipement (None: par interface)
+PERCENTILE_GROUPS = {'interface': None, 'equipment': 'name', 'site': 'location', 'domain': 'domain'}
+PERCENTILES = (95, 99)
+
 
 def export_trend_report(data, filepath):
     """
@@ -11,5 +34,76 @@ def export_trend_report(data, filepath):
         data (list): Données à exporter (list of dict).
         filepath (str): Chemin du fichier de sortie.
     """
-    df = pd.DataFrame(data)
-    df.to_excel(filepath, index=False)
+    columns: List[str] = []
+    for row in data:
+        columns.extend(k for k in row if k not in columns)
+    if str(filepath).lower().endswith('.csv'):
+        with open(filepath, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(data)
+    elif pd is not None:
+        df = pd.DataFrame(data, columns=columns)
+        df.to_excel(filepath, index=False)
+    elif openpyxl is not None:
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(columns)
+        for row in data:
+            ws.append([row.get(c) for c in columns])
+        wb.save(filepath)
+    else:
+        raise RuntimeError("export Excel indisponible (pandas/openpyxl manquants)")
+
+
+def equipment_group_of(by: str) -> Callable[[Hashable], Optional[Hashable]]:
+    """
+    Fonction clé d'interface ``(equipment_id, ifIndex)`` -> groupe, d'après l'inventaire.
+    Raises:
+        ValueError: regroupement inconnu.
+    """
+    if by not in PERCENTILE_GROUPS:
+        raise ValueError(f'regroupement inconnu: {by}')
+    field = PERCENTILE_GROUPS[by]
+    if field is None:
+        return lambda key: key
+    if by == 'domain':
+        groups = {item.get('id'): domain_of(item) for item in iter_inventory()}
+    else:
+        groups = {item.get('id'): item.get(field) or UNCLASSIFIED for item in iter_inventory()}
+
+    def group_of(key: Hashable) -> Optional[Hashable]:
+        equipment_id = key[0] if isinstance(key, tuple) else None
+        return groups.get(equipment_id, UNCLASSIFIED)
+    return group_of
+
+
+def percentile_rows(sketches: Any, by: str = 'interface', window: Optional[str] = None,
+                    qs: Sequence[float] = PERCENTILES) -> List[Dict[str, Any]]:
+    """
+    Lignes de rapport p95/p99 d'une fenêtre (la plus récente par défaut), triées par p95 décroissant.
+    Args:
+        sketches: ``SketchBank`` de la chaîne de collecte.
+        by: ``interface``, ``equipment``, ``site`` ou ``domain``.
+    """
+    window = window or (sketches.windows() or [None])[-1]
+    if window is None:
+        return []
+    stats = sketches.group_quantiles(equipment_group_of(by), qs, window)
+    rows = []
+    for group, values in stats.items():
+        label = '/'.join(map(str, group)) if isinstance(group, tuple) else str(group)
+        row: Dict[str, Any] = {'window': window, by: label}
+        row.update({f'p{q:g}': None if values[f'p{q:g}'] is None else round(values[f'p{q:g}'], 2) for q in qs})
+        row['samples'] = values['samples']
+        rows.append(row)
+    rows.sort(key=lambda r: -(r[f'p{qs[0]:g}'] or 0))
+    return rows
+
+
+def export_percentile_report(sketches: Any, filepath: str, by: str = 'interface',
+                             window: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Exporte le rapport p95/p99 d'une fenêtre via ``export_trend_report`` et retourne ses lignes."""
+    rows = percentile_rows(sketches, by, window)
+    export_trend_report(rows, filepath)
+    return rows
@@ -4,18 +4,75 @@ Chaque route correspond à une fonctionnalité du cahier des charges : dashboard
 Toutes les données sont simulées ou stockées localement (JSON, CSV, XLSX).
 """
 
-from flask import render_template, redirect, url_for, send_from_directory, jsonify, request, Response
+from flask import render_template, redirect, url_for, send_from_directory, send_file, jsonify, request, Response
 import time
 from app import app
-from app.inventory.store import load_inventory, add_equipment, update_equipment, delete_equipment
-import csv
-from io import StringIO
+from app.inventory.store import (
+    iter_inventory, query_inventory, add_equipment, update_equipment, delete_equipment, apply_mutations,
+    inventory_version,
+)
+import json
+from app.inventory.exports import iter_csv, gzip_stream, cached_xlsx, XLSX_MIMETYPE
+from app.http_cache import capacity_etag, conditional_on, conditional_on_inventory
+from app.inventory.consolidation import CONSOLIDATED_COLUMNS, consolidate_inventory
+from app.inventory.domains import organize_by_domain
+from app.inventory.rollups import DIMENSIONS, get_rollups
+from app.snmp.scheduler import active_scheduler_stats
+from app.timeseries.pipeline import LIVE_TIER, metrics_source
+from app.reporting_trend import PERCENTILE_GROUPS, equipment_group_of, export_percentile_report, percentile_rows
+from app.predictive import SATURATION_THRESHOLDS
+from datetime import datetime, timezone
+import io
+import os
+import tempfile
 try:
     import openpyxl
     from openpyxl.workbook import Workbook
 except Exception:  # keep offline even if openpyxl missing
     openpyxl = None
 
+# Colonnes exposées de l'inventaire (exports, filtres et tri de l'API)
+INVENTORY_COLUMNS = ['id','name','type','brand','model','software_version','ip_address','location','support_status','modules']
+INVENTORY_PAGE_SIZE = 200
+API_MAX_PAGE_SIZE = 1000
+BULK_MAX_OPERATIONS = 50000
+# Lignes p95/p99 affichées sur la page de reporting
+REPORTING_TOP_PERCENTILES = 20
+# Sites listés dans le tableau de capacité du reporting
+REPORTING_TOP_SITES = 20
+# Interfaces listées sur la page prédictive; niveaux d'historique utilisables
+PREDICTIVE_TOP = 50
+PREDICTIVE_TIERS = (LIVE_TIER, '5m', '1h', '1d')
+
+
+def _inventory_query_args(default_limit: int) -> dict:
+    """
+    Traduit les paramètres de requête en arguments de ``query_inventory``.
+    Filtres: ``?type=Routeur&location=Douala`` (répétables); tri: ``sort=name`` ou ``sort=-name``;
+    pagination: ``limit`` et ``cursor``; projection: ``fields=id,name``.
+    Raises:
+        ValueError: paramètre invalide.
+    """
+    args = request.args
+    sort = args.get('sort', 'id')
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-')
+    if sort not in INVENTORY_COLUMNS:
+        raise ValueError(f'tri non supporté: {sort}')
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        raise ValueError('limit doit être un entier')
+    if not 1 <= limit <= API_MAX_PAGE_SIZE:
+        raise ValueError(f'limit doit être entre 1 et {API_MAX_PAGE_SIZE}')
+    fields = [f for f in args.get('fields', '').split(',') if f]
+    unknown = [f for f in fields if f not in INVENTORY_COLUMNS]
+    if unknown:
+        raise ValueError(f'champs inconnus: {", ".join(unknown)}')
+    filters = {k: args.getlist(k) for k in args if k in INVENTORY_COLUMNS}
+    return {'filters': filters, 'sort': sort, 'descending': descending,
+            'cursor': args.get('cursor') or None, 'limit': limit, 'fields': fields or None}
+
 @app.route('/favicon.ico')
 def favicon():
     return send_from_directory(app.static_folder, 'favicon.ico', mimetype='image/vnd.microsoft.icon')
@@ -25,9 +82,38 @@ def users():
     return render_template('user_space/user_space.html')
 
 @app.route('/inventory')
+@conditional_on_inventory
 def inventory():
-    items = load_inventory()
-    return render_template('inventory.html', items=items)
+    try:
+        result = query_inventory(**_inventory_query_args(INVENTORY_PAGE_SIZE))
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    next_url = None
+    if result['next_cursor']:
+        params = request.args.to_dict(flat=False)
+        params['cursor'] = result['next_cursor']
+        next_url = url_for('inventory', **params)
+    return render_template('inventory.html', items=result['items'], total=result['total'], next_url=next_url)
+
+@app.route('/api/inventory')
+@conditional_on_inventory
+def api_inventory():
+    """Inventaire paginé en JSON: ``{items, total, next_cursor}`` (voir ``_inventory_query_args``)."""
+    try:
+        result = query_inventory(**_inventory_query_args(100))
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    return jsonify(result), 200
+
+@app.route('/api/inventory/rollups')
+@conditional_on(capacity_etag)
+def api_inventory_rollups():
+    """Agrégats de capacité matérialisés: ``{by, groups, totals}`` (``?by=domain|location|brand|type``)."""
+    by = request.args.get('by', 'domain')
+    if by not in DIMENSIONS:
+        return jsonify({'error': f'regroupement inconnu: {by}'}), 400
+    rollups = get_rollups()
+    return jsonify({'by': by, 'groups': rollups.rollup(by), 'totals': rollups.totals()}), 200
 
 @app.route('/inventory/add', methods=['POST'])
 def inventory_add():
@@ -38,7 +124,10 @@ def inventory_add():
 @app.route('/inventory/<int:equip_id>', methods=['PATCH'])
 def inventory_update(equip_id: int):
     changes = request.get_json(silent=True) or request.form.to_dict()
-    ok = update_equipment(equip_id, changes)
+    try:
+        ok = update_equipment(equip_id, changes)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
     return jsonify({'updated': ok}), (200 if ok else 404)
 
 @app.route('/inventory/<int:equip_id>', methods=['DELETE'])
@@ -46,41 +135,121 @@ def inventory_delete(equip_id: int):
     ok = delete_equipment(equip_id)
     return jsonify({'deleted': ok}), (200 if ok else 404)
 
+def _parse_bulk_body() -> list:
+    """
+    Lit le corps de ``/inventory/bulk``: tableau JSON, objet ``{"operations": [...]}``
+    ou NDJSON (une opération par ligne).
+    Returns:
+        list: paires (opération, erreur de lecture ou None), dans l'ordre du corps.
+    Raises:
+        ValueError: corps illisible.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/ndjson'):
+        entries = []
+        for raw in request.stream:
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                entries.append((json.loads(line), None))
+            except ValueError as exc:
+                entries.append((None, f'ligne JSON invalide: {exc}'))
+        return entries
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('operations')
+    if not isinstance(payload, list):
+        raise ValueError('corps attendu: tableau JSON, {"operations": [...]} ou NDJSON')
+    return [(op, None) for op in payload]
+
+@app.route('/inventory/bulk', methods=['POST'])
+def inventory_bulk():
+    """
+    Applique en une passe (un verrou, une écriture) un lot d'opérations
+    ``add``/``update``/``delete`` et renvoie un résultat par opération.
+    """
+    try:
+        entries = _parse_bulk_body()
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    if len(entries) > BULK_MAX_OPERATIONS:
+        return jsonify({'error': f'au plus {BULK_MAX_OPERATIONS} opérations par lot'}), 413
+    results = [{'index': i, 'op': None, 'ok': False, 'error': err} if err else None
+               for i, (_, err) in enumerate(entries)]
+    pending = [i for i, (_, err) in enumerate(entries) if err is None]
+    for i, result in zip(pending, apply_mutations([entries[i][0] for i in pending])):
+        results[i] = {'index': i, **result}
+    applied = sum(1 for r in results if r['ok'])
+    return jsonify({'applied': applied, 'failed': len(results) - applied, 'results': results}), 200
+
+def _export_columns() -> list:
+    """
+    Colonnes demandées via ``?columns=id,name`` (toutes par défaut).
+    Raises:
+        ValueError: colonne inconnue.
+    """
+    columns = [c for c in request.args.get('columns', '').split(',') if c]
+    unknown = [c for c in columns if c not in INVENTORY_COLUMNS]
+    if unknown:
+        raise ValueError(f'colonnes inconnues: {", ".join(unknown)}')
+    return columns or INVENTORY_COLUMNS
+
 @app.route('/inventory/export.csv')
+@conditional_on_inventory
 def inventory_export_csv():
-    items = load_inventory()
-    si = StringIO()
-    writer = csv.DictWriter(si, fieldnames=[
-        'id','name','type','brand','model','software_version','ip_address','location','support_status','modules'
-    ])
-    writer.writeheader()
-    for it in items:
-        writer.writerow({k: it.get(k, '') for k in writer.fieldnames})
-    output = si.getvalue()
-    return Response(output, mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename="inventory.csv"'})
+    """Export CSV en flux; compressé en gzip si le client l'accepte."""
+    try:
+        columns = _export_columns()
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    body = iter_csv(iter_inventory(), columns)
+    headers = {'Content-Disposition': 'attachment; filename="inventory.csv"', 'Vary': 'Accept-Encoding'}
+    if request.accept_encodings['gzip']:
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, mimetype='text/csv', headers=headers)
+
+@app.route('/inventory/consolidated.csv')
+@conditional_on(capacity_etag)
+def inventory_consolidated_csv():
+    """Équipements avec totaux de ports et utilisation (``consolidate_inventory``), en flux CSV."""
+    try:
+        columns = _export_columns() + CONSOLIDATED_COLUMNS
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    body = iter_csv(consolidate_inventory(), columns)
+    headers = {'Content-Disposition': 'attachment; filename="inventory-consolidated.csv"', 'Vary': 'Accept-Encoding'}
+    if request.accept_encodings['gzip']:
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, mimetype='text/csv', headers=headers)
 
 @app.route('/inventory/export.xlsx')
+@conditional_on_inventory
 def inventory_export_xlsx():
+    """Export Excel (write-only), régénéré uniquement quand l'inventaire a changé."""
     if openpyxl is None:
         return jsonify({'error': 'export xlsx indisponible (openpyxl manquant)'}), 503
-    items = load_inventory()
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    headers = ['id','name','type','brand','model','software_version','ip_address','location','support_status','modules']
-    ws.append(headers)
-    for it in items:
-        ws.append([it.get(k, '') for k in headers])
-    from io import BytesIO
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
-    return Response(bio.read(), mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', headers={'Content-Disposition': 'attachment; filename="inventory.xlsx"'})
+    try:
+        columns = _export_columns()
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    export = cached_xlsx(inventory_version(), columns, iter_inventory)
+    try:
+        return send_file(export, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name='inventory.xlsx',
+                         etag=False)
+    except FileNotFoundError:
+        # Purgé entre-temps par un export concurrent: régénéré pour la version courante
+        export = cached_xlsx(inventory_version(), columns, iter_inventory)
+        return send_file(export, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name='inventory.xlsx',
+                         etag=False)
 
 @app.route('/snmp')
 def snmp():
     return render_template('interfaces/interfaces.html')
 
 @app.route('/dashboard')
+@conditional_on(capacity_etag)
 def dashboard():
     # Données simulées pour le frontend IPCM
     equipments = [
@@ -109,15 +278,102 @@ def dashboard():
         {'name': 'Gig0/2', 'status': 'inactive'},
         {'name': 'Eth1/1', 'status': 'active'}
     ]
-    return render_template('dashboard.html', equipments=equipments, users=users, interfaces=interfaces)
+    return render_template('dashboard.html', equipments=equipments, users=users, interfaces=interfaces,
+                           domains=organize_by_domain())
 
 @app.route('/reporting')
 def reporting():
-    return render_template('reporting.html')
+    # Sites les plus chargés (p95 de la fenêtre en cours), collecte de ce processus ou historique sur disque
+    source = metrics_source()
+    percentiles = percentile_rows(source.sketches, 'site')[:REPORTING_TOP_PERCENTILES] if source else []
+    # Capacité par site, lue dans les agrégats matérialisés (débit utilisé relu par ``metrics_source``)
+    sites = sorted(get_rollups().rollup('location').items(), key=lambda kv: (-kv[1]['capacity_bps'], kv[0]))
+    return render_template('reporting.html', percentiles=percentiles, sites=sites[:REPORTING_TOP_SITES])
+
+def _percentile_args() -> tuple:
+    """
+    Regroupement (``?by=site``, par interface par défaut) et fenêtre (``?window=2026-10``).
+    Raises:
+        ValueError: regroupement inconnu.
+    """
+    by = request.args.get('by', 'interface')
+    if by not in PERCENTILE_GROUPS:
+        raise ValueError(f'regroupement inconnu: {by}')
+    return by, request.args.get('window') or None
+
+@app.route('/api/reporting/percentiles')
+def api_reporting_percentiles():
+    """p95/p99 d'utilisation par fenêtre de facturation: ``{by, windows, rows}``."""
+    try:
+        by, window = _percentile_args()
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    source = metrics_source()
+    if source is None:
+        return jsonify({'by': by, 'windows': [], 'rows': []}), 200
+    return jsonify({'by': by, 'windows': source.sketches.windows(),
+                    'rows': percentile_rows(source.sketches, by, window)}), 200
+
+@app.route('/reporting/percentiles.<ext>')
+def reporting_percentiles_export(ext: str):
+    """Export du rapport p95/p99 (``.xlsx`` ou ``.csv``) via ``export_trend_report``."""
+    if ext not in ('xlsx', 'csv'):
+        return jsonify({'error': f'format non supporté: {ext}'}), 404
+    try:
+        by, window = _percentile_args()
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    source = metrics_source()
+    if source is None:
+        return jsonify({'error': 'historique des métriques indisponible (numpy manquant)'}), 404
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'percentiles.{ext}')
+        try:
+            export_percentile_report(source.sketches, path, by, window)
+        except RuntimeError as exc:
+            return jsonify({'error': str(exc)}), 503
+        with open(path, 'rb') as f:
+            payload = io.BytesIO(f.read())
+    mimetype = XLSX_MIMETYPE if ext == 'xlsx' else 'text/csv'
+    return send_file(payload, mimetype=mimetype, as_attachment=True, download_name=f'percentiles-{by}.{ext}')
 
 @app.route('/predictive')
 def predictive():
-    return render_template('predictive.html')
+    """Interfaces les plus proches de la saturation (tendance de l'historique de la collecte)."""
+    tier = request.args.get('tier', LIVE_TIER)
+    if tier not in PREDICTIVE_TIERS:
+        tier = LIVE_TIER
+    return render_template('predictive.html', ranking=_saturation_ranking(tier), tier=tier,
+                           tiers=PREDICTIVE_TIERS, thresholds=SATURATION_THRESHOLDS)
+
+def _saturation_ranking(tier: str) -> list:
+    """Classement de ``saturation`` (collecte ou historique sur disque) avec libellés et dates lisibles."""
+    source = metrics_source()
+    if source is None:
+        return []
+    equipment_name = equipment_group_of('equipment')
+    rows = []
+    for row in source.saturation(tier=tier, top=PREDICTIVE_TOP):
+        key = row['key']
+        label = f"{equipment_name(key)} · ifIndex {key[1]}" if isinstance(key, tuple) else str(key)
+        entry = {'interface': label, 'current': round(row['current'], 1),
+                 'slope_per_day': round(row['slope_per_day'], 3), 'samples': row['samples']}
+        for threshold in SATURATION_THRESHOLDS:
+            crossing = row[f'crossing_{threshold:g}']
+            days = row[f'days_to_{threshold:g}']
+            entry[f'date_{threshold:g}'] = None if crossing is None else \
+                datetime.fromtimestamp(crossing, timezone.utc).date().isoformat()
+            entry[f'days_to_{threshold:g}'] = None if days is None else round(days, 1)
+        rows.append(entry)
+    return rows
+
+@app.route('/api/predictive/saturation')
+def api_predictive_saturation():
+    """Même classement que la page ``/predictive`` en JSON: ``{tier, rows}``."""
+    tier = request.args.get('tier', LIVE_TIER)
+    if tier not in PREDICTIVE_TIERS:
+        return jsonify({'error': f'niveau inconnu: {tier}'}), 400
+    return jsonify({'tier': tier, 'rows': _saturation_ranking(tier)}), 200
 
 @app.route('/security')
 def security():
@@ -167,13 +423,21 @@ def metrics():
     """Expose des métriques basiques pour supervision/light observability."""
     uptime = time.time() - getattr(app, 'start_time', time.time())
     routes_count = len(app.url_map._rules)
-    return jsonify({
+    payload = {
         'service': app.config.get('SERVICE_NAME', 'ipcm'),
         'version': app.config.get('VERSION', '0.0.0'),
         'uptime_s': round(uptime, 3),
         'routes_count': routes_count,
         'status': 'ok'
-    }), 200
+    }
+    # File et retard de l'ordonnanceur SNMP s'il tourne dans ce processus
+    scheduler = active_scheduler_stats()
+    if scheduler is not None:
+        payload['snmp_scheduler'] = scheduler
+    source = metrics_source()
+    if source is not None:
+        payload['forecast_cache'] = source.cache.stats()
+    return jsonify(payload), 200
 
 # Extra routes referenced by navbar
 @app.route('/precablage')
@@ -0,0 +1,268 @@
+"""
+Codage BER minimal des messages SNMPv2c (RFC 3416), sans dépendance externe.
+
+Couvre ce dont le poller et le simulateur ont besoin: GET, GETNEXT,
+GETBULK, RESPONSE, et les types usuels (INTEGER, OCTET STRING, NULL,
+OBJECT IDENTIFIER, IpAddress, Counter32, Gauge32, TimeTicks, Counter64,
+exceptions noSuchObject/noSuchInstance/endOfMibView).
+
+Les types applicatifs sont des sous-classes de ``int``/``str``: une valeur
+décodée garde son type SNMP et se réencode à l'identique.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, List, Sequence, Tuple, Union
+
+SNMP_VERSION_2C = 1
+
+# OID codés/décodés gardés en cache: les mêmes colonnes reviennent dans chaque PDU
+OID_CACHE_SIZE = 65536
+
+# Types de PDU (contexte, construits)
+GET_REQUEST = 0xA0
+GET_NEXT_REQUEST = 0xA1
+RESPONSE = 0xA2
+GET_BULK_REQUEST = 0xA5
+
+_INTEGER, _OCTET_STRING, _NULL, _OID, _SEQUENCE = 0x02, 0x04, 0x05, 0x06, 0x30
+
+# error-status (RFC 3416 §3)
+ERROR_STATUS_NAMES = (
+    'noError', 'tooBig', 'noSuchName', 'badValue', 'readOnly', 'genErr', 'noAccess',
+    'wrongType', 'wrongLength', 'wrongEncoding', 'wrongValue', 'noCreation',
+    'inconsistentValue', 'resourceUnavailable', 'commitFailed', 'undoFailed',
+    'authorizationError', 'notWritable', 'inconsistentName',
+)
+
+
+class Oid(tuple):
+    """Identifiant d'objet (tuple d'entiers), affiché en notation pointée."""
+
+    def __new__(cls, value: Union[str, Sequence[int]] = ()) -> 'Oid':
+        if isinstance(value, str):
+            value = [int(arc) for arc in value.strip('.').split('.') if arc]
+        return super().__new__(cls, value)
+
+    def __str__(self) -> str:
+        return '.'.join(map(str, self))
+
+    def startswith(self, prefix: Sequence[int]) -> bool:
+        return self[:len(prefix)] == tuple(prefix)
+
+
+class IpAddress(str):
+    tag = 0x40
+
+
+class Counter32(int):
+    tag = 0x41
+
+
+class Gauge32(int):
+    tag = 0x42
+
+
+class TimeTicks(int):
+    tag = 0x43
+
+
+class Counter64(int):
+    tag = 0x46
+
+
+class VarBindException:
+    """Valeur d'exception d'un varbind (noSuchObject, noSuchInstance, endOfMibView)."""
+    __slots__ = ('tag', 'name')
+
+    def __init__(self, tag: int, name: str) -> None:
+        self.tag, self.name = tag, name
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+NO_SUCH_OBJECT = VarBindException(0x80, 'noSuchObject')
+NO_SUCH_INSTANCE = VarBindException(0x81, 'noSuchInstance')
+END_OF_MIB_VIEW = VarBindException(0x82, 'endOfMibView')
+_EXCEPTIONS = {e.tag: e for e in (NO_SUCH_OBJECT, NO_SUCH_INSTANCE, END_OF_MIB_VIEW)}
+_UNSIGNED = {cls.tag: cls for cls in (Counter32, Gauge32, TimeTicks, Counter64)}
+
+VarBind = Tuple[Oid, Any]
+
+
+@dataclass
+class SnmpMessage:
+    """Message SNMPv2c décodé. Pour GETBULK, ``error_status``/``error_index`` portent non-repeaters/max-repetitions."""
+    pdu_type: int
+    request_id: int
+    community: bytes = b'public'
+    error_status: int = 0
+    error_index: int = 0
+    varbinds: List[VarBind] = field(default_factory=list)
+    version: int = SNMP_VERSION_2C
+
+
+# --- Encodage ---------------------------------------------------------------
+
+def _encode_length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes([length])
+    raw = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(raw)]) + raw
+
+
+def _tlv(tag: int, payload: bytes) -> bytes:
+    return bytes([tag]) + _encode_length(len(payload)) + payload
+
+
+def _encode_integer(tag: int, value: int) -> bytes:
+    length = (value if value >= 0 else ~value).bit_length() // 8 + 1
+    return _tlv(tag, value.to_bytes(length, 'big', signed=True))
+
+
+def _encode_oid(oid: Sequence[int]) -> bytes:
+    return _encode_oid_cached(tuple(oid))
+
+
+@lru_cache(maxsize=OID_CACHE_SIZE)
+def _encode_oid_cached(oid: Tuple[int, ...]) -> bytes:
+    if len(oid) < 2:
+        raise ValueError(f'OID trop court: {oid!r}')
+    arcs = [oid[0] * 40 + oid[1], *oid[2:]]
+    out = bytearray()
+    for arc in arcs:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        out.extend(reversed(chunk))
+    return _tlv(_OID, bytes(out))
+
+
+def encode_value(value: Any) -> bytes:
+    """Encode la valeur d'un varbind (``None`` -> NULL)."""
+    if value is None:
+        return _tlv(_NULL, b'')
+    if isinstance(value, VarBindException):
+        return _tlv(value.tag, b'')
+    if isinstance(value, IpAddress):
+        return _tlv(IpAddress.tag, bytes(int(part) for part in value.split('.')))
+    if isinstance(value, Oid):
+        return _encode_oid(value)
+    if isinstance(value, bool):
+        raise ValueError('booléen non encodable en SNMP')
+    if isinstance(value, int):
+        return _encode_integer(getattr(value, 'tag', _INTEGER), value)
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    if isinstance(value, (bytes, bytearray)):
+        return _tlv(_OCTET_STRING, bytes(value))
+    raise ValueError(f'type non encodable en SNMP: {type(value).__name__}')
+
+
+def encode_message(message: SnmpMessage) -> bytes:
+    """Encode un message SNMPv2c complet."""
+    varbinds = b''.join(_tlv(_SEQUENCE, _encode_oid(oid) + encode_value(value))
+                        for oid, value in message.varbinds)
+    pdu = (_encode_integer(_INTEGER, message.request_id)
+           + _encode_integer(_INTEGER, message.error_status)
+           + _encode_integer(_INTEGER, message.error_index)
+           + _tlv(_SEQUENCE, varbinds))
+    return _tlv(_SEQUENCE, _encode_integer(_INTEGER, message.version)
+                + _tlv(_OCTET_STRING, message.community)
+                + _tlv(message.pdu_type, pdu))
+
+
+# --- Décodage ---------------------------------------------------------------
+
+def _read_tlv(data: bytes, pos: int, end: int) -> Tuple[int, int, int]:
+    """Lit un en-tête TLV; retourne (tag, début du contenu, fin du contenu)."""
+    if pos + 2 > end:
+        raise ValueError('message tronqué')
+    tag, length = data[pos], data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        if not size or size > 4 or pos + size > end:
+            raise ValueError('longueur BER invalide')
+        length = int.from_bytes(data[pos:pos + size], 'big')
+        pos += size
+    if pos + length > end:
+        raise ValueError('message tronqué')
+    return tag, pos, pos + length
+
+
+def _expect(data: bytes, pos: int, end: int, tag: int) -> Tuple[int, int]:
+    actual, start, stop = _read_tlv(data, pos, end)
+    if actual != tag:
+        raise ValueError(f'tag BER inattendu: {actual:#x} au lieu de {tag:#x}')
+    return start, stop
+
+
+@lru_cache(maxsize=OID_CACHE_SIZE)
+def _decode_oid(raw: bytes) -> Oid:
+    arcs: List[int] = []
+    value = 0
+    for byte in raw:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            arcs.append(value)
+            value = 0
+    if not arcs:
+        raise ValueError('OID vide')
+    first = arcs[0]
+    head = (0, first) if first < 40 else (1, first - 40) if first < 80 else (2, first - 80)
+    return Oid((*head, *arcs[1:]))
+
+
+def _decode_value(tag: int, raw: bytes) -> Any:
+    if tag == _INTEGER:
+        return int.from_bytes(raw, 'big', signed=True)
+    if tag == _OCTET_STRING:
+        return raw
+    if tag == _NULL:
+        return None
+    if tag == _OID:
+        return _decode_oid(raw)
+    if tag == IpAddress.tag:
+        return IpAddress('.'.join(str(b) for b in raw))
+    if tag in _UNSIGNED:
+        return _UNSIGNED[tag](int.from_bytes(raw, 'big'))
+    if tag in _EXCEPTIONS:
+        return _EXCEPTIONS[tag]
+    raise ValueError(f'type SNMP non supporté: {tag:#x}')
+
+
+def _read_integer(data: bytes, pos: int, end: int) -> Tuple[int, int]:
+    start, stop = _expect(data, pos, end, _INTEGER)
+    return int.from_bytes(data[start:stop], 'big', signed=True), stop
+
+
+def decode_message(data: bytes) -> SnmpMessage:
+    """
+    Décode un message SNMPv1/v2c.
+    Raises:
+        ValueError: message mal formé ou type non supporté.
+    """
+    start, end = _expect(data, 0, len(data), _SEQUENCE)
+    version, pos = _read_integer(data, start, end)
+    c_start, pos = _expect(data, pos, end, _OCTET_STRING)
+    community = bytes(data[c_start:pos])
+    pdu_type, pos, pdu_end = _read_tlv(data, pos, end)
+    request_id, pos = _read_integer(data, pos, pdu_end)
+    error_status, pos = _read_integer(data, pos, pdu_end)
+    error_index, pos = _read_integer(data, pos, pdu_end)
+    pos, vb_end = _expect(data, pos, pdu_end, _SEQUENCE)
+    varbinds: List[VarBind] = []
+    while pos < vb_end:
+        vb_start, next_pos = _expect(data, pos, vb_end, _SEQUENCE)
+        o_start, o_end = _expect(data, vb_start, next_pos, _OID)
+        tag, v_start, v_end = _read_tlv(data, o_end, next_pos)
+        varbinds.append((_decode_oid(bytes(data[o_start:o_end])), _decode_value(tag, bytes(data[v_start:v_end]))))
+        pos = next_pos
+    return SnmpMessage(pdu_type=pdu_type, request_id=request_id, community=community,
+                       error_status=error_status, error_index=error_index,
+                       varbinds=varbinds, version=version)
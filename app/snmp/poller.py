@@ -0,0 +1,370 @@
+"""
+Poller SNMP asynchrone (asyncio) pour l'ensemble du parc.
+
+- ``SnmpClient`` joue le rôle du moteur SNMP partagé: un seul socket UDP par
+  famille d'adresses pour toutes les requêtes, les réponses étant associées
+  à leur requête par request-id (et vérifiées: adresse, communauté). Délai
+  d'attente et nombre de réessais par requête.
+- ``FleetPoller`` interroge une liste de cibles (par défaut les équipements
+  de l'inventaire ayant une adresse IP) en bornant le nombre de requêtes en
+  vol, globalement et par équipement, et produit un ``PollResult`` par cible
+  dès qu'il est disponible.
+
+Avec 256 requêtes en vol, un délai de 2 s et un réessai, un parc de
+plusieurs milliers d'équipements tient dans un intervalle de 5 minutes
+même avec une part d'équipements injoignables.
+
+Les messages sont codés par ``app.snmp.ber`` (SNMPv2c), sans pysnmp.
+"""
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import logging
+import os
+import random
+import socket
+from dataclasses import dataclass, field
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple,
+)
+
+from app.snmp.ber import (
+    ERROR_STATUS_NAMES, GET_BULK_REQUEST, GET_REQUEST, RESPONSE, Oid, SnmpMessage, VarBind, VarBindException,
+    decode_message, encode_message,
+)
+
+logger = logging.getLogger(__name__)
+
+SNMP_PORT = 161
+# Délai d'attente d'une réponse (secondes) et réessais après expiration
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_RETRIES = 1
+# Requêtes simultanées, pour tout le parc et par équipement
+MAX_IN_FLIGHT = 256
+MAX_PER_DEVICE = 2
+# Varbinds par PDU GET (au-delà, la requête est découpée)
+MAX_VARBINDS_PER_PDU = 20
+# Tampon de réception du socket: les réponses de centaines de requêtes en vol arrivent en rafale
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024
+
+# sysDescr, sysUpTime, sysName
+DEFAULT_OIDS = ('1.3.6.1.2.1.1.1.0', '1.3.6.1.2.1.1.3.0', '1.3.6.1.2.1.1.5.0')
+
+
+class SnmpError(Exception):
+    """Erreur SNMP (error-status non nul ou réponse inexploitable)."""
+
+
+class SnmpTimeout(SnmpError):
+    """Aucune réponse après tous les essais."""
+
+
+@dataclass(frozen=True)
+class PollTarget:
+    """Équipement à interroger."""
+    host: str
+    community: str = 'public'
+    port: int = SNMP_PORT
+    equipment_id: Optional[int] = None
+    name: str = ''
+
+
+@dataclass
+class PollResult:
+    """Résultat de l'interrogation d'une cible."""
+    target: PollTarget
+    values: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    # Durée totale (secondes), réessais compris
+    elapsed: float = 0.0
+    # Échec par absence de réponse (et non par erreur SNMP)
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class _ClientProtocol(asyncio.DatagramProtocol):
+    def __init__(self, client: 'SnmpClient') -> None:
+        self._client = client
+
+    def datagram_received(self, data: bytes, addr: Tuple[Any, ...]) -> None:
+        self._client._dispatch(data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP « port unreachable » etc.: la requête concernée expirera
+        pass
+
+
+class SnmpClient:
+    """Moteur SNMPv2c partagé par toutes les requêtes d'une boucle asyncio."""
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES) -> None:
+        self.timeout = timeout
+        self.retries = retries
+        self.stats = {'sent': 0, 'received': 0, 'retries': 0, 'timeouts': 0}
+        self._transports: Dict[int, asyncio.DatagramTransport] = {}
+        self._transport_lock = asyncio.Lock()
+        self._pending: Dict[int, Tuple[Tuple[str, int, bytes], asyncio.Future]] = {}
+        self._next_id = random.randrange(1, 2 ** 31 - 1)
+
+    async def __aenter__(self) -> 'SnmpClient':
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for transport in self._transports.values():
+            transport.close()
+        self._transports.clear()
+
+    async def _transport(self, family: int) -> asyncio.DatagramTransport:
+        async with self._transport_lock:
+            transport = self._transports.get(family)
+            if transport is None or transport.is_closing():
+                local = ('::', 0) if family == socket.AF_INET6 else ('0.0.0.0', 0)
+                transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                    lambda: _ClientProtocol(self), local_addr=local, family=family)
+                try:
+                    transport.get_extra_info('socket').setsockopt(
+                        socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+                except OSError:
+                    pass  # limite système: on garde la taille par défaut
+                self._transports[family] = transport
+            return transport
+
+    def _request_id(self) -> int:
+        while True:
+            self._next_id = self._next_id % (2 ** 31 - 1) + 1
+            if self._next_id not in self._pending:
+                return self._next_id
+
+    def _dispatch(self, data: bytes, addr: Tuple[Any, ...]) -> None:
+        try:
+            message = decode_message(data)
+        except ValueError:
+            return
+        entry = self._pending.get(message.request_id)
+        if entry is None or message.pdu_type != RESPONSE:
+            return
+        (host, port, community), future = entry
+        # Une réponse d'une autre adresse ou communauté n'est pas acceptée
+        if (addr[0], addr[1]) != (host, port) or message.community != community or future.done():
+            return
+        self.stats['received'] += 1
+        future.set_result(message)
+
+    async def request(self, host: str, pdu_type: int, varbinds: Sequence[VarBind],
+                      community: str = 'public', port: int = SNMP_PORT,
+                      timeout: Optional[float] = None, retries: Optional[int] = None,
+                      non_repeaters: int = 0, max_repetitions: int = 0) -> SnmpMessage:
+        """
+        Envoie une requête et attend sa réponse, avec réessais.
+
+        Args:
+            host: adresse IP de l'équipement.
+            pdu_type: GET_REQUEST, GET_NEXT_REQUEST ou GET_BULK_REQUEST.
+            varbinds: (OID, valeur) à transmettre (valeurs ``None`` pour une lecture).
+            non_repeaters, max_repetitions: paramètres GETBULK.
+        Returns:
+            SnmpMessage: réponse de l'équipement.
+        Raises:
+            SnmpTimeout: aucune réponse après ``retries`` réessais.
+            SnmpError: error-status non nul.
+            ValueError: adresse IP invalide.
+        """
+        address = ipaddress.ip_address(host)
+        host = str(address)
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        family = socket.AF_INET6 if address.version == 6 else socket.AF_INET
+        transport = await self._transport(family)
+        secret = community.encode('utf-8')
+        request_id = self._request_id()
+        is_bulk = pdu_type == GET_BULK_REQUEST
+        data = encode_message(SnmpMessage(
+            pdu_type=pdu_type, request_id=request_id, community=secret,
+            error_status=non_repeaters if is_bulk else 0,
+            error_index=max_repetitions if is_bulk else 0,
+            varbinds=list(varbinds)))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = ((host, port, secret), future)
+        try:
+            for attempt in range(retries + 1):
+                if attempt:
+                    self.stats['retries'] += 1
+                transport.sendto(data, (host, port))
+                self.stats['sent'] += 1
+                try:
+                    response = await asyncio.wait_for(asyncio.shield(future), timeout)
+                    break
+                except asyncio.TimeoutError:
+                    continue
+            else:
+                self.stats['timeouts'] += 1
+                raise SnmpTimeout(f'{host}:{port}: pas de réponse après {retries + 1} essai(s)')
+        finally:
+            self._pending.pop(request_id, None)
+            future.cancel()
+        if response.error_status:
+            status = response.error_status
+            name = ERROR_STATUS_NAMES[status] if status < len(ERROR_STATUS_NAMES) else str(status)
+            raise SnmpError(f'{host}:{port}: {name} (index {response.error_index})')
+        return response
+
+
+def default_community(community: Optional[str] = None) -> str:
+    """Communauté par défaut: ``community``, sinon ``IPCM_SNMP_COMMUNITY``, sinon ``public``."""
+    return community or os.environ.get('IPCM_SNMP_COMMUNITY') or 'public'
+
+
+def target_from_item(item: Mapping[str, Any], community: str) -> Optional[PollTarget]:
+    """Cible correspondant à un équipement de l'inventaire (None sans adresse IP valide)."""
+    try:
+        host = str(ipaddress.ip_address(str(item.get('ip_address') or '').strip()))
+    except ValueError:
+        return None
+    return PollTarget(host=host, community=item.get('snmp_community') or community,
+                      equipment_id=item.get('id'), name=item.get('name') or '')
+
+
+def targets_from_inventory(community: Optional[str] = None) -> List[PollTarget]:
+    """
+    Cibles à partir de l'inventaire: équipements ayant une adresse IP valide.
+
+    La communauté est celle de l'équipement (champ ``snmp_community``), sinon
+    celle de ``default_community(community)``.
+    """
+    from app.inventory.store import iter_inventory
+
+    community = default_community(community)
+    return [t for t in (target_from_item(item, community) for item in iter_inventory()) if t is not None]
+
+
+Collector = Callable[['FleetPoller', PollTarget], Awaitable[Dict[str, Any]]]
+
+
+class FleetPoller:
+    """Interroge un ensemble de cibles en parallèle, avec limites de concurrence."""
+
+    def __init__(self, client: Optional[SnmpClient] = None, max_in_flight: int = MAX_IN_FLIGHT,
+                 max_per_device: int = MAX_PER_DEVICE) -> None:
+        self.client = client or SnmpClient()
+        self.max_in_flight = max_in_flight
+        self.max_per_device = max_per_device
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._per_device: Dict[Tuple[str, int], asyncio.Semaphore] = {}
+
+    async def request(self, target: PollTarget, pdu_type: int, varbinds: Sequence[VarBind],
+                      **options: Any) -> SnmpMessage:
+        """Requête vers une cible, dans les limites globale et par équipement."""
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        device = self._per_device.get((target.host, target.port))
+        if device is None:
+            device = self._per_device[(target.host, target.port)] = asyncio.Semaphore(self.max_per_device)
+        async with device, self._in_flight:
+            return await self.client.request(target.host, pdu_type, varbinds, community=target.community,
+                                             port=target.port, **options)
+
+    async def get(self, target: PollTarget, oids: Sequence[str] = DEFAULT_OIDS) -> Dict[str, Any]:
+        """Lit des OID scalaires (découpés en PDU de ``MAX_VARBINDS_PER_PDU``); les OID absents sont omis."""
+        chunks = [oids[i:i + MAX_VARBINDS_PER_PDU] for i in range(0, len(oids), MAX_VARBINDS_PER_PDU)]
+        responses = await asyncio.gather(*(
+            self.request(target, GET_REQUEST, [(Oid(o), None) for o in chunk]) for chunk in chunks))
+        return {str(oid): value for response in responses for oid, value in response.varbinds
+                if not isinstance(value, VarBindException)}
+
+    async def collect_one(self, target: PollTarget, collect: Collector) -> PollResult:
+        """Applique ``collect`` à une cible; les erreurs sont rapportées dans le résultat."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            return PollResult(target, await collect(self, target), elapsed=loop.time() - started)
+        except SnmpTimeout as exc:
+            return PollResult(target, error=str(exc), elapsed=loop.time() - started, timed_out=True)
+        except (SnmpError, ValueError, OSError) as exc:
+            return PollResult(target, error=str(exc) or type(exc).__name__, elapsed=loop.time() - started)
+        except Exception as exc:
+            # Erreur inattendue du collecteur: l'équipement reste un échec ordinaire, jamais un résultat perdu
+            logger.exception('collecte de %s en échec', target.host)
+            return PollResult(target, error=f'{type(exc).__name__}: {exc}', elapsed=loop.time() - started)
+
+    async def run(self, targets: Iterable[PollTarget], collect: Collector) -> AsyncIterator[PollResult]:
+        """
+        Applique ``collect(poller, cible)`` à chaque cible et produit les résultats dans l'ordre d'arrivée.
+
+        Au plus ``max_in_flight`` cibles sont traitées à la fois: la liste des
+        cibles peut être un itérateur de grande taille.
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        window = asyncio.Semaphore(self.max_in_flight)
+        tasks: set = set()
+        done = object()
+
+        async def poll_one(target: PollTarget) -> None:
+            try:
+                result = await self.collect_one(target, collect)
+            finally:
+                window.release()
+            results.put_nowait(result)
+
+        async def feed() -> None:
+            try:
+                for target in targets:
+                    await window.acquire()
+                    task = asyncio.create_task(poll_one(target))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if tasks:
+                    await asyncio.wait(set(tasks))
+            finally:
+                results.put_nowait(done)
+
+        feeder = asyncio.create_task(feed())
+        try:
+            while True:
+                result = await results.get()
+                if result is done:
+                    break
+                yield result
+            await feeder
+        finally:
+            feeder.cancel()
+            for task in list(tasks):
+                task.cancel()
+
+    def poll(self, targets: Iterable[PollTarget],
+             oids: Sequence[str] = DEFAULT_OIDS) -> AsyncIterator[PollResult]:
+        """Lit ``oids`` sur chaque cible (voir ``run``)."""
+        async def collect(poller: 'FleetPoller', target: PollTarget) -> Dict[str, Any]:
+            return await poller.get(target, oids)
+        return self.run(targets, collect)
+
+
+def poll_fleet(targets: Optional[Iterable[PollTarget]] = None, oids: Sequence[str] = DEFAULT_OIDS,
+               on_result: Optional[Callable[[PollResult], None]] = None,
+               timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES,
+               max_in_flight: int = MAX_IN_FLIGHT, max_per_device: int = MAX_PER_DEVICE) -> List[PollResult]:
+    """
+    Interroge le parc (synchrone). Cibles par défaut: ``targets_from_inventory()``.
+
+    Args:
+        on_result: appelée pour chaque résultat dès son arrivée.
+    Returns:
+        list[PollResult]: résultats dans l'ordre d'arrivée.
+    """
+    async def main() -> List[PollResult]:
+        collected = []
+        async with SnmpClient(timeout=timeout, retries=retries) as client:
+            poller = FleetPoller(client, max_in_flight=max_in_flight, max_per_device=max_per_device)
+            async for result in poller.poll(targets if targets is not None else targets_from_inventory(), oids):
+                if on_result:
+                    on_result(result)
+                collected.append(result)
+        return collected
+
+    return asyncio.run(main())
@@ -0,0 +1,321 @@
+"""
+Ordonnanceur de collecte SNMP: chaque équipement de l'inventaire est
+interrogé à son propre intervalle, les interrogations étant réparties
+uniformément dans l'intervalle plutôt que lancées en rafale.
+
+- Intervalle par niveau: cœur/backbone (60 s), distribution (300 s),
+  accès (900 s). Le niveau vient du champ ``poll_tier`` de l'équipement,
+  sinon de mots-clés de son nom, type ou domaine (``classify_tier``).
+- Répartition: à l'ajout, les équipements d'un même intervalle sont
+  espacés régulièrement; chaque échéance suivante reçoit une gigue
+  (±10 % par défaut) pour éviter que des phases se resynchronisent.
+- Recul: après ``BACKOFF_AFTER`` expirations consécutives, l'intervalle
+  d'un équipement double à chaque nouvel échec (jusqu'à ``MAX_BACKOFF_FACTOR``)
+  et revient à la normale dès une réponse.
+- Observabilité: ``stats()`` donne la profondeur de file (échéances dues
+  en attente d'un créneau), les collectes en cours et le retard (lag) entre
+  l'échéance et le départ effectif.
+
+La charge CPU et UDP du collecteur reste ainsi lisse dans le temps.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from app.snmp.poller import (
+    Collector, FleetPoller, PollResult, PollTarget, SnmpClient, default_community, target_from_item,
+)
+from app.snmp.tables import collect_interfaces
+from app.timeseries.pipeline import get_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Intervalle de collecte (secondes) par niveau d'équipement
+POLL_INTERVALS = {'core': 60.0, 'distribution': 300.0, 'access': 900.0}
+DEFAULT_TIER = 'distribution'
+
+# Mots-clés (minuscules) reconnus dans le nom, le type ou le domaine, non collés à d'autres lettres
+TIER_KEYWORDS = {
+    'core': ('core', 'coeur', 'cœur', 'backbone', 'bbip', 'asbr', 'mpls'),
+    'access': ('access', 'accès', 'acces', 'cpe', 'lan', 'wifi', 'borne'),
+}
+_TIER_PATTERNS = {tier: re.compile(r'(?<![^\W\d_])(?:' + '|'.join(map(re.escape, words)) + r')(?![^\W\d_])')
+                  for tier, words in TIER_KEYWORDS.items()}
+
+# Gigue relative appliquée à chaque échéance
+DEFAULT_JITTER = 0.1
+# Expirations consécutives avant recul, et facteur maximal d'allongement
+BACKOFF_AFTER = 2
+MAX_BACKOFF_FACTOR = 8
+# Équipements collectés simultanément
+MAX_CONCURRENT_DEVICES = 128
+# Relecture de la liste des cibles (secondes)
+REFRESH_INTERVAL = 300.0
+
+_ACTIVE: List['PollScheduler'] = []
+
+
+def classify_tier(item: Mapping[str, Any]) -> str:
+    """Niveau d'un équipement: ``poll_tier`` explicite, sinon mots-clés, sinon ``DEFAULT_TIER``."""
+    tier = str(item.get('poll_tier') or '').strip().lower()
+    if tier in POLL_INTERVALS:
+        return tier
+    text = ' '.join(str(item.get(k) or '') for k in ('name', 'type', 'domain', 'role')).lower()
+    for name, pattern in _TIER_PATTERNS.items():
+        if pattern.search(text):
+            return name
+    return DEFAULT_TIER
+
+
+def schedule_from_inventory(intervals: Mapping[str, float] = POLL_INTERVALS,
+                            community: Optional[str] = None) -> List[Tuple[PollTarget, float]]:
+    """(cible, intervalle) pour chaque équipement de l'inventaire ayant une adresse IP."""
+    from app.inventory.store import iter_inventory
+
+    community = default_community(community)
+    schedule = []
+    for item in iter_inventory():
+        target = target_from_item(item, community)
+        if target is not None:
+            schedule.append((target, float(intervals.get(classify_tier(item), intervals[DEFAULT_TIER]))))
+    return schedule
+
+
+@dataclass
+class _Entry:
+    target: PollTarget
+    interval: float
+    # Créneau théorique (sans gigue) et échéance effective
+    slot: float = 0.0
+    due: float = 0.0
+    running: bool = False
+    timeouts: int = 0
+    removed: bool = False
+
+    @property
+    def backoff(self) -> int:
+        """Facteur d'allongement courant de l'intervalle."""
+        if self.timeouts < BACKOFF_AFTER:
+            return 1
+        return min(2 ** (self.timeouts - BACKOFF_AFTER + 1), MAX_BACKOFF_FACTOR)
+
+
+def _key(target: PollTarget) -> Tuple[Any, str, int]:
+    return target.equipment_id, target.host, target.port
+
+
+class PollScheduler:
+    """
+    Lance ``collect`` sur chaque cible à son échéance (voir le module).
+
+    Args:
+        poller: poller partagé (client SNMP et limites de requêtes en vol).
+        collect: collecte d'une cible (ex. ``poller.get`` ou ``tables.collect_interfaces``).
+        schedule: fournit la liste (cible, intervalle); relue toutes les ``refresh_interval`` s.
+        on_result: appelée avec chaque ``PollResult``, dans un thread de l'exécuteur de la boucle.
+        clock: horloge monotone (celle de la boucle asyncio par défaut).
+    """
+
+    def __init__(self, poller: FleetPoller, collect: Collector,
+                 schedule: Callable[[], Iterable[Tuple[PollTarget, float]]] = schedule_from_inventory,
+                 on_result: Optional[Callable[[PollResult], None]] = None,
+                 jitter: float = DEFAULT_JITTER, max_concurrent: int = MAX_CONCURRENT_DEVICES,
+                 refresh_interval: float = REFRESH_INTERVAL,
+                 clock: Optional[Callable[[], float]] = None, seed: Optional[int] = None) -> None:
+        self.poller = poller
+        self.collect = collect
+        self.schedule = schedule
+        self.on_result = on_result
+        self.jitter = jitter
+        self.max_concurrent = max_concurrent
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._rng = random.Random(seed)
+        self._entries: Dict[Tuple[Any, str, int], _Entry] = {}
+        self._heap: List[Tuple[float, int, _Entry]] = []
+        self._seq = itertools.count()
+        self._tasks: set = set()
+        self._counters = {'polls': 0, 'failures': 0, 'timeouts': 0, 'queued': 0, 'in_progress': 0}
+        self._lag = {'last': 0.0, 'max': 0.0, 'avg': 0.0}
+        self._wake: Optional[asyncio.Event] = None
+
+    def _now(self) -> float:
+        return self.clock() if self.clock else asyncio.get_running_loop().time()
+
+    def _push(self, entry: _Entry, due: float) -> None:
+        entry.due = due
+        heapq.heappush(self._heap, (due, next(self._seq), entry))
+
+    def sync(self, schedule: Iterable[Tuple[PollTarget, float]], now: Optional[float] = None) -> None:
+        """
+        Met à jour la liste des cibles: les nouvelles sont réparties uniformément
+        sur leur intervalle, les disparues retirées, les existantes gardent leur phase.
+        """
+        now = self._now() if now is None else now
+        wanted = {_key(target): (target, interval) for target, interval in schedule}
+        for key in set(self._entries) - set(wanted):
+            self._entries.pop(key).removed = True
+        fresh: Dict[float, List[_Entry]] = {}
+        for key, (target, interval) in wanted.items():
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(target, interval)
+                fresh.setdefault(interval, []).append(entry)
+            else:
+                entry.target, entry.interval = target, interval
+        for interval, entries in fresh.items():
+            # Phase aléatoire commune puis pas régulier: pas de rafale au démarrage
+            start = self._rng.uniform(0, interval / len(entries))
+            for i, entry in enumerate(entries):
+                entry.slot = now + start + i * interval / len(entries)
+                self._push(entry, entry.slot)
+        if self._wake is not None:
+            self._wake.set()
+
+    def next_due(self, entry: _Entry, now: float) -> float:
+        """
+        Échéance suivante: le créneau avance d'un intervalle (allongé en cas de
+        recul) et la gigue s'applique autour du créneau, sans s'accumuler: la
+        répartition initiale est conservée. Jamais dans le passé.
+        """
+        entry.slot += entry.interval * entry.backoff
+        following = entry.slot + self._rng.uniform(-self.jitter, self.jitter) * entry.interval
+        if following <= now:
+            # En retard d'un intervalle entier: repartir de maintenant, sans rattrapage en rafale
+            entry.slot = now + self._rng.uniform(0, self.jitter * entry.interval)
+            following = entry.slot
+        return following
+
+    def record(self, entry: _Entry, result: PollResult) -> None:
+        """Met à jour les compteurs et l'état de recul d'un équipement après une collecte."""
+        self._counters['polls'] += 1
+        if result.ok:
+            entry.timeouts = 0
+            return
+        self._counters['failures'] += 1
+        if result.timed_out:
+            self._counters['timeouts'] += 1
+            entry.timeouts += 1
+
+    async def _poll(self, entry: _Entry, due: float, slots: asyncio.Semaphore) -> None:
+        result: Optional[PollResult] = None
+        try:
+            self._counters['queued'] += 1
+            try:
+                await slots.acquire()
+            finally:
+                self._counters['queued'] -= 1
+            self._counters['in_progress'] += 1
+            lag = max(0.0, self._now() - due)
+            self._lag['last'] = lag
+            self._lag['max'] = max(self._lag['max'], lag)
+            self._lag['avg'] += (lag - self._lag['avg']) * 0.1
+            try:
+                result = await self.poller.collect_one(entry.target, self.collect)
+            except Exception as exc:
+                logger.exception('collecte de %s en échec', entry.target.host)
+                result = PollResult(entry.target, error=f'{type(exc).__name__}: {exc}')
+                entry.timeouts += 1  # recule comme après une expiration
+            finally:
+                self._counters['in_progress'] -= 1
+                slots.release()
+            self.record(entry, result)
+        finally:
+            # Quoi qu'il arrive, l'équipement reste planifié
+            entry.running = False
+            if not entry.removed:
+                self._push(entry, self.next_due(entry, self._now()))
+                self._wake.set()
+        if self.on_result:
+            # Traitement du résultat (calculs NumPy, écritures disque) hors de la boucle asyncio
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.on_result, result)
+            except Exception:
+                logger.exception('on_result a échoué pour %s', entry.target.host)
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        """Boucle de l'ordonnanceur, jusqu'à ``stop`` (ou annulation)."""
+        stop = stop or asyncio.Event()
+        self._wake = asyncio.Event()
+        slots = asyncio.Semaphore(self.max_concurrent)
+        next_refresh = self._now()
+        _ACTIVE.append(self)
+        try:
+            while not stop.is_set():
+                now = self._now()
+                if now >= next_refresh:
+                    self.sync(self.schedule(), now)
+                    next_refresh = now + self.refresh_interval
+                while self._heap and self._heap[0][0] <= now:
+                    due, _, entry = heapq.heappop(self._heap)
+                    if entry.removed or entry.running or entry.due != due:
+                        continue
+                    entry.running = True
+                    task = asyncio.create_task(self._poll(entry, due, slots))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                delay = min(self._heap[0][0] if self._heap else next_refresh, next_refresh) - now
+                self._wake.clear()
+                waiters = [asyncio.ensure_future(stop.wait()), asyncio.ensure_future(self._wake.wait())]
+                await asyncio.wait(waiters, timeout=max(delay, 0.0), return_when=asyncio.FIRST_COMPLETED)
+                for waiter in waiters:
+                    waiter.cancel()
+        finally:
+            _ACTIVE.remove(self)
+            for task in list(self._tasks):
+                task.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Profondeur de file, collectes en cours, retard et compteurs."""
+        entries = list(self._entries.values())
+        return {
+            'devices': len(entries),
+            'queue_depth': self._counters['queued'],
+            'in_progress': self._counters['in_progress'],
+            'backed_off': sum(1 for e in entries if e.backoff > 1),
+            'lag_s': {k: round(v, 3) for k, v in self._lag.items()},
+            'polls': self._counters['polls'],
+            'failures': self._counters['failures'],
+            'timeouts': self._counters['timeouts'],
+        }
+
+
+def active_scheduler_stats() -> Optional[Dict[str, Any]]:
+    """Statistiques de l'ordonnanceur en cours d'exécution dans ce processus (None sinon)."""
+    return _ACTIVE[-1].stats() if _ACTIVE else None
+
+
+def run_scheduler(collect: Optional[Collector] = None,
+                  on_result: Optional[Callable[[PollResult], None]] = None, **options: Any) -> None:
+    """
+    Exécute l'ordonnanceur sur l'inventaire jusqu'à interruption (Ctrl+C).
+    Par défaut, chaque collecte parcourt les interfaces (``values['interfaces']``)
+    et alimente la chaîne de métriques du processus (débits, historique, centiles).
+    """
+    if collect is None and on_result is None:
+        try:
+            on_result = get_pipeline().on_result
+        except RuntimeError as exc:
+            logger.warning('métriques non calculées: %s', exc)
+
+    async def collect_interface_rows(poller: FleetPoller, target: PollTarget) -> Dict[str, Any]:
+        return {'interfaces': await collect_interfaces(poller, target)}
+
+    async def main() -> None:
+        async with SnmpClient() as client:
+            await PollScheduler(FleetPoller(client), collect or collect_interface_rows,
+                                on_result=on_result, **options).run()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,274 @@
+"""
+Simulateur local d'agents SNMPv2c (UDP, boucle locale) pour les tests et
+les mesures de performance du poller, sans équipement ni réseau.
+
+Chaque équipement virtuel écoute sur son propre port UDP de 127.0.0.1 et
+sert le groupe system, ifTable et ifXTable d'un nombre configurable de
+ports. Les compteurs d'octets croissent avec le temps (débit configurable,
+différent par port) et bouclent à 2^32 / 2^64 comme sur un vrai agent.
+Latence (fixe + gigue) et taux de perte de paquets sont configurables.
+
+La structure de la MIB (liste triée des OID) est partagée entre les
+équipements de même nombre de ports; les valeurs sont calculées à la
+demande à partir de l'horloge, sans état à mettre à jour.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import random
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.snmp.ber import (
+    END_OF_MIB_VIEW, GET_BULK_REQUEST, GET_NEXT_REQUEST, GET_REQUEST, NO_SUCH_OBJECT, RESPONSE,
+    Counter32, Counter64, Gauge32, Oid, SnmpMessage, TimeTicks, VarBind, decode_message, encode_message,
+)
+from app.snmp.poller import PollTarget
+
+# Varbinds au-delà desquels une réponse GETBULK est tronquée (taille de datagramme raisonnable)
+MAX_RESPONSE_VARBINDS = 1000
+
+_SYSTEM = '1.3.6.1.2.1.1'
+_IF_ENTRY = '1.3.6.1.2.1.2.2.1'
+_IFX_ENTRY = '1.3.6.1.2.1.31.1.1.1'
+
+# (OID de colonne, nom de la valeur calculée par VirtualDevice._value)
+_IF_COLUMNS = (
+    (f'{_IF_ENTRY}.1', 'ifIndex'),
+    (f'{_IF_ENTRY}.2', 'ifDescr'),
+    (f'{_IF_ENTRY}.5', 'ifSpeed'),
+    (f'{_IF_ENTRY}.8', 'ifOperStatus'),
+    (f'{_IF_ENTRY}.10', 'ifInOctets'),
+    (f'{_IF_ENTRY}.16', 'ifOutOctets'),
+    (f'{_IFX_ENTRY}.1', 'ifName'),
+    (f'{_IFX_ENTRY}.6', 'ifHCInOctets'),
+    (f'{_IFX_ENTRY}.10', 'ifHCOutOctets'),
+    (f'{_IFX_ENTRY}.15', 'ifHighSpeed'),
+    (f'{_IFX_ENTRY}.18', 'ifAlias'),
+)
+_SCALARS = (
+    (f'{_SYSTEM}.1.0', 'sysDescr'),
+    (f'{_SYSTEM}.3.0', 'sysUpTime'),
+    (f'{_SYSTEM}.5.0', 'sysName'),
+    ('1.3.6.1.2.1.2.1.0', 'ifNumber'),
+)
+
+
+@lru_cache(maxsize=None)
+def _mib_layout(ports: int) -> Tuple[List[Oid], List[Tuple[str, int]], Dict[Oid, int]]:
+    """OID triés, (valeur, port) associés et position de chaque OID, pour ``ports`` ports."""
+    entries = [(Oid(oid), (name, 0)) for oid, name in _SCALARS]
+    entries += [(Oid(f'{column}.{port}'), (name, port))
+                for column, name in _IF_COLUMNS for port in range(1, ports + 1)]
+    entries.sort()
+    oids = [oid for oid, _ in entries]
+    return oids, [spec for _, spec in entries], {oid: i for i, oid in enumerate(oids)}
+
+
+@dataclass
+class SimulatorOptions:
+    """Paramètres communs aux équipements virtuels."""
+    ports: int = 48
+    # Débit moyen par port et par sens (octets/s); chaque port tire un débit entre 0,5x et 1,5x
+    counter_rate: float = 1_000_000.0
+    # Latence de réponse (secondes) et gigue uniforme ajoutée
+    latency: float = 0.0
+    jitter: float = 0.0
+    # Probabilité de perdre une requête (0..1)
+    loss: float = 0.0
+    community: str = 'public'
+    # Débit des ports en Mbit/s
+    port_speed: int = 1000
+    seed: int = 0
+
+
+class VirtualDevice:
+    """Équipement simulé: valeurs calculées à la demande à partir de l'horloge."""
+
+    def __init__(self, number: int, options: SimulatorOptions, clock: Callable[[], float]) -> None:
+        self.number = number
+        self.options = options
+        self.clock = clock
+        self.started = clock()
+        rng = random.Random(options.seed * 1_000_003 + number)
+        self.name = f'SIM-{number:05d}'
+        self.rates_in = [options.counter_rate * (0.5 + rng.random()) for _ in range(options.ports)]
+        self.rates_out = [options.counter_rate * (0.5 + rng.random()) for _ in range(options.ports)]
+        self.offsets_in = [rng.randrange(2 ** 64) for _ in range(options.ports)]
+        self.offsets_out = [rng.randrange(2 ** 64) for _ in range(options.ports)]
+        self.down = {port for port in range(1, options.ports + 1) if rng.random() < 0.1}
+        self.oids, self.specs, self.positions = _mib_layout(options.ports)
+
+    def octets(self, port: int, direction: str) -> int:
+        """Compteur 64 bits d'un port (1..ports), ``direction`` = ``in`` ou ``out``."""
+        rates, offsets = (self.rates_in, self.offsets_in) if direction == 'in' else (self.rates_out, self.offsets_out)
+        return (offsets[port - 1] + int(rates[port - 1] * (self.clock() - self.started))) % 2 ** 64
+
+    def _value(self, name: str, port: int) -> Any:
+        speed = self.options.port_speed
+        if name == 'ifHCInOctets':
+            return Counter64(self.octets(port, 'in'))
+        if name == 'ifHCOutOctets':
+            return Counter64(self.octets(port, 'out'))
+        if name == 'ifInOctets':
+            return Counter32(self.octets(port, 'in') % 2 ** 32)
+        if name == 'ifOutOctets':
+            return Counter32(self.octets(port, 'out') % 2 ** 32)
+        if name == 'ifOperStatus':
+            return 2 if port in self.down else 1
+        if name in ('ifDescr', 'ifName'):
+            return f'GigabitEthernet0/{port}'.encode()
+        if name == 'ifAlias':
+            return f'{self.name} port {port}'.encode()
+        if name == 'ifHighSpeed':
+            return Gauge32(speed)
+        if name == 'ifSpeed':
+            return Gauge32(min(speed * 1_000_000, 2 ** 32 - 1))
+        if name == 'ifIndex':
+            return port
+        if name == 'sysUpTime':
+            return TimeTicks(int((self.clock() - self.started) * 100) % 2 ** 32)
+        if name == 'sysName':
+            return self.name.encode()
+        if name == 'sysDescr':
+            return b'IPCM SNMP simulator'
+        if name == 'ifNumber':
+            return self.options.ports
+        raise KeyError(name)
+
+    def _next(self, oid: Sequence[int]) -> VarBind:
+        position = bisect.bisect_right(self.oids, tuple(oid))
+        if position >= len(self.oids):
+            return Oid(oid), END_OF_MIB_VIEW
+        return self.oids[position], self._value(*self.specs[position])
+
+    def respond(self, request: SnmpMessage) -> SnmpMessage:
+        """Réponse à une requête GET, GETNEXT ou GETBULK."""
+        if request.pdu_type == GET_REQUEST:
+            varbinds = []
+            for oid, _ in request.varbinds:
+                position = self.positions.get(oid)
+                varbinds.append((oid, NO_SUCH_OBJECT if position is None else self._value(*self.specs[position])))
+        elif request.pdu_type == GET_NEXT_REQUEST:
+            varbinds = [self._next(oid) for oid, _ in request.varbinds]
+        else:
+            non_repeaters = max(0, min(request.error_status, len(request.varbinds)))
+            varbinds = [self._next(oid) for oid, _ in request.varbinds[:non_repeaters]]
+            cursors = [oid for oid, _ in request.varbinds[non_repeaters:]]
+            for _ in range(max(0, request.error_index)):
+                if not cursors or len(varbinds) + len(cursors) > MAX_RESPONSE_VARBINDS:
+                    break
+                row = [self._next(oid) for oid in cursors]
+                varbinds.extend(row)
+                cursors = [oid for oid, _ in row]
+                if all(value is END_OF_MIB_VIEW for _, value in row):
+                    break
+        return SnmpMessage(RESPONSE, request.request_id, request.community, varbinds=varbinds)
+
+
+class _AgentProtocol(asyncio.DatagramProtocol):
+    def __init__(self, simulator: 'SnmpSimulator', device: VirtualDevice) -> None:
+        self.simulator, self.device = simulator, device
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: Tuple[Any, ...]) -> None:
+        self.simulator._handle(self, data, addr)
+
+
+class SnmpSimulator:
+    """
+    N équipements virtuels sur 127.0.0.1 (un port UDP chacun).
+
+    Utilisation dans une boucle asyncio::
+
+        async with SnmpSimulator(100, SimulatorOptions(latency=0.005)) as sim:
+            targets = sim.targets()
+
+    ou dans un thread dédié (``with SnmpSimulator(...).threaded() as sim:``).
+    """
+
+    def __init__(self, devices: int = 10, options: Optional[SimulatorOptions] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.options = options or SimulatorOptions()
+        self.clock = clock
+        self.devices = [VirtualDevice(n, self.options, clock) for n in range(1, devices + 1)]
+        self.stats = {'requests': 0, 'dropped': 0}
+        self._rng = random.Random(self.options.seed)
+        self._endpoints: List[Tuple[asyncio.DatagramTransport, int]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        for device in self.devices:
+            transport, _ = await self._loop.create_datagram_endpoint(
+                lambda device=device: _AgentProtocol(self, device), local_addr=('127.0.0.1', 0))
+            self._endpoints.append((transport, transport.get_extra_info('sockname')[1]))
+
+    def stop(self) -> None:
+        for transport, _ in self._endpoints:
+            transport.close()
+        self._endpoints.clear()
+
+    async def __aenter__(self) -> 'SnmpSimulator':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def targets(self) -> List[PollTarget]:
+        """Cibles du poller correspondant aux équipements virtuels (``equipment_id`` = numéro)."""
+        return [PollTarget('127.0.0.1', community=self.options.community, port=port,
+                           equipment_id=device.number, name=device.name)
+                for device, (_, port) in zip(self.devices, self._endpoints)]
+
+    def _handle(self, protocol: _AgentProtocol, data: bytes, addr: Tuple[Any, ...]) -> None:
+        self.stats['requests'] += 1
+        if self.options.loss and self._rng.random() < self.options.loss:
+            self.stats['dropped'] += 1
+            return
+        try:
+            request = decode_message(data)
+        except ValueError:
+            return
+        # Communauté inconnue: un agent réel ne répond pas
+        if request.community != self.options.community.encode('utf-8') or request.pdu_type not in (
+                GET_REQUEST, GET_NEXT_REQUEST, GET_BULK_REQUEST):
+            return
+        payload = encode_message(protocol.device.respond(request))
+        delay = self.options.latency + (self._rng.uniform(0, self.options.jitter) if self.options.jitter else 0)
+        if delay > 0:
+            self._loop.call_later(delay, protocol.transport.sendto, payload, addr)
+        else:
+            protocol.transport.sendto(payload, addr)
+
+    def threaded(self) -> '_ThreadedSimulator':
+        """Contexte exécutant le simulateur dans un thread et une boucle dédiés."""
+        return _ThreadedSimulator(self)
+
+
+class _ThreadedSimulator:
+    def __init__(self, simulator: SnmpSimulator) -> None:
+        self.simulator = simulator
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='snmp-simulator', daemon=True)
+
+    def __enter__(self) -> SnmpSimulator:
+        self._thread.start()
+        started: Future = asyncio.run_coroutine_threadsafe(self.simulator.start(), self._loop)
+        started.result()
+        return self.simulator
+
+    def __exit__(self, *exc: Any) -> None:
+        self._loop.call_soon_threadsafe(self.simulator.stop)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
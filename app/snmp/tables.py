@@ -0,0 +1,128 @@
+"""
+Parcours de tables SNMP par GETBULK (ifTable / ifXTable).
+
+``walk_columns`` parcourt plusieurs colonnes d'une table en parallèle dans
+les mêmes PDU GETBULK: chaque réponse rapporte ``max_repetitions`` lignes
+pour toutes les colonnes encore ouvertes. Les compteurs d'un commutateur
+48 ports (6 colonnes) tiennent ainsi en quelques PDU au lieu de centaines
+de GET.
+
+``collect_interfaces`` transforme le résultat en lignes compatibles avec
+``app.inventory.interfaces.Interface``.
+"""
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.snmp.ber import GET_BULK_REQUEST, Oid, VarBindException
+from app.snmp.poller import FleetPoller, PollResult, PollTarget
+
+# Lignes demandées par colonne et par PDU GETBULK
+DEFAULT_MAX_REPETITIONS = 16
+
+IF_DESCR = '1.3.6.1.2.1.2.2.1.2'
+IF_OPER_STATUS = '1.3.6.1.2.1.2.2.1.8'
+IF_HC_IN_OCTETS = '1.3.6.1.2.1.31.1.1.1.6'
+IF_HC_OUT_OCTETS = '1.3.6.1.2.1.31.1.1.1.10'
+IF_HIGH_SPEED = '1.3.6.1.2.1.31.1.1.1.15'
+IF_ALIAS = '1.3.6.1.2.1.31.1.1.1.18'
+
+INTERFACE_COLUMNS = (IF_DESCR, IF_OPER_STATUS, IF_HIGH_SPEED, IF_HC_IN_OCTETS, IF_HC_OUT_OCTETS, IF_ALIAS)
+
+# ifOperStatus (RFC 2863)
+OPER_STATUS_NAMES = {1: 'up', 2: 'down', 3: 'testing', 4: 'unknown', 5: 'dormant',
+                     6: 'notPresent', 7: 'lowerLayerDown'}
+
+TableColumns = Dict[str, Dict[Tuple[int, ...], Any]]
+
+
+async def walk_columns(poller: FleetPoller, target: PollTarget, columns: Sequence[str],
+                       max_repetitions: int = DEFAULT_MAX_REPETITIONS) -> TableColumns:
+    """
+    Parcourt des colonnes de table par GETBULK.
+
+    Args:
+        poller: poller fournissant le client et les limites de concurrence.
+        target: équipement interrogé.
+        columns: OID des colonnes (ex. ``IF_DESCR``).
+        max_repetitions: lignes demandées par colonne et par PDU.
+    Returns:
+        dict: OID de colonne -> {index de ligne (tuple): valeur}.
+    """
+    prefixes = {column: Oid(column) for column in columns}
+    table: TableColumns = {column: {} for column in columns}
+    cursor = dict(prefixes)
+    while cursor:
+        open_columns = list(cursor)
+        response = await poller.request(target, GET_BULK_REQUEST,
+                                        [(cursor[c], None) for c in open_columns],
+                                        max_repetitions=max_repetitions)
+        if not response.varbinds:
+            break
+        finished = set()
+        for position, (oid, value) in enumerate(response.varbinds):
+            column = open_columns[position % len(open_columns)]
+            if column in finished:
+                continue
+            prefix = prefixes[column]
+            # Fin de colonne: sortie du préfixe, fin de MIB, ou OID non croissant (agent défaillant)
+            if isinstance(value, VarBindException) or not oid.startswith(prefix) or oid <= cursor[column]:
+                finished.add(column)
+                continue
+            table[column][tuple(oid[len(prefix):])] = value
+            cursor[column] = oid
+        for column in finished:
+            del cursor[column]
+    return table
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace').rstrip('\x00')
+    return '' if value is None else str(value)
+
+
+def interface_rows(table: TableColumns, equipment_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Lignes au format ``Interface`` à partir des colonnes ifTable/ifXTable.
+
+    ``speed`` est exprimé en bit/s (ifHighSpeed est en Mbit/s); ``in_octets``
+    et ``out_octets`` sont les compteurs 64 bits bruts.
+    """
+    indexes = sorted({index for column in table.values() for index in column})
+    rows = []
+    for index in indexes:
+        if len(index) != 1:
+            continue
+        row = {column: values.get(index) for column, values in table.items()}
+        high_speed = row.get(IF_HIGH_SPEED)
+        status = row.get(IF_OPER_STATUS)
+        rows.append({
+            'equipment_id': equipment_id,
+            'name': _text(row.get(IF_DESCR)),
+            'ifIndex': index[0],
+            'description': _text(row.get(IF_ALIAS)),
+            'speed': int(high_speed) * 1_000_000 if high_speed is not None else None,
+            'status': OPER_STATUS_NAMES.get(status, '') if status is not None else '',
+            'in_octets': int(row.get(IF_HC_IN_OCTETS) or 0),
+            'out_octets': int(row.get(IF_HC_OUT_OCTETS) or 0),
+        })
+    return rows
+
+
+async def collect_interfaces(poller: FleetPoller, target: PollTarget,
+                             max_repetitions: int = DEFAULT_MAX_REPETITIONS) -> List[Dict[str, Any]]:
+    """Interfaces d'un équipement (descriptions, état, débit, compteurs) en quelques GETBULK."""
+    table = await walk_columns(poller, target, INTERFACE_COLUMNS, max_repetitions)
+    return interface_rows(table, target.equipment_id)
+
+
+def poll_interfaces(poller: FleetPoller, targets: Iterable[PollTarget],
+                    max_repetitions: int = DEFAULT_MAX_REPETITIONS) -> AsyncIterator[PollResult]:
+    """
+    Collecte les interfaces de chaque cible; itérateur asynchrone de ``PollResult``
+    dont ``values['interfaces']`` contient les lignes ``Interface``.
+    """
+    async def collect(poller: FleetPoller, target: PollTarget) -> Dict[str, Any]:
+        return {'interfaces': await collect_interfaces(poller, target, max_repetitions)}
+    return poller.run(targets, collect)
@@ -0,0 +1,335 @@
+"""
+Chaîne de traitement des collectes d'interfaces: compteurs -> débits -> historique et centiles.
+
+``MetricPipeline.ingest`` reçoit des ``PollResult`` (``values['interfaces']``),
+calcule débits et utilisation avec ``CounterRateEngine``, puis alimente
+l'historique (``TimeSeriesStore``), les sketches de centiles
+(``SketchBank``) et les régressions en continu (``OnlineRegressionBank``,
+abscisse en jours, oubli de demi-vie ``FORECAST_HALF_LIFE_DAYS``), lues
+telles quelles par ``saturation(LIVE_TIER)``.
+Les tendances de saturation par niveau d'historique passent par un
+``ForecastCache``: seules les séries dont une période s'est close depuis
+le dernier calcul sont réévaluées. Les débits alimentent aussi la capacité
+utilisée des agrégats par domaine et site (``app.inventory.rollups``).
+
+Avec un ``SegmentStore``, les agrégats clos de ``PERSISTED_TIERS`` sont
+écrits sur disque toutes les ``SEGMENT_FLUSH_PERIODS`` périodes de leur
+niveau, bien avant que les anneaux en mémoire ne les écrasent, par un
+thread d'arrière-plan (la collecte ne l'attend jamais), puis fusionnés
+par période close (``SegmentStore.compact``); ``history`` complète la
+mémoire par ces segments pour les lectures qui remontent plus loin
+(tendances de saturation comprises).
+
+``on_result`` s'utilise directement comme rappel de ``run_scheduler``;
+``get_pipeline()`` retourne l'instance partagée du processus. Un processus
+qui ne collecte pas (serveur web) lit l'historique écrit par la collecte
+via ``HistoryReader``: ``metrics_source()`` retourne l'une ou l'autre aux
+pages de reporting.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except Exception:  # keep offline even if numpy missing
+    np = None
+
+from app.inventory.rollups import CapacityRollups, get_rollups
+from app.inventory.utilization import CounterRateEngine, RateBatch
+from app.predictive import (
+    SATURATION_THRESHOLDS, ForecastCache, OnlineRegressionBank, online_saturation_rows, rank_rows, saturation_rows,
+)
+from app.timeseries.segments import SegmentStore, metrics_dir
+from app.timeseries.sketch import DEFAULT_WINDOW_RETENTION, SketchBank
+from app.timeseries.store import STATS, TIERS, TimeSeriesStore
+
+# Demi-vie (jours) des échantillons dans la tendance d'utilisation
+FORECAST_HALF_LIFE_DAYS = 30.0
+SECONDS_PER_DAY = 86400.0
+# Niveau de ``saturation`` lu dans les régressions en continu (chaque relevé, sans historique)
+LIVE_TIER = 'live'
+# Niveaux écrits sur disque, et périodes accumulées en mémoire entre deux écritures d'un niveau
+PERSISTED_TIERS = ('5m', '1h', '1d')
+SEGMENT_FLUSH_PERIODS = 12
+# Périodes d'historique (mémoire puis disque) utilisées pour une tendance de saturation
+SATURATION_LOOKBACK_PERIODS = 2016
+# Intervalle (s) entre deux écritures du dernier débit des interfaces (lu par ``HistoryReader``)
+USAGE_FLUSH_SECONDS = 300
+# Lecture sans collecte: intervalle minimal (s) entre deux relectures des segments,
+# et niveau lu à la place de ``LIVE_TIER`` (les régressions en continu ne sont pas persistées)
+READER_REFRESH_SECONDS = 60.0
+READER_LIVE_TIER = '5m'
+
+logger = logging.getLogger(__name__)
+
+_PIPELINE_LOCK = threading.Lock()
+_PIPELINE: Optional['MetricPipeline'] = None
+_READERS: Dict[str, 'HistoryReader'] = {}
+
+
+def _windows(now: float) -> Dict[str, float]:
+    """Rang de la fenêtre d'écriture en cours de chaque niveau persisté et du débit des interfaces."""
+    windows = {tier: now // (step * SEGMENT_FLUSH_PERIODS) for tier, step in TIERS if tier in PERSISTED_TIERS}
+    windows['usage'] = now // USAGE_FLUSH_SECONDS
+    return windows
+
+
+def _ranked_saturation(cache: ForecastCache, last_closed: Dict[Any, float], read: Any, tier: str, stat: str,
+                       thresholds: Sequence[float], workers: Optional[int], top: Optional[int],
+                       now: Optional[float]) -> List[Dict[str, Any]]:
+    """
+    Classement de saturation d'un niveau d'historique: seules les séries dont la dernière
+    période close a changé depuis le dernier calcul sont relues (``read(clé, niveau, start=...)``).
+    """
+    params = ('saturation', tier, stat, tuple(thresholds))
+    cached, missing = cache.get_many(last_closed, params)
+    step = dict(TIERS)[tier]
+    series = {}
+    for key in missing:
+        data = read(key, tier, start=last_closed[key] - step * (SATURATION_LOOKBACK_PERIODS - 1))
+        if len(data['time']) < 2:
+            continue
+        series[key] = (np.asarray(data['time']) + step / 2, np.asarray(data[stat], dtype=np.float64))
+    fresh = saturation_rows(series, thresholds, workers)
+    cache.put_many({row['key']: (last_closed[row['key']], row) for row in fresh}, params)
+    return rank_rows([*cached.values(), *fresh], thresholds, top=top, now=now)
+
+
+class MetricPipeline:
+    """Regroupe le calcul des débits, l'historique, les centiles par fenêtre et les tendances."""
+
+    def __init__(self, engine: Optional[CounterRateEngine] = None, store: Optional[TimeSeriesStore] = None,
+                 sketches: Optional[SketchBank] = None, forecasts: Optional[OnlineRegressionBank] = None,
+                 cache: Optional[ForecastCache] = None, rollups: Optional[CapacityRollups] = None,
+                 segments: Optional[SegmentStore] = None) -> None:
+        self.engine = engine or CounterRateEngine()
+        self.store = store or TimeSeriesStore()
+        self.sketches = sketches or SketchBank()
+        self.forecasts = forecasts or OnlineRegressionBank(half_life=FORECAST_HALF_LIFE_DAYS)
+        self.cache = cache or ForecastCache()
+        self.rollups = rollups  # None: agrégats de l'inventaire configuré au moment de la collecte
+        self.segments = segments  # None: historique en mémoire seulement
+        self._lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        self._persist_thread: Optional[threading.Thread] = None
+        self._flushed: Dict[str, float] = {}  # niveau -> rang de la dernière fenêtre d'écriture
+
+    def ingest(self, results: Iterable[Any], timestamp: Optional[float] = None) -> RateBatch:
+        """Traite les résultats d'une collecte (ou d'un seul équipement) à l'horodatage donné."""
+        now = time.time() if timestamp is None else timestamp
+        with self._lock:
+            batch = self.engine.update_from_results(results, now)
+            self.store.append_rates(batch, now)
+            self.sketches.add_rates(batch, now)
+            self.forecasts.update(batch.keys, batch.utilization, now / SECONDS_PER_DAY)
+            (self.rollups or get_rollups()).record_rates(batch)
+        self._persist_later(now)
+        return batch
+
+    def _due(self, now: float) -> bool:
+        """Vrai si une fenêtre d'écriture (niveau persisté ou débit) s'est ouverte depuis la dernière écriture."""
+        return any(self._flushed.get(name) != window for name, window in _windows(now).items())
+
+    def _persist_later(self, now: float) -> None:
+        """Lance ``persist`` dans un thread d'arrière-plan si une écriture est due et aucune en cours."""
+        if self.segments is None or not self._due(now):
+            return
+        with self._lock:
+            if self._persist_thread is not None and self._persist_thread.is_alive():
+                return
+            self._persist_thread = threading.Thread(target=self._persist_in_background, args=(now,),
+                                                    name='metric-persist', daemon=True)
+            self._persist_thread.start()
+
+    def _persist_in_background(self, now: float) -> None:
+        try:
+            self.persist(now)
+        except Exception:
+            logger.exception("écriture de l'historique sur disque en échec")
+
+    def wait_persisted(self, timeout: Optional[float] = None) -> bool:
+        """Attend la fin de l'écriture d'arrière-plan en cours; False si ``timeout`` a expiré."""
+        thread = self._persist_thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def persist(self, now: Optional[float] = None, force: bool = False) -> int:
+        """
+        Écrit sur disque les agrégats clos non encore persistés de ``PERSISTED_TIERS``, et
+        le dernier débit des interfaces (toutes les ``USAGE_FLUSH_SECONDS``).
+        Sans ``force``, un niveau n'est écrit qu'une fois toutes les ``SEGMENT_FLUSH_PERIODS``
+        périodes, et jamais pendant une écriture en cours. Chaque niveau écrit est ensuite
+        fusionné par période close. ``ingest`` l'appelle depuis un thread d'arrière-plan.
+        Returns:
+            int: nombre de segments écrits.
+        """
+        if self.segments is None or not self._persist_lock.acquire(blocking=force):
+            return 0
+        now = time.time() if now is None else now
+        written = 0
+        try:
+            for name, window in _windows(now).items():
+                if not force and self._flushed.get(name) == window:
+                    continue
+                self._flushed[name] = window
+                try:
+                    if name == 'usage':
+                        self.segments.write_usage((self.rollups or get_rollups()).port_usage())
+                        continue
+                    written += self.segments.write_rollups(self.store, name) is not None
+                    self.segments.compact(name)
+                except OSError as exc:
+                    logger.warning('historique %s non écrit sur disque: %s', name, exc)
+        finally:
+            self._persist_lock.release()
+        return written
+
+    def history(self, key: Any, tier: str = '1h', start: Optional[float] = None,
+                end: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Agrégats clos d'une série sur [start, end]: la mémoire, précédée des segments sur disque
+        pour les périodes plus anciennes que les anneaux (lus seulement si la mémoire ne couvre pas ``start``).
+        Returns:
+            dict: ``time`` (début de période, s) et ``STATS``, tableaux float64 chronologiques.
+        """
+        memory = self.store.series(key, tier, start, end)
+        result = {name: memory[name] for name in ('time', *STATS)}
+        times = memory['time']
+        if self.segments is None or (len(times) and start is not None and times[0] <= start):
+            return result
+        disk = self.segments.query(key, tier, start, times[0] if len(times) else end)
+        keep = disk['time'] < times[0] if len(times) else slice(None)
+        if not len(disk['time'][keep]):
+            return result
+        return {name: np.concatenate([np.asarray(disk[name][keep], dtype=np.float64), result[name]])
+                for name in result}
+
+    def saturation(self, tier: str = LIVE_TIER, stat: str = 'avg', top: Optional[int] = None,
+                   thresholds: Sequence[float] = SATURATION_THRESHOLDS, workers: Optional[int] = None,
+                   now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Interfaces les plus proches de la saturation.
+        Args:
+            tier: ``LIVE_TIER`` pour les tendances en continu de ``self.forecasts`` (mises à jour
+                à chaque relevé, lues sans réajustement), sinon niveau de l'historique
+                (``5m``, ``1h``, ``1d``) dont les agrégats sont réajustés; horodatage = milieu de période.
+            stat: agrégat utilisé (``avg``, ``p95``, ``max``...; ignoré pour ``LIVE_TIER``).
+        Returns:
+            List[dict]: lignes de ``rank_saturation`` (seules les séries d'au moins 2 points),
+            réutilisées depuis ``self.cache`` tant qu'aucune période n'a été close.
+        """
+        if tier == LIVE_TIER:
+            with self._lock:
+                rows = online_saturation_rows(self.forecasts, thresholds, x_unit=SECONDS_PER_DAY)
+            return rank_rows(rows, thresholds, top=top, now=now)
+        return _ranked_saturation(self.cache, self.store.last_closed(tier, min_periods=2), self.history, tier,
+                                  stat, thresholds, workers, top, now)
+
+    def on_result(self, result: Any) -> None:
+        """Rappel par équipement pour ``PollScheduler`` / ``run_scheduler``."""
+        if result.ok:
+            self.ingest([result])
+
+
+def get_pipeline() -> MetricPipeline:
+    """Chaîne partagée du processus, historique persisté dans ``metrics_dir()`` (RuntimeError sans numpy)."""
+    global _PIPELINE
+    with _PIPELINE_LOCK:
+        if _PIPELINE is None:
+            _PIPELINE = MetricPipeline(segments=SegmentStore())
+        return _PIPELINE
+
+
+def active_pipeline() -> Optional[MetricPipeline]:
+    """Chaîne partagée si elle a déjà été créée (None sinon), sans la créer."""
+    return _PIPELINE
+
+
+class HistoryReader:
+    """
+    Lecture seule de l'historique écrit par la collecte d'un autre processus (serveur web).
+
+    Reprend l'interface de lecture de ``MetricPipeline`` à partir du disque:
+    ``saturation`` lit les segments (``LIVE_TIER`` devient ``READER_LIVE_TIER``),
+    ``sketches`` reçoit au fil des relectures les moyennes 5 minutes de chaque
+    série (centiles par fenêtre calculés sur ces moyennes), et le dernier débit
+    des interfaces alimente la capacité utilisée des agrégats (``get_rollups``).
+    """
+
+    def __init__(self, segments: Optional[SegmentStore] = None, sketches: Optional[SketchBank] = None,
+                 cache: Optional[ForecastCache] = None, refresh_interval: float = READER_REFRESH_SECONDS) -> None:
+        self.segments = segments or SegmentStore()
+        self.sketches = sketches or SketchBank()
+        self.cache = cache or ForecastCache()
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._refreshed: Optional[float] = None
+        self._fed: Dict[Any, float] = {}  # série -> dernière période 5 minutes versée dans ``sketches``
+
+    def refresh(self, now: Optional[float] = None, force: bool = False) -> None:
+        """
+        Relit les segments (au plus une fois par ``refresh_interval`` sans ``force``), verse
+        les nouvelles périodes 5 minutes dans ``sketches`` et le dernier débit dans les agrégats.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if not force and self._refreshed is not None and now - self._refreshed < self.refresh_interval:
+                return
+            self._refreshed = now
+            self.segments.refresh()
+            # Fenêtres plus anciennes que la rétention des sketches: inutile de les relire
+            oldest = (self.segments.last_time('5m') or now) - 31 * SECONDS_PER_DAY * DEFAULT_WINDOW_RETENTION
+            for key, last in self.segments.last_times('5m').items():
+                fed = self._fed.get(key)
+                if fed is not None and last <= fed:
+                    continue
+                data = self.segments.query(key, '5m', start=oldest if fed is None else fed)
+                keep = data['time'] > fed if fed is not None else slice(None)
+                self.sketches.add_series(key, data['avg'][keep], data['time'][keep])
+                self._fed[key] = last
+            usage = self.segments.read_usage()
+        if usage:
+            get_rollups().record_usage(list(usage), list(usage.values()))
+
+    def history(self, key: Any, tier: str = '1h', start: Optional[float] = None,
+                end: Optional[float] = None) -> Dict[str, Any]:
+        """Agrégats persistés d'une série sur [start, end] (voir ``MetricPipeline.history``)."""
+        data = self.segments.query(key, tier, start, end)
+        return {name: np.asarray(data[name], dtype=np.float64) for name in ('time', *STATS)}
+
+    def saturation(self, tier: str = LIVE_TIER, stat: str = 'avg', top: Optional[int] = None,
+                   thresholds: Sequence[float] = SATURATION_THRESHOLDS, workers: Optional[int] = None,
+                   now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Voir ``MetricPipeline.saturation``; les tendances sont réajustées sur l'historique persisté."""
+        if tier == LIVE_TIER:
+            tier = READER_LIVE_TIER
+        return _ranked_saturation(self.cache, self.segments.last_times(tier), self.history, tier, stat,
+                                  thresholds, workers, top, now)
+
+
+def metrics_source() -> Optional[Any]:
+    """
+    Chaîne de collecte du processus si elle existe, sinon lecteur partagé de l'historique
+    persisté dans ``metrics_dir()`` (rafraîchi au plus toutes les ``READER_REFRESH_SECONDS``).
+    Returns:
+        MetricPipeline | HistoryReader | None: None sans numpy.
+    """
+    pipeline = active_pipeline()
+    if pipeline is not None:
+        return pipeline
+    directory = metrics_dir()
+    with _PIPELINE_LOCK:
+        reader = _READERS.get(directory)
+        if reader is None:
+            try:
+                reader = _READERS[directory] = HistoryReader(SegmentStore(directory))
+            except RuntimeError:
+                return None
+    reader.refresh()
+    return reader
@@ -0,0 +1,540 @@
+"""
+Segments sur disque de l'historique des métriques (colonnes binaires, lues par ``numpy.memmap``).
+
+Un segment est un fichier immuable ``<niveau>-<début>-<fin>.seg`` et son
+index ``.idx.json``. Pour chaque série, le fichier contient une colonne
+d'horodatages (float64, triés) puis une colonne float32 par valeur
+(``value`` pour les échantillons bruts, ``min``/``avg``/``max``/``p95``
+pour les agrégats), chaque colonne alignée sur 8 octets. L'index tient en
+deux lignes JSON: un en-tête court (niveau, bornes temporelles, colonnes,
+segments remplacés), puis, par série, la position, le nombre de lignes et
+le dernier horodatage.
+
+Au démarrage, seuls les en-têtes sont lus; l'index des séries d'un segment
+n'est chargé qu'à sa première lecture, et au plus ``MAX_LOADED_SEGMENTS``
+restent chargés. Une requête projette le fichier en mémoire
+(``numpy.memmap``, en lecture seule) et retourne des tranches de ces
+colonnes sans copie ni désérialisation; seule une requête qui couvre
+plusieurs segments concatène les tranches.
+
+Les petits segments écrits au fil de la collecte sont fusionnés
+(``SegmentStore.compact``) par jour (``raw``, ``5m``) ou par mois (``1h``,
+``1d``) une fois la période close. Le segment fusionné nomme ceux qu'il
+remplace: ils sont ignorés, puis supprimés, même après une interruption
+entre l'écriture et la suppression. Le dernier horodatage écrit de chaque
+série (marque de reprise de ``SegmentStore.write_rollups``) est tenu dans
+``<niveau>.marks.json``, sans relire les index de tous les segments;
+``usage.json`` garde le dernier débit de chaque interface.
+
+Dossier: ``data/metrics`` (surcharge via ``IPCM_METRICS_DIR``).
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except Exception:  # keep offline even if numpy missing
+    np = None
+
+from app.inventory.store import DATA_DIR
+
+# Incrémenté quand la disposition des segments change (les anciens sont ignorés)
+SEGMENT_FORMAT = 2
+SEGMENT_MAGIC = b'IPCMSEG1'
+RAW_TIER = 'raw'
+RAW_COLUMNS = ('value',)
+# Segments dont l'index des séries et la projection restent chargés (les moins récemment lus sont libérés)
+MAX_LOADED_SEGMENTS = 32
+# Taille maximale de la ligne d'en-tête d'un index (au-delà: fichier étranger)
+_HEADER_MAX_BYTES = 65536
+_ALIGN = 8
+# Dernier débit de chaque interface, écrit par la collecte pour les processus qui ne font que lire
+USAGE_FILE = 'usage.json'
+# Niveaux fusionnés par jour (les autres par mois)
+DAILY_TIERS = (RAW_TIER, '5m')
+
+
+def metrics_dir() -> str:
+    """Dossier des segments (variable d'environnement relue à chaque appel)."""
+    return os.environ.get('IPCM_METRICS_DIR') or os.path.join(DATA_DIR, 'metrics')
+
+
+def encode_key(key: Hashable) -> str:
+    """Clé de série -> texte de l'index (les tuples deviennent des listes JSON)."""
+    return json.dumps(key, separators=(',', ':'))
+
+
+def decode_key(text: str) -> Hashable:
+    def freeze(value: Any) -> Hashable:
+        return tuple(freeze(v) for v in value) if isinstance(value, list) else value
+    return freeze(json.loads(text))
+
+
+def _aligned(size: int) -> int:
+    return -(-size // _ALIGN) * _ALIGN
+
+
+def compaction_bucket(tier: str, t: float) -> Tuple[int, int]:
+    """Période de fusion d'un horodatage: jour UTC pour ``DAILY_TIERS``, mois UTC sinon."""
+    moment = time.gmtime(t)
+    if tier in DAILY_TIERS:
+        return moment.tm_year, moment.tm_yday
+    return moment.tm_year, moment.tm_mon
+
+
+def _atomic_write(path: str, write: Any, mode: str = 'wb') -> None:
+    fd, tmp_path = tempfile.mkstemp(prefix='.segment-', suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _remove(segment: 'Segment') -> None:
+    """Supprime un segment (index d'abord: il n'est plus listé même si la suite échoue)."""
+    segment.close()
+    for path in (segment.index_path, segment.path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+class Segment:
+    """Segment ouvert: en-tête en mémoire, index des séries et colonnes chargés à la première lecture."""
+
+    def __init__(self, index_path: str) -> None:
+        with open(index_path, encoding='utf-8') as f:
+            header = f.readline(_HEADER_MAX_BYTES)
+        if not header.endswith('\n'):
+            raise ValueError(f'index de segment invalide: {index_path}')
+        meta = json.loads(header)
+        if meta.get('format') != SEGMENT_FORMAT:
+            raise ValueError(f'format de segment non supporté: {index_path}')
+        self.index_path = index_path
+        self.path = index_path[:-len('.idx.json')] + '.seg'
+        self.name = os.path.basename(self.path)[:-len('.seg')]
+        self.tier: str = meta['tier']
+        self.start: float = meta['start']
+        self.end: float = meta['end']
+        self.columns: List[str] = meta['columns']
+        self.size: int = meta['count']
+        self.replaces: List[str] = meta.get('replaces', [])
+        # Date d'écriture de l'index (ns): situe le segment par rapport au fichier de marques
+        self.written: int = os.stat(index_path).st_mtime_ns
+        # Clé encodée -> [position, lignes, dernier horodatage], chargé à la demande
+        self._series: Optional[Dict[str, List[Any]]] = None
+        self._buffer = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, key: Hashable) -> bool:
+        return encode_key(key) in self._index()
+
+    def _read_index(self) -> Dict[str, List[Any]]:
+        with open(self.index_path, encoding='utf-8') as f:
+            f.readline()
+            return json.loads(f.readline())
+
+    def _index(self) -> Dict[str, List[Any]]:
+        with self._lock:
+            if self._series is None:
+                self._series = self._read_index()
+            return self._series
+
+    def keys(self) -> List[Hashable]:
+        return [decode_key(k) for k in self._index()]
+
+    def last_times(self) -> Dict[Hashable, float]:
+        """Dernier horodatage de chaque série du segment (index relu sans être conservé s'il n'était pas chargé)."""
+        series = self._series if self._series is not None else self._read_index()
+        return {decode_key(encoded): entry[2] for encoded, entry in series.items()}
+
+    def _mapped(self) -> Any:
+        with self._lock:
+            if self._buffer is None:
+                self._buffer = np.memmap(self.path, dtype=np.uint8, mode='r')
+                if bytes(self._buffer[:len(SEGMENT_MAGIC)]) != SEGMENT_MAGIC:
+                    raise ValueError(f'segment invalide: {self.path}')
+            return self._buffer
+
+    def read(self, key: Hashable, start: Optional[float] = None, end: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Colonnes d'une série dans [start, end] (tranches en lecture seule du fichier projeté).
+        Returns:
+            dict | None: ``time`` et une entrée par colonne de valeurs; None si la série est absente.
+        """
+        entry = self._index().get(encode_key(key))
+        if entry is None:
+            return None
+        offset, count = entry[:2]
+        buffer = self._mapped()
+        times = buffer[offset:offset + 8 * count].view(np.float64)
+        lo = 0 if start is None else int(np.searchsorted(times, start, 'left'))
+        hi = count if end is None else int(np.searchsorted(times, end, 'right'))
+        result = {'time': times[lo:hi]}
+        position = offset + _aligned(8 * count)
+        for name in self.columns:
+            result[name] = buffer[position:position + 4 * count].view(np.float32)[lo:hi]
+            position += _aligned(4 * count)
+        return result
+
+    def close(self) -> None:
+        """Libère l'index des séries et la projection (rechargés à la lecture suivante)."""
+        with self._lock:
+            self._buffer = None
+            self._series = None
+
+
+SeriesInput = Union[Mapping[Hashable, Mapping[str, Any]], Iterable[Tuple[Hashable, Mapping[str, Any]]]]
+
+
+def _prepared(key: Hashable, data: Mapping[str, Any], columns: Sequence[str]) -> Tuple[Any, List[Any]]:
+    times = np.ascontiguousarray(data['time'], dtype=np.float64)
+    if np.any(np.diff(times) < 0):
+        raise ValueError(f'horodatages non triés pour la série {key!r}')
+    values = []
+    for name in columns:
+        column = np.ascontiguousarray(data[name], dtype=np.float32)
+        if column.shape != times.shape:
+            raise ValueError(f'colonne {name!r} de longueur différente pour la série {key!r}')
+        values.append(column)
+    return times, values
+
+
+def write_segment(directory: str, tier: str, series: SeriesInput, columns: Sequence[str] = RAW_COLUMNS,
+                  replaces: Sequence[str] = ()) -> Optional[Segment]:
+    """
+    Écrit un segment immuable (fichier de données puis index, chacun atomiquement).
+
+    Les séries sont écrites au fil de leur lecture: un itérable de paires n'est jamais
+    matérialisé, seul l'index reste en mémoire.
+
+    Args:
+        directory: dossier des segments.
+        tier: niveau (``raw``, ``5m``, ``1h``, ``1d``...).
+        series: par clé (dict ou itérable de paires), ``time`` (croissant) et une colonne par nom de ``columns``.
+        columns: noms des colonnes de valeurs (float32).
+        replaces: noms des segments que celui-ci remplace (fusion).
+    Returns:
+        Segment | None: segment écrit, None si aucune série n'a de ligne.
+    Raises:
+        ValueError: colonnes de longueurs différentes ou horodatages non triés.
+    """
+    items = series.items() if isinstance(series, Mapping) else series
+    index: Dict[str, List[Any]] = {}
+    bounds = [math.inf, -math.inf]
+
+    def write_data(f: Any) -> None:
+        f.write(SEGMENT_MAGIC)
+        position = len(SEGMENT_MAGIC)
+        for key, data in items:
+            times, values = _prepared(key, data, columns)
+            if not len(times):
+                continue
+            index[encode_key(key)] = [position, len(times), float(times[-1])]
+            bounds[0], bounds[1] = min(bounds[0], float(times[0])), max(bounds[1], float(times[-1]))
+            for column in (times, *values):
+                raw = column.tobytes()
+                padding = _aligned(len(raw)) - len(raw)
+                f.write(raw + b'\0' * padding)
+                position += len(raw) + padding
+
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.segment-', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write_data(f)
+        if index:
+            # Bornes arrondies vers l'extérieur: le nom couvre toujours le contenu
+            name = stem = os.path.join(directory, f'{tier}-{math.floor(bounds[0])}-{math.ceil(bounds[1])}')
+            # Segments immuables: un lot aux mêmes bornes (séries en retard) reçoit un suffixe
+            sequence = 0
+            while os.path.exists(stem + '.seg') or os.path.exists(stem + '.idx.json'):
+                sequence += 1
+                stem = f'{name}.{sequence}'
+            os.replace(tmp_path, stem + '.seg')
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+    if not index:
+        return None
+    header = {'format': SEGMENT_FORMAT, 'tier': tier, 'start': bounds[0], 'end': bounds[1],
+              'columns': list(columns), 'count': len(index), 'replaces': list(replaces)}
+    _atomic_write(stem + '.idx.json', lambda f: f.write(
+        json.dumps(header, separators=(',', ':')) + '\n' + json.dumps(index, separators=(',', ':')) + '\n'), mode='w')
+    segment = Segment(stem + '.idx.json')
+    segment._series = index
+    return segment
+
+
+def _merged_series(segments: Sequence[Segment]) -> Iterator[Tuple[Hashable, Dict[str, Any]]]:
+    """Séries de plusieurs segments, une à une, triées; à horodatage égal la dernière écriture l'emporte."""
+    keys: Dict[Hashable, None] = {}
+    for segment in segments:
+        keys.update(dict.fromkeys(segment.keys()))
+    for key in keys:
+        parts = [data for data in (segment.read(key) for segment in segments) if data is not None]
+        data = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+        order = np.argsort(data['time'], kind='stable')
+        times = data['time'][order]
+        keep = np.append(times[1:] != times[:-1], True)
+        yield key, {name: column[order][keep] for name, column in data.items()}
+
+
+class SegmentStore:
+    """Ensemble des segments d'un dossier, par niveau, triés par début."""
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        if np is None:
+            raise RuntimeError("historique sur disque indisponible (numpy manquant)")
+        self.directory = directory or metrics_dir()
+        self._lock = threading.Lock()
+        self._segments: Dict[str, List[Segment]] = {}
+        self._replaced: Dict[str, List[Segment]] = {}  # sources d'une fusion encore présentes
+        self._last: Dict[str, Dict[Hashable, float]] = {}  # niveau -> dernier horodatage écrit par série
+        self._loaded: 'OrderedDict[str, Segment]' = OrderedDict()  # segments lus, du plus ancien au plus récent
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Relit les en-têtes des index du dossier (segments écrits ou fusionnés par un autre processus)."""
+        found: List[Segment] = []
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if not name.endswith('.idx.json'):
+                continue
+            try:
+                found.append(Segment(os.path.join(self.directory, name)))
+            except (OSError, ValueError, KeyError):
+                continue  # index illisible ou d'un autre format: ignoré
+        replaced = {name for segment in found for name in segment.replaces}
+        segments: Dict[str, List[Segment]] = {}
+        stale: Dict[str, List[Segment]] = {}
+        for segment in found:
+            (stale if segment.name in replaced else segments).setdefault(segment.tier, []).append(segment)
+        for tier_segments in segments.values():
+            tier_segments.sort(key=lambda s: (s.start, s.end))
+        with self._lock:
+            self._segments, self._replaced = segments, stale
+            self._last = {}
+            released = list(self._loaded.values())
+            self._loaded.clear()
+        for segment in released:
+            segment.close()
+
+    def segments(self, tier: str) -> List[Segment]:
+        with self._lock:
+            return list(self._segments.get(tier, ()))
+
+    def last_time(self, tier: str) -> Optional[float]:
+        """Dernier horodatage écrit pour un niveau (None si aucun segment)."""
+        segments = self.segments(tier)
+        return max(s.end for s in segments) if segments else None
+
+    def _marks_path(self, tier: str) -> str:
+        return os.path.join(self.directory, f'{tier}.marks.json')
+
+    def _load_marks(self, tier: str) -> Dict[Hashable, float]:
+        """
+        Marques d'un niveau: le fichier de marques, complété par les segments écrits après lui
+        (seuls leurs index sont relus). Verrou ``self._lock`` tenu par l'appelant.
+        """
+        last: Dict[Hashable, float] = {}
+        written = -1
+        try:
+            with open(self._marks_path(tier), encoding='utf-8') as f:
+                marks = json.load(f)
+            if marks.get('format') == SEGMENT_FORMAT:
+                written = marks['written']
+                last = {decode_key(k): t for k, t in marks['series'].items()}
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass  # absent ou illisible: reconstruit depuis les segments
+        for segment in self._segments.get(tier, ()):
+            if segment.written > written:
+                for key, t in segment.last_times().items():
+                    if t > last.get(key, -np.inf):
+                        last[key] = t
+        return last
+
+    def last_times(self, tier: str) -> Dict[Hashable, float]:
+        """Dernier horodatage écrit de chaque série d'un niveau (lu une fois, puis tenu à jour)."""
+        with self._lock:
+            last = self._last.get(tier)
+            if last is None:
+                last = self._last[tier] = self._load_marks(tier)
+            return dict(last)
+
+    def _mark(self, tier: str, segment: Segment) -> None:
+        """Avance les marques d'un niveau après l'écriture d'un segment et les enregistre."""
+        with self._lock:
+            last = self._last.get(tier)
+            if last is None:
+                last = self._last[tier] = self._load_marks(tier)
+            for key, t in segment.last_times().items():
+                if t > last.get(key, -np.inf):
+                    last[key] = t
+            marks = {'format': SEGMENT_FORMAT, 'written': max(s.written for s in self._segments[tier]),
+                     'series': {encode_key(k): t for k, t in last.items()}}
+        _atomic_write(self._marks_path(tier), lambda f: json.dump(marks, f, separators=(',', ':')), mode='w')
+
+    def write_usage(self, usage: Mapping[Hashable, float]) -> None:
+        """Enregistre le dernier débit (bit/s) de chaque interface (relu par ``read_usage``)."""
+        data = {'format': SEGMENT_FORMAT, 'series': {encode_key(k): v for k, v in usage.items()}}
+        os.makedirs(self.directory, exist_ok=True)
+        _atomic_write(os.path.join(self.directory, USAGE_FILE),
+                      lambda f: json.dump(data, f, separators=(',', ':')), mode='w')
+
+    def read_usage(self) -> Dict[Hashable, float]:
+        """Dernier débit enregistré par ``write_usage`` ({} si absent ou illisible)."""
+        try:
+            with open(os.path.join(self.directory, USAGE_FILE), encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') != SEGMENT_FORMAT:
+                return {}
+            return {decode_key(k): float(v) for k, v in data['series'].items()}
+        except (OSError, ValueError, KeyError, AttributeError, TypeError):
+            return {}
+
+    def _touch(self, segment: Segment) -> None:
+        """Note la lecture d'un segment; au-delà de ``MAX_LOADED_SEGMENTS``, libère les moins récemment lus."""
+        with self._lock:
+            self._loaded[segment.index_path] = segment
+            self._loaded.move_to_end(segment.index_path)
+            released = []
+            while len(self._loaded) > MAX_LOADED_SEGMENTS:
+                released.append(self._loaded.popitem(last=False)[1])
+        for old in released:
+            old.close()
+
+    def write(self, tier: str, series: SeriesInput, columns: Sequence[str] = RAW_COLUMNS,
+              replaces: Sequence[str] = ()) -> Optional[Segment]:
+        """Écrit un segment dans le dossier et l'ajoute aux segments lisibles (à la place de ``replaces``)."""
+        segment = write_segment(self.directory, tier, series, columns, replaces)
+        if segment is None:
+            return None
+        with self._lock:
+            tier_segments = [s for s in self._segments.get(tier, ())
+                             if s.index_path != segment.index_path and s.name not in segment.replaces]
+            tier_segments.append(segment)
+            tier_segments.sort(key=lambda s: (s.start, s.end))
+            self._segments[tier] = tier_segments
+        self._touch(segment)
+        if not replaces:  # une fusion ne déplace aucune marque
+            self._mark(tier, segment)
+        return segment
+
+    def write_rollups(self, store: Any, tier: str = '5m', end: Optional[float] = None) -> Optional[Segment]:
+        """
+        Persiste les agrégats clos d'un ``TimeSeriesStore`` postérieurs, série par série, au
+        dernier horodatage déjà écrit: les séries collectées moins souvent, dont les périodes
+        se closent plus tard, ne perdent rien. Chaque série n'est lue en mémoire qu'à partir
+        de sa marque, puis écrite aussitôt.
+        Args:
+            store: ``TimeSeriesStore`` en mémoire.
+            tier: niveau d'agrégation à écrire.
+            end: dernier début de période inclus (tout ce qui est clos par défaut).
+        """
+        from app.timeseries.store import STATS
+
+        written = self.last_times(tier)
+
+        def pending() -> Iterator[Tuple[Hashable, Dict[str, Any]]]:
+            for key in store.keys():
+                last = written.get(key)
+                data = store.series(key, tier, start=last, end=end)
+                if last is not None:
+                    keep = data['time'] > last
+                    data = {name: column[keep] for name, column in data.items()}
+                yield key, data
+
+        return self.write(tier, pending(), STATS)
+
+    def compact(self, tier: str) -> int:
+        """
+        Fusionne les segments d'un niveau par période close (``compaction_bucket``); la période
+        du segment le plus récent reste ouverte. Les sources ne sont supprimées qu'une fois le
+        segment fusionné écrit, et celles d'une fusion interrompue le sont ici.
+        Returns:
+            int: nombre de segments fusionnés écrits.
+        """
+        with self._lock:
+            stale = self._replaced.pop(tier, [])
+        for segment in stale:
+            _remove(segment)
+        segments = self.segments(tier)
+        if not segments:
+            return 0
+        current = compaction_bucket(tier, max(s.end for s in segments))
+        groups: Dict[Tuple[int, int], List[Segment]] = {}
+        for segment in segments:
+            bucket = compaction_bucket(tier, segment.start)
+            if bucket != current:
+                groups.setdefault(bucket, []).append(segment)
+        merged = 0
+        for group in groups.values():
+            if len(group) < 2:
+                continue
+            self.write(tier, _merged_series(group), group[0].columns, replaces=[s.name for s in group])
+            with self._lock:
+                for segment in group:
+                    self._loaded.pop(segment.index_path, None)
+            for segment in group:
+                _remove(segment)
+            merged += 1
+        return merged
+
+    def query(self, key: Hashable, tier: str = RAW_TIER, start: Optional[float] = None,
+              end: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Historique d'une série sur un niveau, dans [start, end].
+
+        Les colonnes sont des vues en lecture seule du fichier quand un seul segment
+        couvre l'intervalle, des copies concaténées sinon. Un segment supprimé entre-temps
+        (fusion par un autre processus) est ignoré jusqu'au prochain ``refresh``.
+        Returns:
+            dict: ``time`` et une entrée par colonne de valeurs (tableaux vides si aucune donnée).
+        """
+        parts = []
+        columns: Sequence[str] = RAW_COLUMNS
+        for segment in self.segments(tier):
+            if (start is not None and segment.end < start) or (end is not None and segment.start > end):
+                continue
+            columns = segment.columns
+            try:
+                data = segment.read(key, start, end)
+            except (OSError, ValueError):
+                continue
+            self._touch(segment)
+            if data is not None and len(data['time']):
+                parts.append(data)
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return {'time': np.empty(0), **{name: np.empty(0, dtype=np.float32) for name in columns}}
+        result = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+        if np.any(np.diff(result['time']) < 0):
+            # Segments triés par début: une série en retard peut les chevaucher
+            order = np.argsort(result['time'], kind='stable')
+            result = {name: column[order] for name, column in result.items()}
+        return result
@@ -0,0 +1,298 @@
+"""
+Centiles en flux (p95/p99) par interface et par fenêtre de facturation, avec des sketches DDSketch.
+
+Un DDSketch compte les valeurs dans des intervalles logarithmiques de
+raison ``gamma = (1 + a) / (1 - a)``: tout centile est restitué à ``a``
+près en erreur relative (1 % par défaut), quel que soit le nombre
+d'échantillons, et deux sketches de même paramétrage se fusionnent en
+additionnant leurs compteurs. Le centile d'un site ou d'un domaine est
+donc celui de la somme des sketches de ses interfaces, sans relire les
+échantillons.
+
+``SketchBank`` garde un tableau de compteurs (séries x intervalles) par
+fenêtre (mois UTC par défaut, ``YYYY-MM``): ajouter un cycle de collecte
+est une seule affectation NumPy, et les centiles de toutes les séries ou
+de tous les groupes se calculent en une passe.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence
+
+try:
+    import numpy as np
+except Exception:  # keep offline even if numpy missing
+    np = None
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# Plage utile (utilisation en %): en dessous de MIN_VALUE la valeur compte comme nulle,
+# au-dessus de MAX_VALUE elle tombe dans le dernier intervalle
+MIN_VALUE = 0.01
+MAX_VALUE = 200.0
+# Format des identifiants de fenêtre (UTC)
+WINDOW_FORMATS = {'day': '%Y-%m-%d', 'month': '%Y-%m'}
+DEFAULT_WINDOW = 'month'
+# Fenêtres conservées: fenêtre en cours et précédente (les plus anciennes sont abandonnées)
+DEFAULT_WINDOW_RETENTION = 2
+
+
+def window_id(timestamp: float, window: str = DEFAULT_WINDOW) -> str:
+    """Identifiant de la fenêtre (UTC) contenant ``timestamp``: ``2026-10`` ou ``2026-10-17``."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime(WINDOW_FORMATS[window])
+
+
+class LogMapping:
+    """Correspondance valeur <-> intervalle logarithmique; l'intervalle 0 reçoit les valeurs <= ``min_value``."""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 min_value: float = MIN_VALUE, max_value: float = MAX_VALUE) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy doit être entre 0 et 1')
+        if not 0 < min_value < max_value:
+            raise ValueError('il faut 0 < min_value < max_value')
+        self.relative_accuracy = relative_accuracy
+        self.min_value, self.max_value = min_value, max_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma) - 1
+        self.size = math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, LogMapping) and (
+            (self.relative_accuracy, self.min_value, self.max_value)
+            == (other.relative_accuracy, other.min_value, other.max_value))
+
+    def params(self) -> Dict[str, float]:
+        return {'relative_accuracy': self.relative_accuracy, 'min_value': self.min_value, 'max_value': self.max_value}
+
+    def index(self, values: Any) -> Any:
+        """Intervalle de chaque valeur (tableau d'entiers dans [0, size))."""
+        values = np.asarray(values, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            raw = np.ceil(np.log(np.maximum(values, self.min_value)) / self._log_gamma) - self._offset
+        raw = np.where(values > self.min_value, raw, 0)
+        return np.clip(raw, 0, self.size - 1).astype(np.intp)
+
+    def value(self, indexes: Any) -> Any:
+        """Valeur représentative des intervalles (erreur relative <= ``relative_accuracy``)."""
+        indexes = np.asarray(indexes)
+        upper = np.power(self.gamma, indexes + self._offset)
+        return np.where(indexes > 0, 2 * upper / (1 + self.gamma), 0.0)
+
+
+def _quantiles(counts: Any, mapping: LogMapping, q: float) -> Any:
+    """Centile ``q`` (0..100) de chaque ligne d'un tableau de compteurs; NaN pour une ligne vide."""
+    counts = np.atleast_2d(counts)
+    cumulative = np.cumsum(counts, axis=1, dtype=np.int64)
+    total = cumulative[:, -1]
+    rank = np.floor(q / 100.0 * np.maximum(total - 1, 0))
+    index = (cumulative <= rank[:, None]).sum(axis=1)
+    return np.where(total > 0, mapping.value(np.minimum(index, counts.shape[1] - 1)), np.nan)
+
+
+class DDSketch:
+    """Sketch de quantiles fusionnable (compteurs denses sur une ``LogMapping``)."""
+
+    def __init__(self, mapping: Optional[LogMapping] = None, counts: Any = None) -> None:
+        if np is None:
+            raise RuntimeError("centiles en flux indisponibles (numpy manquant)")
+        self.mapping = mapping or LogMapping()
+        self.counts = np.zeros(self.mapping.size, dtype=np.uint32) if counts is None \
+            else np.array(counts, dtype=np.uint32)
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum(dtype=np.int64))
+
+    def add(self, values: Any) -> None:
+        """Ajoute une valeur ou un tableau de valeurs (NaN ignoré)."""
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        values = values[~np.isnan(values)]
+        self.counts += np.bincount(self.mapping.index(values), minlength=self.mapping.size).astype(np.uint32)
+
+    def merge(self, other: 'DDSketch') -> 'DDSketch':
+        """Ajoute les compteurs d'un autre sketch (même paramétrage) et retourne ``self``."""
+        if other.mapping != self.mapping:
+            raise ValueError('sketches de paramétrages différents')
+        self.counts += other.counts
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Centile ``q`` (0..100), None si le sketch est vide."""
+        value = float(_quantiles(self.counts, self.mapping, q)[0])
+        return None if math.isnan(value) else value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Forme sérialisable (JSON): paramètres et compteurs non nuls."""
+        nonzero = np.flatnonzero(self.counts)
+        return {**self.mapping.params(), 'bins': dict(zip(map(str, nonzero.tolist()), self.counts[nonzero].tolist()))}
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> 'DDSketch':
+        sketch = cls(LogMapping(data['relative_accuracy'], data['min_value'], data['max_value']))
+        for index, count in data.get('bins', {}).items():
+            sketch.counts[int(index)] = count
+        return sketch
+
+
+class SketchBank:
+    """Sketches par série et par fenêtre, alimentés par lots (un cycle de collecte)."""
+
+    def __init__(self, window: str = DEFAULT_WINDOW, mapping: Optional[LogMapping] = None,
+                 retention: int = DEFAULT_WINDOW_RETENTION, capacity: int = 1024) -> None:
+        if np is None:
+            raise RuntimeError("centiles en flux indisponibles (numpy manquant)")
+        if window not in WINDOW_FORMATS:
+            raise ValueError(f'fenêtre inconnue: {window}')
+        self.window = window
+        self.mapping = mapping or LogMapping()
+        self.retention = retention
+        self._capacity = capacity
+        self._lock = threading.RLock()
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: List[Hashable] = []
+        self._windows: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def keys(self) -> List[Hashable]:
+        return list(self._keys)
+
+    def windows(self) -> List[str]:
+        """Fenêtres présentes, de la plus ancienne à la plus récente."""
+        return sorted(self._windows)
+
+    def _counts(self, window: str) -> Any:
+        counts = self._windows.get(window)
+        if counts is None:
+            counts = self._windows[window] = np.zeros((self._capacity, self.mapping.size), dtype=np.uint32)
+            for old in sorted(self._windows)[:-self.retention]:
+                del self._windows[old]
+        return counts
+
+    def _rows(self, keys: Sequence[Hashable]) -> Any:
+        rows = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            row = self._slots.get(key)
+            if row is None:
+                row = self._slots[key] = len(self._keys)
+                self._keys.append(key)
+            rows[i] = row
+        if len(self._keys) > self._capacity:
+            self._capacity = max(len(self._keys), self._capacity * 2)
+            for window, counts in self._windows.items():
+                grown = np.zeros((self._capacity, self.mapping.size), dtype=np.uint32)
+                grown[:len(counts)] = counts
+                self._windows[window] = grown
+        return rows
+
+    def add_batch(self, keys: Sequence[Hashable], values: Any, timestamp: Optional[float] = None) -> int:
+        """
+        Ajoute une valeur par série (clés distinctes) dans la fenêtre de ``timestamp``.
+        Returns:
+            int: nombre de valeurs retenues (NaN ignoré).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        window = window_id(time.time() if timestamp is None else timestamp, self.window)
+        with self._lock:
+            rows = self._rows(keys)
+            keep = ~np.isnan(values)
+            counts = self._counts(window)
+            counts[rows[keep], self.mapping.index(values[keep])] += 1
+            return int(keep.sum())
+
+    def add_series(self, key: Hashable, values: Any, timestamps: Any) -> int:
+        """
+        Ajoute plusieurs valeurs d'une même série, chacune dans la fenêtre de son horodatage
+        (relecture d'un historique). Les fenêtres déjà abandonnées (``retention``) sont ignorées.
+        Returns:
+            int: nombre de valeurs retenues (NaN ignoré).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        stamps = np.asarray(timestamps, dtype=np.float64)
+        keep = ~np.isnan(values)
+        values, stamps = values[keep], stamps[keep]
+        if not len(values):
+            return 0
+        # Fenêtres calendaires: un identifiant par jour suffit à les distinguer
+        days, day_of = np.unique(np.floor(stamps / 86400.0), return_inverse=True)
+        windows = np.array([window_id(day * 86400.0, self.window) for day in days.tolist()])[day_of]
+        added = 0
+        with self._lock:
+            row = self._rows([key])[0]
+            for window in sorted(set(windows.tolist())):
+                if self._windows and window < min(self._windows) and len(self._windows) >= self.retention:
+                    continue
+                selected = windows == window
+                np.add.at(self._counts(window)[row], self.mapping.index(values[selected]), 1)
+                added += int(selected.sum())
+        return added
+
+    def add_rates(self, batch: Any, timestamp: Optional[float] = None) -> int:
+        """Ajoute l'utilisation (%) d'un ``RateBatch`` de ``CounterRateEngine``."""
+        return self.add_batch(batch.keys, batch.utilization, timestamp)
+
+    def _window(self, window: Optional[str]) -> Optional[str]:
+        if window is None:
+            return max(self._windows) if self._windows else None
+        return window
+
+    def sketch(self, key: Hashable, window: Optional[str] = None) -> Optional[DDSketch]:
+        """Copie du sketch d'une série pour une fenêtre (la plus récente par défaut); None si absent."""
+        with self._lock:
+            window = self._window(window)
+            row = self._slots.get(key)
+            if window not in self._windows or row is None:
+                return None
+            return DDSketch(self.mapping, self._windows[window][row])
+
+    def quantile(self, key: Hashable, q: float, window: Optional[str] = None) -> Optional[float]:
+        sketch = self.sketch(key, window)
+        return sketch.quantile(q) if sketch is not None else None
+
+    def quantiles(self, q: float, window: Optional[str] = None,
+                  keys: Optional[Iterable[Hashable]] = None) -> Dict[Hashable, float]:
+        """Centile ``q`` de chaque série (toutes par défaut) ayant des valeurs dans la fenêtre."""
+        with self._lock:
+            window = self._window(window)
+            if window not in self._windows:
+                return {}
+            selected = list(self._keys) if keys is None else [k for k in keys if k in self._slots]
+            rows = np.fromiter((self._slots[k] for k in selected), dtype=np.intp, count=len(selected))
+            values = _quantiles(self._windows[window][rows], self.mapping, q)
+        return {key: float(v) for key, v in zip(selected, values.tolist()) if not math.isnan(v)}
+
+    def group_quantiles(self, group_of: Callable[[Hashable], Optional[Hashable]], qs: Sequence[float] = (95, 99),
+                        window: Optional[str] = None) -> Dict[Hashable, Dict[str, Any]]:
+        """
+        Centiles par groupe (site, domaine, équipement...) à partir des sketches fusionnés.
+
+        Args:
+            group_of: groupe d'une clé de série (None: série ignorée).
+            qs: centiles demandés (0..100).
+        Returns:
+            dict: par groupe, ``p95``/``p99``... et ``samples``.
+        """
+        with self._lock:
+            window = self._window(window)
+            if window not in self._windows:
+                return {}
+            groups: Dict[Hashable, int] = {}
+            rows, members = [], []
+            for key, row in self._slots.items():
+                group = group_of(key)
+                if group is None:
+                    continue
+                rows.append(row)
+                members.append(groups.setdefault(group, len(groups)))
+            merged = np.zeros((len(groups), self.mapping.size), dtype=np.int64)
+            np.add.at(merged, np.asarray(members, dtype=np.intp), self._windows[window][np.asarray(rows, dtype=np.intp)])
+        result = {group: {'samples': int(n)} for group, n in zip(groups, merged.sum(axis=1).tolist())}
+        for q in qs:
+            for group, value in zip(groups, _quantiles(merged, self.mapping, q).tolist()):
+                result[group][f'p{q:g}'] = None if math.isnan(value) else value
+        return {group: stats for group, stats in result.items() if stats['samples']}
@@ -0,0 +1,324 @@
+"""
+Stockage en mémoire de l'historique des métriques d'interface (anneaux préalloués).
+
+Chaque série (clé quelconque, par exemple ``(equipment_id, ifIndex)``
+de ``CounterRateEngine``) occupe une ligne de tableaux NumPy de taille
+fixe, partagés par toutes les séries:
+
+- ``raw``: les derniers échantillons bruts (horodatage, valeur);
+- ``5m``, ``1h``, ``1d``: agrégats min/avg/max/p95 par période, calculés
+  automatiquement à la clôture de chaque période.
+
+Les agrégats 5 minutes viennent des échantillons bruts. Les agrégats
+horaires et journaliers viennent des agrégats 5 minutes: min des min, max
+des max, moyenne pondérée par le nombre d'échantillons, et p95 des
+moyennes 5 minutes (95e centile usuel en facturation de capacité). Le
+niveau ``5m`` doit donc couvrir au moins une journée.
+
+Une période n'apparaît qu'une fois close (premier échantillon de la
+période suivante). La mémoire ne dépend que du nombre de séries et des
+rétentions (``memory_bytes()``), pas de la durée d'exploitation: avec les
+rétentions par défaut (1 jour en 5 min, 7 jours en horaire, 1 an en
+journalier), environ 20 Ko par série.
+"""
+from __future__ import annotations
+
+import threading
+import warnings
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except Exception:  # keep offline even if numpy missing
+    np = None
+
+# Niveaux d'agrégation (nom, durée d'une période en secondes), du plus fin au plus large
+TIERS: Tuple[Tuple[str, int], ...] = (('5m', 300), ('1h', 3600), ('1d', 86400))
+# Nombre de périodes conservées par niveau
+DEFAULT_RETENTION: Dict[str, int] = {'5m': 288, '1h': 168, '1d': 366}
+# Échantillons bruts conservés par série (doit couvrir une période 5 minutes)
+DEFAULT_RAW_SLOTS = 32
+STATS = ('min', 'avg', 'max', 'p95')
+PERCENTILE = 95
+# Lignes traitées à la fois lors de la clôture d'une période large
+CLOSE_CHUNK_ROWS = 8192
+
+
+class _Tier:
+    """Anneau d'agrégats d'un niveau: une ligne par série, un emplacement par période modulo la rétention."""
+
+    def __init__(self, name: str, step: int, slots: int, capacity: int) -> None:
+        self.name, self.step, self.slots = name, step, slots
+        self.bucket = np.full((capacity, slots), -1, dtype=np.int32)  # numéro absolu de la période
+        self.stats = np.full((capacity, slots, len(STATS)), np.nan, dtype=np.float32)
+        self.count = np.zeros((capacity, slots), dtype=np.uint32)
+        self.open = np.full(capacity, -1, dtype=np.int64)  # période en cours de remplissage
+
+    def grow(self, capacity: int) -> None:
+        extra = capacity - len(self.open)
+        self.bucket = np.concatenate([self.bucket, np.full((extra, self.slots), -1, dtype=np.int32)])
+        self.stats = np.concatenate([self.stats, np.full((extra, self.slots, len(STATS)), np.nan, dtype=np.float32)])
+        self.count = np.concatenate([self.count, np.zeros((extra, self.slots), dtype=np.uint32)])
+        self.open = np.concatenate([self.open, np.full(extra, -1, dtype=np.int64)])
+
+    def write(self, rows: Any, buckets: Any, stats: Any, counts: Any) -> None:
+        slot = buckets % self.slots
+        self.bucket[rows, slot] = buckets
+        self.stats[rows, slot] = stats
+        self.count[rows, slot] = counts
+
+    def nbytes(self) -> int:
+        return self.bucket.nbytes + self.stats.nbytes + self.count.nbytes + self.open.nbytes
+
+
+def nan_percentile(values: Any, q: float) -> Any:
+    """
+    Centile ``q`` de chaque ligne d'un tableau 2-D en ignorant NaN (interpolation linéaire,
+    comme ``np.nanpercentile``, mais en un seul tri au lieu d'une boucle par ligne).
+    """
+    ordered = np.sort(values, axis=1)  # NaN en fin de ligne
+    valid = (~np.isnan(ordered)).sum(axis=1)
+    position = np.maximum(valid - 1, 0) * (q / 100.0)
+    lower = np.floor(position).astype(np.intp)
+    upper = np.minimum(lower + 1, np.maximum(valid - 1, 0))
+    low = np.take_along_axis(ordered, lower[:, None], axis=1)[:, 0]
+    high = np.take_along_axis(ordered, upper[:, None], axis=1)[:, 0]
+    result = low + (high - low) * (position - lower)
+    return np.where(valid > 0, result, np.nan)
+
+
+def _reduce(values: Any, weights: Any) -> Tuple[Any, Any]:
+    """min/avg/max/p95 par ligne d'un tableau 2-D (NaN = absent); avg pondéré par ``weights``."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        count = weights.sum(axis=1)
+        total = np.nansum(values * weights, axis=1)
+        stats = np.stack([np.nanmin(values, axis=1), total / count, np.nanmax(values, axis=1),
+                          nan_percentile(values, PERCENTILE)], axis=1)
+    return stats, count
+
+
+class TimeSeriesStore:
+    """Historique borné par série: échantillons bruts récents et agrégats 5 min / horaire / journalier."""
+
+    def __init__(self, capacity: int = 1024, retention: Optional[Mapping[str, int]] = None,
+                 raw_slots: int = DEFAULT_RAW_SLOTS) -> None:
+        if np is None:
+            raise RuntimeError("historique des métriques indisponible (numpy manquant)")
+        retention = {**DEFAULT_RETENTION, **(retention or {})}
+        base_name, base_step = TIERS[0]
+        if retention[base_name] < TIERS[-1][1] // base_step:
+            raise ValueError(f"la rétention {base_name} doit couvrir une période {TIERS[-1][0]}")
+        self._lock = threading.RLock()
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: List[Hashable] = []
+        self.raw_slots = raw_slots
+        self._raw_time = np.full((capacity, raw_slots), np.nan)
+        self._raw_value = np.full((capacity, raw_slots), np.nan, dtype=np.float32)
+        self._raw_head = np.zeros(capacity, dtype=np.int64)  # nombre total d'échantillons reçus
+        self._last = np.full(capacity, -np.inf)
+        self.tiers: Dict[str, _Tier] = {name: _Tier(name, step, retention[name], capacity) for name, step in TIERS}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._keys)
+
+    def memory_bytes(self) -> int:
+        """Mémoire occupée par les tableaux (préallouée, indépendante de l'historique reçu)."""
+        raw = self._raw_time.nbytes + self._raw_value.nbytes + self._raw_head.nbytes + self._last.nbytes
+        return raw + sum(tier.nbytes() for tier in self.tiers.values())
+
+    # --- Écriture -------------------------------------------------------------
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._last)
+        if needed <= capacity:
+            return
+        size = max(needed, capacity * 2)
+        extra = size - capacity
+        self._raw_time = np.concatenate([self._raw_time, np.full((extra, self.raw_slots), np.nan)])
+        self._raw_value = np.concatenate([self._raw_value, np.full((extra, self.raw_slots), np.nan, dtype=np.float32)])
+        self._raw_head = np.concatenate([self._raw_head, np.zeros(extra, dtype=np.int64)])
+        self._last = np.concatenate([self._last, np.full(extra, -np.inf)])
+        for tier in self.tiers.values():
+            tier.grow(size)
+
+    def _rows(self, keys: Sequence[Hashable]) -> Any:
+        rows = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            row = self._slots.get(key)
+            if row is None:
+                row = self._slots[key] = len(self._keys)
+                self._keys.append(key)
+            rows[i] = row
+        self._grow(len(self._keys))
+        return rows
+
+    def append(self, key: Hashable, value: float, timestamp: float) -> None:
+        """Ajoute un échantillon à une série."""
+        self.append_batch([key], [value], timestamp)
+
+    def append_batch(self, keys: Sequence[Hashable], values: Any, timestamp: Any) -> int:
+        """
+        Ajoute un échantillon à chacune des séries ``keys`` (clés distinctes).
+
+        Args:
+            keys: clés des séries (créées au premier échantillon).
+            values: valeurs alignées sur ``keys``; NaN ignoré.
+            timestamp: horodatage commun (s) ou tableau aligné sur ``keys``.
+        Returns:
+            int: nombre d'échantillons retenus (hors NaN et horodatages non croissants).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        stamps = np.broadcast_to(np.asarray(timestamp, dtype=np.float64), values.shape)
+        with self._lock:
+            rows = self._rows(keys)
+            keep = ~np.isnan(values) & (stamps > self._last[rows])
+            rows, values, stamps = rows[keep], values[keep], stamps[keep]
+            if not len(rows):
+                return 0
+            self._close(rows, stamps)
+            slot = self._raw_head[rows] % self.raw_slots
+            self._raw_time[rows, slot] = stamps
+            self._raw_value[rows, slot] = values
+            self._raw_head[rows] += 1
+            self._last[rows] = stamps
+            return int(len(rows))
+
+    def append_rates(self, batch: Any, timestamp: float) -> int:
+        """Ajoute l'utilisation (%) d'un ``RateBatch`` de ``CounterRateEngine``."""
+        return self.append_batch(batch.keys, batch.utilization, timestamp)
+
+    def _close(self, rows: Any, stamps: Any) -> None:
+        """Clôt les périodes que les nouveaux échantillons dépassent, du niveau le plus fin au plus large."""
+        base = self.tiers[TIERS[0][0]]
+        for name, step in TIERS:
+            tier = self.tiers[name]
+            bucket = np.floor(stamps / step).astype(np.int64)
+            previous = tier.open[rows]
+            closing = (previous >= 0) & (previous != bucket)
+            if closing.any():
+                closed_rows, closed = rows[closing], previous[closing]
+                if tier is base:
+                    stats, count = self._from_raw(closed_rows, closed, step)
+                else:
+                    stats, count = self._from_tier(base, closed_rows, closed, step // base.step)
+                filled = count > 0
+                tier.write(closed_rows[filled], closed[filled], stats[filled], count[filled])
+            tier.open[rows] = bucket
+
+    def _from_raw(self, rows: Any, buckets: Any, step: int) -> Tuple[Any, Any]:
+        times = self._raw_time[rows]
+        mask = np.floor(times / step) == buckets[:, None]
+        values = np.where(mask, self._raw_value[rows], np.nan)
+        return _reduce(values, mask.astype(np.float64))
+
+    def _from_tier(self, base: _Tier, rows: Any, buckets: Any, ratio: int) -> Tuple[Any, Any]:
+        # Seuls les emplacements des ``ratio`` périodes fines de chaque période close sont lus,
+        # par paquets de lignes pour borner la mémoire temporaire (clôture journalière).
+        stats = np.empty((len(rows), len(STATS)))
+        count = np.empty(len(rows))
+        offsets = np.arange(ratio)
+        for start in range(0, len(rows), CLOSE_CHUNK_ROWS):
+            chunk = slice(start, start + CLOSE_CHUNK_ROWS)
+            expected = buckets[chunk, None] * ratio + offsets
+            sub = rows[chunk, None]
+            slot = expected % base.slots
+            mask = base.bucket[sub, slot] == expected
+            source = base.stats[sub, slot]
+            weights = np.where(mask, base.count[sub, slot], 0).astype(np.float64)
+            agg, total = _reduce(np.where(mask, source[..., 1], np.nan), weights)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                agg[:, 0] = np.nanmin(np.where(mask, source[..., 0], np.nan), axis=1)
+                agg[:, 2] = np.nanmax(np.where(mask, source[..., 2], np.nan), axis=1)
+            stats[chunk], count[chunk] = agg, total
+        return stats, count
+
+    # --- Lecture --------------------------------------------------------------
+
+    def raw(self, key: Hashable) -> Tuple[Any, Any]:
+        """Échantillons bruts conservés d'une série: (horodatages, valeurs), dans l'ordre chronologique."""
+        with self._lock:
+            row = self._slots.get(key)
+            if row is None:
+                return np.empty(0), np.empty(0, dtype=np.float32)
+            present = ~np.isnan(self._raw_time[row])
+            times, values = self._raw_time[row][present], self._raw_value[row][present]
+            order = np.argsort(times)
+            return times[order], values[order]
+
+    def series(self, key: Hashable, tier: str = '5m', start: Optional[float] = None,
+               end: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Agrégats clos d'une série sur un niveau.
+
+        Args:
+            key: clé de la série.
+            tier: ``5m``, ``1h`` ou ``1d``.
+            start, end: bornes (s) sur le début de période, incluses.
+        Returns:
+            dict: ``time`` (début de période, s), ``min``, ``avg``, ``max``, ``p95``,
+            ``count`` — tableaux alignés, dans l'ordre chronologique.
+        """
+        level = self.tiers[tier]
+        with self._lock:
+            row = self._slots.get(key)
+            if row is None:
+                buckets = np.empty(0, dtype=np.int64)
+                stats = np.empty((0, len(STATS)), dtype=np.float32)
+                counts = np.empty(0, dtype=np.uint32)
+            else:
+                buckets = level.bucket[row].astype(np.int64)
+                stats, counts = level.stats[row], level.count[row]
+            times = buckets * level.step
+            keep = buckets >= 0
+            if start is not None:
+                keep &= times >= start
+            if end is not None:
+                keep &= times <= end
+            order = np.argsort(times[keep])
+            result = {'time': times[keep][order].astype(np.float64)}
+            for i, name in enumerate(STATS):
+                result[name] = stats[keep][order, i].astype(np.float64)
+            result['count'] = counts[keep][order].astype(np.int64)
+            return result
+
+    def last_closed(self, tier: str = '5m', min_periods: int = 1) -> Dict[Hashable, float]:
+        """Début (s) de la dernière période close de chaque série ayant au moins ``min_periods`` périodes closes."""
+        level = self.tiers[tier]
+        with self._lock:
+            buckets = level.bucket[:len(self._keys)]
+            keep = np.flatnonzero((buckets >= 0).sum(axis=1) >= max(min_periods, 1))
+            last = buckets[keep].max(axis=1).astype(np.float64) * level.step
+            return {self._keys[row]: t for row, t in zip(keep.tolist(), last.tolist())}
+
+    def series_rows(self, key: Hashable, tier: str = '5m', start: Optional[float] = None,
+                    end: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Agrégats d'une série en lignes sérialisables (pour les pages et exports)."""
+        data = self.series(key, tier, start, end)
+        columns = ('time', *STATS, 'count')
+        return [dict(zip(columns, values)) for values in zip(*(data[c].tolist() for c in columns))]
+
+    def forget(self, keys: Iterable[Hashable]) -> None:
+        """Efface l'historique des séries données (les emplacements restent réservés)."""
+        with self._lock:
+            for key in keys:
+                row = self._slots.get(key)
+                if row is None:
+                    continue
+                self._raw_time[row] = np.nan
+                self._raw_value[row] = np.nan
+                self._raw_head[row] = 0
+                self._last[row] = -np.inf
+                for tier in self.tiers.values():
+                    tier.bucket[row] = -1
+                    tier.stats[row] = np.nan
+                    tier.count[row] = 0
+                    tier.open[row] = -1
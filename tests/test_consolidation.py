@@ -0,0 +1,81 @@
+import csv
+import io
+import os
+import tempfile
+import unittest
+
+from app import app
+from app.inventory import store
+from app.inventory.consolidation import build_port_index, consolidate_inventory
+from app.inventory.interface_store import apply_interface_mutations
+from app.inventory.rollups import get_rollups
+
+GBPS = 10 ** 9
+
+
+class TestConsolidation(unittest.TestCase):
+    EQUIPMENT = [{'id': 1, 'name': 'ASR-DLA-01'}, {'id': 2, 'name': 'EX-YDE-02'}, {'id': 3, 'name': 'FW-03'}]
+    INTERFACES = [
+        {'equipment_id': 1, 'ifIndex': 1, 'speed': 10 * GBPS, 'status': 'up'},
+        {'equipment_id': 1, 'ifIndex': 2, 'speed': 10 * GBPS, 'status': 'down'},
+        {'equipment_id': '2', 'ifIndex': 1, 'speed': GBPS, 'status': 'Active'},  # ID lu depuis Excel
+        {'equipment_id': 9, 'ifIndex': 1, 'speed': GBPS, 'status': 'up'},
+    ]
+
+    def test_hash_join(self):
+        usage = {(1, 1): 6 * GBPS, (1, 2): 1 * GBPS, (2, 1): 0.25 * GBPS}
+        rows = list(consolidate_inventory(self.EQUIPMENT, self.INTERFACES, usage, orphans=True))
+        self.assertEqual([r['id'] for r in rows], [1, 2, 3, 9])
+        asr, ex, fw, orphan = rows
+        self.assertEqual((asr['name'], asr['ports'], asr['active_ports'], asr['inactive_ports']),
+                         ('ASR-DLA-01', 2, 1, 1))
+        self.assertEqual((asr['capacity_bps'], asr['used_bps']), (20.0 * GBPS, 7.0 * GBPS))
+        self.assertEqual((asr['utilization'], asr['peak_utilization']), (35.0, 60.0))
+        self.assertEqual((ex['ports'], ex['active_ports'], ex['utilization']), (1, 1, 25.0))
+        self.assertEqual((fw['ports'], fw['utilization'], fw['peak_utilization']), (0, None, None))
+        self.assertTrue(orphan['orphan'])
+        self.assertEqual(len(list(consolidate_inventory(self.EQUIPMENT, self.INTERFACES, {}))), 3)
+        self.assertEqual(set(build_port_index(self.INTERFACES)), {1, 2, 9})
+
+    def test_rows_are_streamed(self):
+        seen = []
+
+        def equipment():
+            for item in self.EQUIPMENT:
+                seen.append(item['id'])
+                yield item
+        rows = consolidate_inventory(equipment(), self.INTERFACES, {})
+        self.assertEqual(seen, [])
+        self.assertEqual(next(rows)['id'], 1)
+        self.assertEqual(seen, [1])
+
+
+class TestConsolidationStores(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ['IPCM_INVENTORY_PATH'] = os.path.join(self.tmpdir.name, 'inv.json')
+        os.environ['IPCM_INTERFACES_PATH'] = os.path.join(self.tmpdir.name, 'interfaces.json')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        os.environ.pop('IPCM_INVENTORY_PATH', None)
+        os.environ.pop('IPCM_INTERFACES_PATH', None)
+
+    def test_default_sources_and_csv_export(self):
+        equip_id = store.add_equipment({'name': 'ASR-DLA-01', 'location': 'Douala'})['id']
+        apply_interface_mutations([{'op': 'add', 'data': {'equipment_id': equip_id, 'ifIndex': i,
+                                                          'speed': GBPS, 'status': 'up'}} for i in (1, 2)])
+        get_rollups().record_usage([(equip_id, 1)], [0.5 * GBPS])
+        row, = consolidate_inventory()
+        self.assertEqual((row['ports'], row['used_bps'], row['utilization']), (2, 0.5 * GBPS, 25.0))
+        resp = self.client.get('/inventory/consolidated.csv?columns=id,name')
+        self.assertEqual(resp.status_code, 200)
+        lines = list(csv.reader(io.StringIO(resp.get_data(as_text=True))))
+        self.assertEqual(lines[0][:4], ['id', 'name', 'ports', 'active_ports'])
+        self.assertEqual(lines[1][:4], [str(equip_id), 'ASR-DLA-01', '2', '2'])
+        self.assertEqual(self.client.get('/inventory/consolidated.csv?columns=secret').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
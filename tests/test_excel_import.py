@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+from app.inventory import excel_rows, store
+from app.inventory.import_excel import importer_equipements_depuis_excel
+from app.inventory.import_interfaces_excel import importer_interfaces_depuis_excel
+from app.inventory.interface_store import interfaces_for_equipment, load_interfaces
+
+try:
+    import openpyxl
+except Exception:
+    openpyxl = None
+
+
+@unittest.skipIf(openpyxl is None, 'openpyxl absent')
+class TestExcelImport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ['IPCM_INVENTORY_PATH'] = os.path.join(self.tmpdir.name, 'inv.json')
+        os.environ['IPCM_INTERFACES_PATH'] = os.path.join(self.tmpdir.name, 'interfaces.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        os.environ.pop('IPCM_INVENTORY_PATH', None)
+        os.environ.pop('IPCM_INTERFACES_PATH', None)
+
+    def _workbook(self, name, header, rows):
+        path = os.path.join(self.tmpdir.name, name)
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(header)
+        for row in rows:
+            ws.append(row)
+        wb.save(path)
+        return path
+
+    def test_import_equipements(self):
+        rows = [[f'EQ{i}', 'Switch', 'Cisco', '10.0.0.%d' % (i % 250)] for i in range(1, 2501)]
+        rows[9] = ['', 'Switch', 'Cisco', '10.0.0.1']
+        rows[19] = ['EQ20', 'Switch', 'Cisco', '10.0.0.999']
+        rows.append([None, None, None, None])
+        path = self._workbook('eq.xlsx', ['Nom', 'Type', 'Marque', 'IP'], rows)
+        calls = []
+        version = store.inventory_version()
+        report = importer_equipements_depuis_excel(path, batch_size=1000,
+                                                   progress=lambda n, total: calls.append((n, total)))
+        self.assertEqual(report['rows'], 2500)
+        self.assertEqual(report['imported'], 2498)
+        self.assertEqual(report['rejected'], 2)
+        self.assertEqual([e['row'] for e in report['errors']], [11, 21])
+        self.assertEqual([n for n, _ in calls], [1000, 2000, 2500])
+        self.assertEqual(len(store.load_inventory()), 2498)
+        self.assertEqual(store.query_inventory({'name': ['EQ1']})['items'][0]['ip_address'], '10.0.0.1')
+        # Application par lots de batch_size: une écriture par lot, jamais toute la feuille à la fois
+        self.assertEqual(store.inventory_version(), version + 3)
+
+    def test_run_import_applies_in_batches(self):
+        sizes = []
+
+        def apply(operations):
+            operations = list(operations)
+            sizes.append(len(operations))
+            return [{'ok': op['data']['n'] % 7 != 0, 'error': 'refusé'} for op in operations]
+
+        records = ((row, {'n': row}) for row in range(1, 2501))
+        report = excel_rows.run_import(records, dict, apply, batch_size=1000)
+        self.assertEqual(sizes, [1000, 1000, 500])
+        self.assertEqual((report['imported'], report['rejected']), (2500 - 357, 357))
+        self.assertEqual(report['errors'][0], {'row': 7, 'error': 'refusé'})
+
+    def test_headers_normalises(self):
+        path = self._workbook('eq.xlsx', [' MODELE ', 'nom', 'Version_Logiciel'], [['C9300', 'SW1', 17.0]])
+        report = importer_equipements_depuis_excel(path)
+        self.assertEqual(report['imported'], 1)
+        item = store.load_inventory()[0]
+        self.assertEqual((item['name'], item['model'], item['software_version']), ('SW1', 'C9300', '17'))
+
+    def test_aucun_entete(self):
+        path = self._workbook('eq.xlsx', ['foo', 'bar'], [['a', 'b']])
+        with self.assertRaises(ValueError):
+            importer_equipements_depuis_excel(path)
+
+    def test_import_interfaces(self):
+        eq = store.add_equipment({'name': 'R1'})
+        path = self._workbook('if.xlsx',
+                              ['EquipmentID', 'InterfaceName', 'ifIndex', 'Speed', 'Status', 'InOctets'],
+                              [[eq['id'], 'Gi0/1', 1, 1000, 'up', 42],
+                               [eq['id'], 'Gi0/2', 2, 1000, 'down', None],
+                               [999, 'Gi0/3', 3, 1000, 'up', 0],
+                               [eq['id'], 'Gi0/4', 'x', 1000, 'up', 0],
+                               [eq['id'], 'Gi0/5', 5, -1, 'up', 0],
+                               [eq['id'], 'Gi0/6', 1.5, 1000, 'up', 0]])
+        report = importer_interfaces_depuis_excel(path)
+        self.assertEqual((report['imported'], report['rejected']), (2, 4))
+        self.assertIn("'1.5'", report['errors'][-1]['error'])
+        self.assertIn('inconnu', report['errors'][0]['error'])
+        self.assertEqual(len(load_interfaces()), 2)
+        ports = interfaces_for_equipment(eq['id'])
+        self.assertEqual(sorted(p['name'] for p in ports), ['Gi0/1', 'Gi0/2'])
+        self.assertEqual(ports[0]['in_octets'] + ports[1]['in_octets'], 42)
+
+    def test_normalize_header(self):
+        self.assertEqual(excel_rows.normalize_header('  Modèle  Logiciel '), 'modele logiciel')
+
+    def test_cell_int(self):
+        self.assertEqual((excel_rows.cell_int(12.0, 'x'), excel_rows.cell_int('7', 'x')), (12, 7))
+        self.assertIsNone(excel_rows.cell_int('', 'x'))
+        for value in ('1.5', 2.25, 'abc', 'inf'):
+            with self.assertRaises(ValueError):
+                excel_rows.cell_int(value, 'x')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+import unittest
+from app import app
+from app.inventory import store
+
+
+class TestInventoryApi(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ['IPCM_INVENTORY_PATH'] = os.path.join(self.tmpdir.name, 'inv.json')
+        for i in range(12):
+            store.add_equipment({'name': f'EQ{i:02d}', 'type': 'Routeur' if i % 2 else 'Switch',
+                                 'location': 'Douala' if i % 3 else 'Yaoundé'})
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        os.environ.pop('IPCM_INVENTORY_PATH', None)
+
+    def test_cursor_pagination_covers_everything_once(self):
+        seen, cursor = [], None
+        while True:
+            url = '/api/inventory?limit=5' + (f'&cursor={cursor}' if cursor else '')
+            data = json.loads(self.client.get(url).data)
+            self.assertEqual(data['total'], 12)
+            seen += [it['id'] for it in data['items']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, list(range(1, 13)))
+
+    def test_filter_sort_and_projection(self):
+        resp = self.client.get('/api/inventory?type=Routeur&location=Douala&sort=-name&fields=name')
+        data = json.loads(resp.data)
+        self.assertEqual(data['total'], 4)
+        self.assertEqual([it['name'] for it in data['items']], ['EQ11', 'EQ07', 'EQ05', 'EQ01'])
+        self.assertEqual(set(data['items'][0]), {'id', 'name'})
+
+    def test_indexes_follow_mutations(self):
+        store.update_equipment(1, {'type': 'Firewall'})
+        result = store.query_inventory({'type': ['Firewall']})
+        self.assertEqual([it['id'] for it in result['items']], [1])
+        store.delete_equipment(1)
+        self.assertEqual(store.query_inventory({'type': ['Firewall']})['total'], 0)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/inventory?sort=password').status_code, 400)
+        self.assertEqual(self.client.get('/api/inventory?cursor=%%%').status_code, 400)
+        self.assertEqual(self.client.get('/api/inventory?limit=0').status_code, 400)
+        # Valeur incompatible avec sa catégorie: numérique (0) texte, texte (1) numérique
+        for sort, key in (('id', [[0, 'x'], 1]), ('name', [[1, 5], 1]), ('name', [[2, 'x'], 1])):
+            url = f'/api/inventory?sort={sort}&cursor={store.encode_cursor(key)}'
+            self.assertEqual(self.client.get(url).status_code, 400, key)
+
+    def test_inventory_page_is_paginated(self):
+        resp = self.client.get('/inventory?limit=5')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b'Page suivante', resp.data)
+
+    def test_conditional_get(self):
+        for url in ('/inventory', '/api/inventory', '/inventory/export.csv', '/dashboard'):
+            first = self.client.get(url)
+            etag = first.headers['ETag']
+            self.assertIn('Last-Modified', first.headers)
+            again = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(again.status_code, 304, url)
+            self.assertEqual(again.data, b'')
+        store.add_equipment({'name': 'NEW'})
+        changed = self.client.get('/api/inventory', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+
+    def test_bulk_json_array(self):
+        ops = [{'op': 'add', 'data': {'name': 'NEW'}},
+               {'op': 'update', 'id': 2, 'changes': {'brand': 'Huawei'}},
+               {'op': 'delete', 'id': 3},
+               {'op': 'update', 'id': 999, 'changes': {}}]
+        resp = self.client.post('/inventory/bulk', json=ops)
+        data = json.loads(resp.data)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((data['applied'], data['failed']), (3, 1))
+        self.assertEqual(data['results'][0]['id'], 13)
+        self.assertEqual(store.query_inventory({'brand': ['Huawei']})['total'], 1)
+        self.assertEqual(store.query_inventory()['total'], 12)
+
+    def test_update_cannot_change_id(self):
+        results = store.apply_mutations([{'op': 'update', 'id': 1, 'changes': {'id': 2, 'name': 'X'}}])
+        self.assertFalse(results[0]['ok'])
+        self.assertIn('id', results[0]['error'])
+        self.assertEqual([it['name'] for it in store.load_inventory()[:2]], ['EQ00', 'EQ01'])
+        self.assertEqual(self.client.patch('/inventory/1', json={'id': 2}).status_code, 400)
+
+    def test_bulk_ndjson_reports_bad_lines(self):
+        body = '\n'.join([
+            json.dumps({'op': 'add', 'data': {'name': 'A'}}),
+            '{pas du json',
+            json.dumps({'op': 'delete', 'id': 'x'}),
+            json.dumps({'op': 'delete', 'id': 1}),
+        ])
+        resp = self.client.post('/inventory/bulk', data=body, content_type='application/x-ndjson')
+        results = json.loads(resp.data)['results']
+        self.assertEqual([r['ok'] for r in results], [True, False, False, True])
+        self.assertEqual([r['index'] for r in results], [0, 1, 2, 3])
+
+    def test_bulk_rejects_unreadable_body(self):
+        resp = self.client.post('/inventory/bulk', data='nope', content_type='text/plain')
+        self.assertEqual(resp.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
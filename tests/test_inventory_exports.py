@@ -1,19 +1,105 @@
+import csv
+import gzip
+import io
+import os
+import tempfile
 import unittest
+from unittest import mock
 from app import app
+from app.inventory import exports, store
 
 class TestInventoryExports(unittest.TestCase):
     def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ['IPCM_INVENTORY_PATH'] = os.path.join(self.tmpdir.name, 'inv.json')
+        store.save_inventory([{'id': i, 'name': f'EQ{i}', 'type': 'Switch'} for i in range(1, 1201)])
         self.client = app.test_client()
 
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        os.environ.pop('IPCM_INVENTORY_PATH', None)
+
     def test_export_csv(self):
         resp = self.client.get('/inventory/export.csv')
         self.assertEqual(resp.status_code, 200)
         self.assertIn('text/csv', resp.mimetype)
+        self.assertTrue(resp.is_streamed)
+        rows = list(csv.reader(io.StringIO(resp.get_data(as_text=True))))
+        self.assertEqual(len(rows), 1201)
+        self.assertEqual(rows[1][:3], ['1', 'EQ1', 'Switch'])
+
+    def test_export_csv_columns_and_gzip(self):
+        resp = self.client.get('/inventory/export.csv?columns=id,name', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.headers.get('Content-Encoding'), 'gzip')
+        text = gzip.decompress(resp.data).decode('utf-8')
+        rows = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(rows[0], ['id', 'name'])
+        self.assertEqual(rows[-1], ['1200', 'EQ1200'])
+        resp = self.client.get('/inventory/export.csv?columns=password')
+        self.assertEqual(resp.status_code, 400)
 
     def test_export_xlsx(self):
-        resp = self.client.get('/inventory/export.xlsx')
+        status, _ = self._get('/inventory/export.xlsx')
         # could be 200 if openpyxl installed, or 503 if not
-        self.assertIn(resp.status_code, (200, 503))
+        self.assertIn(status, (200, 503))
+
+    def _get(self, url):
+        with self.client.get(url) as resp:
+            return resp.status_code, resp.data
+
+    @unittest.skipIf(exports.openpyxl is None, 'openpyxl absent')
+    def test_export_xlsx_is_cached_per_version(self):
+        url = '/inventory/export.xlsx?columns=id,name'
+        first = self._get(url)[1]
+        cache_dir = exports.export_cache_dir()
+        cached = os.listdir(cache_dir)
+        self.assertEqual(len(cached), 1)
+        with mock.patch.object(exports, 'build_xlsx', side_effect=AssertionError('régénéré')):
+            self.assertEqual(self._get(url)[1], first)
+        wb = exports.openpyxl.load_workbook(io.BytesIO(first), read_only=True)
+        rows = list(wb.active.iter_rows(values_only=True))
+        wb.close()
+        self.assertEqual(rows[0], ('id', 'name'))
+        self.assertEqual(rows[-1], (1200, 'EQ1200'))
+        # Une mutation change la clé: nouvel export, la version précédente reste servable
+        store.add_equipment({'name': 'NEW'})
+        self._get(url)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+        self.assertIn(cached[0], os.listdir(cache_dir))
+        # ... jusqu'à la mutation suivante
+        store.add_equipment({'name': 'NEWER'})
+        self._get(url)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+        self.assertNotIn(cached[0], os.listdir(cache_dir))
+
+    @unittest.skipIf(exports.openpyxl is None, 'openpyxl absent')
+    def test_export_rebuilt_when_cached_file_vanishes(self):
+        url = '/inventory/export.xlsx?columns=id,name'
+        self._get(url)
+        real_cached_xlsx, calls = exports.cached_xlsx, []
+
+        def vanishing(*args, **kwargs):
+            # Purge par une requête concurrente entre le calcul du chemin et son ouverture
+            calls.append(args)
+            path = real_cached_xlsx(*args, **kwargs)
+            if len(calls) == 1:
+                os.unlink(path)
+            return path
+
+        with mock.patch('app.routes.cached_xlsx', side_effect=vanishing):
+            status, data = self._get(url)
+        self.assertEqual((status, len(calls)), (200, 2))
+        wb = exports.openpyxl.load_workbook(io.BytesIO(data), read_only=True)
+        rows = list(wb.active.iter_rows(values_only=True))
+        wb.close()
+        self.assertEqual((len(rows), rows[-1]), (1201, (1200, 'EQ1200')))
+
+    @unittest.skipIf(exports.openpyxl is None, 'openpyxl absent')
+    def test_failed_cache_write_leaves_no_temp_file(self):
+        with mock.patch.object(exports.os, 'replace', side_effect=OSError('disque plein')):
+            status, _ = self._get('/inventory/export.xlsx?columns=id,name')
+        self.assertEqual(status, 200)
+        self.assertEqual(os.listdir(exports.export_cache_dir()), [])
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from app.inventory import store
+from app.inventory.sqlite_store import SqliteInventoryBackend
+
+
+class TestInventorySqlite(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'inv.db')
+        os.environ['IPCM_INVENTORY_PATH'] = self.db_path
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        os.environ.pop('IPCM_INVENTORY_PATH', None)
+        os.environ.pop('IPCM_INVENTORY_BACKEND', None)
+
+    def test_backend_selection(self):
+        self.assertIsInstance(store.get_backend(), SqliteInventoryBackend)
+        os.environ['IPCM_INVENTORY_PATH'] = os.path.join(self.tmpdir.name, 'inv.json')
+        self.assertIsInstance(store.get_backend(), store.JsonInventoryBackend)
+        os.environ['IPCM_INVENTORY_BACKEND'] = 'sqlite'
+        self.assertIsInstance(store.get_backend(), SqliteInventoryBackend)
+        os.environ['IPCM_INVENTORY_BACKEND'] = 'oracle'
+        with self.assertRaises(ValueError):
+            store.get_backend()
+
+    def test_crud(self):
+        self.assertEqual(store.load_inventory(), [])
+        a = store.add_equipment({'name': 'R1', 'type': 'Router', 'ports': 48})
+        ok = store.update_equipment(a['id'], {'brand': 'Cisco'})
+        self.assertTrue(ok)
+        self.assertEqual(store.load_inventory(),
+                         [{'id': a['id'], 'name': 'R1', 'type': 'Router', 'brand': 'Cisco', 'ports': 48}])
+        self.assertFalse(store.update_equipment(999, {'brand': 'x'}))
+        b = store.add_equipment({'name': 'R2'})
+        result = store.apply_mutations([{'op': 'update', 'id': a['id'], 'changes': {'id': b['id']}},
+                                        {'op': 'delete', 'id': b['id']}])
+        self.assertEqual([r['ok'] for r in result], [False, True])
+        self.assertTrue(store.delete_equipment(a['id']))
+        self.assertFalse(store.delete_equipment(a['id']))
+        self.assertEqual(store.load_inventory(), [])
+
+    def test_version_bumps_once_per_batch(self):
+        v0 = store.inventory_version()
+        store.apply_mutations([{'op': 'add', 'data': {'name': f'R{i}'}} for i in range(10)])
+        self.assertEqual(store.inventory_version(), v0 + 1)
+        store.delete_equipment(999)
+        self.assertEqual(store.inventory_version(), v0 + 1)
+
+    def test_wal_and_indexes(self):
+        store.add_equipment({'name': 'R1'})
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        indexes = {r[1] for r in conn.execute("PRAGMA index_list('equipment')")}
+        self.assertIn('idx_equipment_ip_address', indexes)
+        conn.close()
+
+    def test_query_matches_json_backend(self):
+        items = [{'id': i, 'name': f'EQ{i % 5}', 'type': 'Routeur' if i % 2 else 'Switch'}
+                 for i in range(1, 30)]
+        store.save_inventory(items)
+        json_backend = store.JsonInventoryBackend(os.path.join(self.tmpdir.name, 'inv.json'))
+        json_backend.replace_all(items)
+        for backend in (store.get_backend(), json_backend):
+            seen, cursor = [], None
+            while True:
+                page = backend.query({'type': ['Routeur']}, sort='name', descending=True,
+                                     cursor=cursor, limit=4, fields=['name'])
+                self.assertEqual(page['total'], 15)
+                seen += [it['id'] for it in page['items']]
+                cursor = page['next_cursor']
+                if not cursor:
+                    break
+            expected = sorted((it for it in items if it['type'] == 'Routeur'),
+                              key=lambda it: (it['name'], it['id']), reverse=True)
+            self.assertEqual(seen, [it['id'] for it in expected])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,19 @@
 import os
 import tempfile
 import json
+import multiprocessing
 import unittest
 from app.inventory import store
 
+
+def _add_many(path, count, journal):
+    """Écrivain concurrent (processus séparé)."""
+    os.environ['IPCM_INVENTORY_PATH'] = path
+    if journal:
+        os.environ['IPCM_INVENTORY_JOURNAL'] = '1'
+    for i in range(count):
+        store.add_equipment({'name': f'{os.getpid()}-{i}'})
+
 class TestInventoryStore(unittest.TestCase):
     def setUp(self):
         self.tmpdir = tempfile.TemporaryDirectory()
@@ -14,6 +24,8 @@ class TestInventoryStore(unittest.TestCase):
     def tearDown(self):
         self.tmpdir.cleanup()
         os.environ.pop('IPCM_INVENTORY_PATH', None)
+        os.environ.pop('IPCM_INVENTORY_JOURNAL', None)
+        os.environ.pop('IPCM_JOURNAL_COMPACT_THRESHOLD', None)
 
     def test_crud(self):
         items = store.load_inventory()
@@ -28,5 +40,117 @@ class TestInventoryStore(unittest.TestCase):
         self.assertTrue(ok)
         self.assertEqual(store.load_inventory(), [])
 
+    def test_cache_returns_copies(self):
+        store.add_equipment({'name': 'R1'})
+        items = store.load_inventory()
+        items[0]['name'] = 'altéré'
+        items.append({'id': 99})
+        self.assertEqual(store.load_inventory()[0]['name'], 'R1')
+        view = next(store.iter_inventory())
+        with self.assertRaises(TypeError):
+            view['name'] = 'altéré'
+
+    def test_cache_does_not_share_nested_values(self):
+        tags = ['core']
+        added = store.add_equipment({'name': 'R1', 'tags': tags, 'snmp': {'community': 'public'}})
+        tags.append('appelant')  # l'objet fourni à l'ajout n'est pas conservé tel quel
+        added['snmp']['community'] = 'résultat'
+        loaded = store.load_inventory()[0]
+        loaded['tags'].append('altéré')
+        loaded['snmp']['community'] = 'altéré'
+        next(store.iter_inventory())['tags'].append('altéré')
+        store.query_inventory()['items'][0]['snmp']['community'] = 'altéré'
+        store.query_inventory(fields=['tags'])['items'][0]['tags'].append('altéré')
+        item = store.load_inventory()[0]
+        self.assertEqual((item['tags'], item['snmp']), (['core'], {'community': 'public'}))
+
+    def test_cache_reloads_after_external_write(self):
+        store.add_equipment({'name': 'R1'})
+        self.assertEqual(len(store.load_inventory()), 1)
+        # Écriture par un autre processus: contenu et taille différents
+        with open(self.inv_path, 'w', encoding='utf-8') as f:
+            json.dump([{'id': 1, 'name': 'R1'}, {'id': 2, 'name': 'SW2'}], f)
+        names = [it['name'] for it in store.load_inventory()]
+        self.assertEqual(names, ['R1', 'SW2'])
+
+    def test_journal_mode_appends_and_replays(self):
+        os.environ['IPCM_INVENTORY_JOURNAL'] = '1'
+        a = store.add_equipment({'name': 'R1'})
+        b = store.add_equipment({'name': 'SW2'})
+        store.update_equipment(a['id'], {'brand': 'Cisco'})
+        store.delete_equipment(b['id'])
+        # L'instantané n'a pas été réécrit: tout est dans le journal
+        with open(self.inv_path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), [])
+        with open(self.inv_path + '.journal', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 4)
+        # Un autre processus (cache vide) reconstruit le même état
+        store.invalidate_cache()
+        self.assertEqual(store.load_inventory(), [{'name': 'R1', 'id': a['id'], 'brand': 'Cisco'}])
+        self.assertEqual(store.add_equipment({'name': 'FW3'})['id'], b['id'] + 1)
+
+    def test_journal_compaction(self):
+        os.environ['IPCM_INVENTORY_JOURNAL'] = '1'
+        os.environ['IPCM_JOURNAL_COMPACT_THRESHOLD'] = '3'
+        for i in range(3):
+            store.add_equipment({'name': f'R{i}'})
+        with open(self.inv_path, encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)), 3)
+        self.assertEqual(os.path.getsize(self.inv_path + '.journal'), 0)
+        store.update_equipment(1, {'brand': 'Juniper'})
+        store.invalidate_cache()
+        self.assertEqual(store.load_inventory()[0]['brand'], 'Juniper')
+
+    def test_journal_ignores_torn_last_line(self):
+        os.environ['IPCM_INVENTORY_JOURNAL'] = '1'
+        store.add_equipment({'name': 'R1'})
+        with open(self.inv_path + '.journal', 'a', encoding='utf-8') as f:
+            f.write('{"op":"add","item":{"id":2')
+        store.invalidate_cache()
+        self.assertEqual([it['id'] for it in store.load_inventory()], [1])
+
+    def test_apply_mutations_batch(self):
+        results = store.apply_mutations([
+            {'op': 'add', 'data': {'name': 'R1'}},
+            {'op': 'add', 'data': {'name': 'R2'}},
+            {'op': 'update', 'id': 1, 'changes': {'brand': 'Cisco'}},
+            {'op': 'delete', 'id': 2},
+            {'op': 'delete', 'id': 42},
+            {'op': 'rename'},
+        ])
+        self.assertEqual([r['ok'] for r in results], [True, True, True, True, False, False])
+        self.assertEqual(results[1]['item'], {'name': 'R2', 'id': 2})
+        self.assertIn('introuvable', results[4]['error'])
+        self.assertEqual(store.load_inventory(), [{'name': 'R1', 'id': 1, 'brand': 'Cisco'}])
+
+    def test_concurrent_writers_lose_nothing(self):
+        for journal in (False, True):
+            path = os.path.join(self.tmpdir.name, f'concurrent-{journal}.json')
+            procs = [multiprocessing.Process(target=_add_many, args=(path, 20, journal)) for _ in range(4)]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+            os.environ['IPCM_INVENTORY_PATH'] = path
+            ids = [it['id'] for it in store.load_inventory()]
+            self.assertEqual(sorted(ids), list(range(1, 81)))
+            # Aucun fichier temporaire laissé derrière
+            self.assertEqual([f for f in os.listdir(self.tmpdir.name) if f.endswith('.tmp')], [])
+
+    def test_version_is_monotonic_and_shared(self):
+        v0 = store.inventory_version()
+        store.add_equipment({'name': 'R1'})
+        v1 = store.inventory_version()
+        self.assertGreater(v1, v0)
+        store.update_equipment(999, {'name': 'absent'})
+        self.assertEqual(store.inventory_version(), v1)
+        # Autre processus (cache vide): même version lue depuis le disque
+        store.invalidate_cache()
+        self.assertEqual(store.inventory_version(), v1)
+        # Écriture externe au module: détectée et comptée
+        with open(self.inv_path, 'w', encoding='utf-8') as f:
+            json.dump([], f)
+        self.assertGreater(store.inventory_version(), v1)
+
 if __name__ == '__main__':
     unittest.main()
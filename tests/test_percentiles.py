@@ -0,0 +1,119 @@
+import csv
+import os
+import tempfile
+import unittest
+from app import app
+from app.inventory import store
+from app.reporting_trend import export_percentile_report, percentile_rows
+from app.snmp.poller import PollResult, PollTarget
+
+try:
+    import numpy as np
+    from app.timeseries import pipeline
+    from app.timeseries.sketch import DDSketch, LogMapping, SketchBank, window_id
+except Exception:
+    np = None
+
+OCT = 1792195200.0  # 2026-10-17 00:00 UTC
+NOV = 1793750400.0  # 2026-11-04 00:00 UTC
+
+
+@unittest.skipIf(np is None, 'numpy absent')
+class TestSketches(unittest.TestCase):
+    def test_relative_accuracy(self):
+        values = np.random.default_rng(7).gamma(2.0, 12.0, 50000)
+        sketch = DDSketch()
+        sketch.add(values)
+        self.assertEqual(sketch.count, 50000)
+        for q in (50, 95, 99):
+            exact = np.percentile(values, q, method='lower')
+            self.assertLessEqual(abs(sketch.quantile(q) - exact) / exact, 0.011)
+        self.assertIsNone(DDSketch().quantile(95))
+
+    def test_merge_and_serialization(self):
+        low, high = DDSketch(), DDSketch()
+        low.add(np.full(90, 10.0))
+        high.add(np.full(10, 80.0))
+        merged = DDSketch.from_dict(low.to_dict()).merge(high)
+        self.assertAlmostEqual(merged.quantile(50), 10.0, delta=0.1)
+        self.assertAlmostEqual(merged.quantile(95), 80.0, delta=0.8)
+        with self.assertRaises(ValueError):
+            low.merge(DDSketch(LogMapping(0.02)))
+        zero = DDSketch()
+        zero.add([0.0, 0.0, float('nan')])
+        self.assertEqual((zero.count, zero.quantile(99)), (2, 0.0))
+
+    def test_bank_windows_and_groups(self):
+        bank = SketchBank(capacity=2)
+        keys = [(1, 1), (1, 2), (2, 1)]
+        for i in range(100):
+            bank.add_batch(keys, [i, 50.0, float('nan') if i % 2 else 5.0], OCT + 300 * i)
+        bank.add_batch(keys, [1.0, 1.0, 1.0], NOV)
+        self.assertEqual(bank.windows(), ['2026-10', '2026-11'])
+        self.assertEqual(window_id(OCT, 'day'), '2026-10-17')
+        october = bank.quantiles(95, '2026-10')
+        self.assertAlmostEqual(october[(1, 1)], 94, delta=1)
+        self.assertAlmostEqual(bank.quantile((1, 2), 99, '2026-10'), 50, delta=0.5)
+        self.assertEqual(bank.sketch((2, 1), '2026-10').count, 50)
+        self.assertAlmostEqual(bank.quantile((1, 1), 95), 1.0, delta=0.01)  # fenêtre la plus récente
+        groups = bank.group_quantiles(lambda key: key[0], window='2026-10')
+        self.assertEqual(groups[1]['samples'], 200)
+        self.assertAlmostEqual(groups[1]['p95'], 90, delta=1)  # 0..99 et cent fois 50
+        self.assertAlmostEqual(groups[2]['p99'], 5, delta=0.05)
+        bank.add_batch(keys, [1.0, 1.0, 1.0], NOV + 31 * 86400)
+        self.assertEqual(bank.windows(), ['2026-11', '2026-12'])
+
+
+@unittest.skipIf(np is None, 'numpy absent')
+class TestPercentileReports(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ['IPCM_INVENTORY_PATH'] = os.path.join(self.tmpdir.name, 'inv.json')
+        douala = store.add_equipment({'name': 'R1', 'location': 'Douala'})['id']
+        yaounde = store.add_equipment({'name': 'R2', 'location': 'Yaoundé'})['id']
+        self.pipeline = pipeline.MetricPipeline()
+        speed = 8000
+        for i in range(13):
+            results = [PollResult(PollTarget('10.0.0.1', equipment_id=douala), {'interfaces': [
+                {'equipment_id': douala, 'ifIndex': 1, 'speed': speed, 'in_octets': 900 * 60 * i, 'out_octets': 0}]}),
+                PollResult(PollTarget('10.0.0.2', equipment_id=yaounde), {'interfaces': [
+                    {'equipment_id': yaounde, 'ifIndex': 1, 'speed': speed, 'in_octets': 100 * 60 * i, 'out_octets': 0}]})]
+            self.pipeline.ingest(results, OCT + 60 * i)
+        self.previous, pipeline._PIPELINE = pipeline._PIPELINE, self.pipeline
+        self.client = app.test_client()
+
+    def tearDown(self):
+        pipeline._PIPELINE = self.previous
+        self.tmpdir.cleanup()
+        os.environ.pop('IPCM_INVENTORY_PATH', None)
+
+    def test_rows_by_site(self):
+        rows = percentile_rows(self.pipeline.sketches, 'site')
+        self.assertEqual([r['site'] for r in rows], ['Douala', 'Yaoundé'])
+        self.assertAlmostEqual(rows[0]['p95'], 90, delta=1)
+        self.assertEqual((rows[0]['window'], rows[0]['samples']), ('2026-10', 12))
+        self.assertEqual(len(self.pipeline.store.raw((1, 1))[0]), 12)
+        keys, slopes, intercepts = self.pipeline.forecasts.coeffs()
+        self.assertEqual((keys, list(slopes)), ([(1, 1), (2, 1)], [0.0, 0.0]))
+        self.assertAlmostEqual(intercepts[0], 90.0)
+        with self.assertRaises(ValueError):
+            percentile_rows(self.pipeline.sketches, 'rack')
+
+    def test_export_and_routes(self):
+        path = os.path.join(self.tmpdir.name, 'p95.csv')
+        export_percentile_report(self.pipeline.sketches, path, 'interface')
+        with open(path, encoding='utf-8') as f:
+            exported = list(csv.DictReader(f))
+        self.assertEqual([r['interface'] for r in exported], ['1/1', '2/1'])
+        data = self.client.get('/api/reporting/percentiles?by=equipment').get_json()
+        self.assertEqual((data['windows'], [r['equipment'] for r in data['rows']]), (['2026-10'], ['R1', 'R2']))
+        self.assertEqual(self.client.get('/api/reporting/percentiles?by=rack').status_code, 400)
+        page = self.client.get('/reporting').get_data(as_text=True)
+        self.assertIn('Douala', page)
+        resp = self.client.get('/reporting/percentiles.csv?by=site')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('Yaoundé', resp.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,27 @@
 """
 Module d'exemple de test d'analyse prédictive IPCM
 """
+import os
+import random
+import tempfile
 import unittest
-from app.predictive import predict_capacity
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from app import app
+from app import predictive
+from app.inventory import store
+from app.inventory.rollups import get_rollups
+from app.predictive import (
+    ForecastCache, OnlineLinearRegression, OnlineRegressionBank, _linear_regression_coeffs, batch_linear_regression_coeffs,
+    batch_predict_capacity, batch_saturation, pad_series, predict_capacity, predict_capacity_timed,
+    rank_saturation, saturation_dates,
+)
+from app.snmp.poller import PollResult, PollTarget
+
+try:
+    import numpy as np
+except Exception:
+    np = None
 
 class TestPredictive(unittest.TestCase):
     def test_predict_capacity(self):
@@ -10,5 +29,347 @@ class TestPredictive(unittest.TestCase):
         result = predict_capacity([])
         self.assertTrue(result is None)
 
+
+@unittest.skipIf(np is None, 'numpy absent')
+class TestBatchForecast(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(11)
+        # Longueurs inégales, dont les cas dégénérés (0 et 1 point)
+        self.series = [[], [42.0]] + [
+            [rng.uniform(0, 100) + rng.uniform(-2, 2) * i for i in range(rng.randint(2, 60))]
+            for _ in range(500)]
+
+    def test_coefficients_match_reference(self):
+        values, mask = pad_series(self.series)
+        slopes, intercepts = batch_linear_regression_coeffs(values, mask)
+        for i, series in enumerate(self.series):
+            m, b = _linear_regression_coeffs(series)
+            self.assertAlmostEqual(slopes[i], m, places=9)
+            self.assertAlmostEqual(intercepts[i], b, places=9)
+
+    def test_forecasts_match_reference(self):
+        values, mask = pad_series(self.series)
+        forecast = batch_predict_capacity(values, periods=6, mask=mask)
+        self.assertEqual(forecast.shape, (len(self.series), 6))
+        self.assertTrue(np.isnan(forecast[0]).all())
+        for i, series in enumerate(self.series[1:], start=1):
+            expected = predict_capacity([('', v) for v in series], periods=6)
+            np.testing.assert_allclose(forecast[i], expected, rtol=1e-9, atol=1e-9)
+
+    def test_gaps_use_column_positions(self):
+        row = np.array([[1.0, np.nan, 5.0, 7.0, np.nan]])
+        slopes, intercepts = batch_linear_regression_coeffs(row)
+        m, b = np.polyfit([0, 2, 3], [1, 5, 7], 1)
+        self.assertAlmostEqual(slopes[0], m)
+        self.assertAlmostEqual(intercepts[0], b)
+        np.testing.assert_allclose(batch_predict_capacity(row, periods=2)[0], [m * 4 + b, m * 5 + b])
+        with self.assertRaises(ValueError):
+            batch_linear_regression_coeffs(row, mask=np.ones((2, 5), dtype=bool))
+
+
+class TestOnlineRegression(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(5)
+        self.values = [10 + 0.5 * i + rng.uniform(-3, 3) for i in range(200)]
+
+    def test_matches_reference_after_each_sample(self):
+        online = OnlineLinearRegression()
+        for n, value in enumerate(self.values, start=1):
+            online.update(value)
+            if n in (1, 2, 3, 50, 200):
+                m, b = _linear_regression_coeffs(self.values[:n])
+                self.assertAlmostEqual(online.coeffs()[0], m, places=9)
+                self.assertAlmostEqual(online.coeffs()[1], b, places=7)
+        expected = predict_capacity([('', v) for v in self.values], periods=5)
+        for got, want in zip(online.predict(5), expected):
+            self.assertAlmostEqual(got, want, places=7)
+        self.assertEqual(OnlineLinearRegression().predict(), [])
+
+    def test_sliding_window_matches_reference_on_window(self):
+        online = OnlineLinearRegression(window=30)
+        for n, value in enumerate(self.values, start=1):
+            online.update(value)
+            if n in (10, 31, 75, 200):
+                window = self.values[max(0, n - 30):n]
+                expected = predict_capacity([('', v) for v in window], periods=3)
+                for got, want in zip(online.predict(3), expected):
+                    self.assertAlmostEqual(got, want, places=7)
+
+    def test_timestamps_and_forgetting(self):
+        # Abscisses horodatées (grandes valeurs) et oubli: moindres carrés pondérés de référence
+        xs = [1.79e9 + 300 * i for i in range(len(self.values))]
+        for options, weights in (
+                ({'forgetting': 0.97}, [0.97 ** (len(xs) - 1 - i) for i in range(len(xs))]),
+                ({'half_life': 3600.0}, [0.5 ** ((xs[-1] - x) / 3600.0) for x in xs])):
+            online = OnlineLinearRegression(**options)
+            for x, y in zip(xs, self.values):
+                online.update(y, x)
+            if np is None:
+                continue
+            m, b = np.polyfit(np.array(xs) - xs[0], self.values, 1, w=np.sqrt(weights))
+            self.assertAlmostEqual(online.coeffs()[0], m, places=9)
+            self.assertAlmostEqual(online.predict(1, step=300)[0], m * (xs[-1] + 300 - xs[0]) + b, places=6)
+
+    def test_options_are_validated(self):
+        for options in ({'forgetting': 0}, {'half_life': -1}, {'window': 1}, {'forgetting': 0.9, 'window': 10}):
+            with self.assertRaises(ValueError):
+                OnlineLinearRegression(**options)
+
+    @unittest.skipIf(np is None, 'numpy absent')
+    def test_bank_matches_single_series(self):
+        rng = random.Random(9)
+        for options in ({}, {'forgetting': 0.9}, {'half_life': 600.0}, {'window': 7}):
+            bank = OnlineRegressionBank(capacity=2, **options)
+            singles = {key: OnlineLinearRegression(**options) for key in 'abcde'}
+            for step in range(40):
+                keys = [k for k in 'abcde' if rng.random() < 0.8]
+                values = [rng.uniform(0, 100) if rng.random() < 0.9 else float('nan') for _ in keys]
+                t = 1.79e9 + 60 * step
+                bank.update(keys, values, t)
+                for key, value in zip(keys, values):
+                    if value == value:
+                        singles[key].update(value, t)
+            keys, forecast = bank.predict(periods=3, step=60)
+            self.assertEqual(sorted(keys), sorted(k for k in singles if singles[k].count))
+            for key, row in zip(keys, forecast):
+                np.testing.assert_allclose(row, singles[key].predict(3, step=60), rtol=1e-6, atol=1e-6)
+        bank = OnlineRegressionBank()
+        bank.update(['a', 'b'], [1.0, 2.0])
+        bank.update(['a', 'b'], [3.0, 2.0])
+        keys, slopes, intercepts = bank.coeffs()
+        self.assertEqual((keys, list(slopes), list(intercepts)), (['a', 'b'], [2.0, 0.0], [1.0, 2.0]))
+        bank.forget(['a'])
+        self.assertEqual(list(bank.coeffs(['a'])[2]), [0.0])
+
+
+
+class TestTimedForecast(unittest.TestCase):
+    START = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+    def test_irregular_samples_use_real_dates(self):
+        # 1 %/jour avec des relevés manqués: l'ordre seul fausserait la pente
+        days = [0, 1, 2, 7, 8, 20]
+        data = [((self.START + timedelta(days=d)).isoformat(), 40.0 + d) for d in days]
+        forecast = predict_capacity_timed(data, periods=2, step=86400)
+        self.assertEqual(forecast[0][0], '2026-10-22T00:00:00+00:00')
+        self.assertAlmostEqual(forecast[0][1], 61.0)
+        self.assertAlmostEqual(forecast[1][1], 62.0)
+        self.assertNotAlmostEqual(predict_capacity(data, periods=1)[0], 61.0, places=1)
+        self.assertIsNone(predict_capacity_timed([]))
+        dates = saturation_dates(data)
+        self.assertEqual((dates[80.0], dates[100.0]), ('2026-11-10T00:00:00+00:00', '2026-11-30T00:00:00+00:00'))
+        falling = [(self.START, 90.0), (self.START + timedelta(days=1), 85.0)]
+        self.assertEqual(saturation_dates(falling), {80.0: '2026-10-02T00:00:00+00:00', 100.0: None})
+        with self.assertRaises(ValueError):
+            saturation_dates([('demain', 1.0)])
+
+    @unittest.skipIf(np is None, 'numpy absent')
+    def test_batch_matches_single_series(self):
+        rng = random.Random(4)
+        series = {}
+        for i in range(300):
+            times = sorted(rng.sample(range(0, 90 * 86400, 3600), rng.randint(1, 40)))
+            slope = rng.uniform(-1, 3)
+            series[i] = ([1.79e9 + t for t in times], [rng.uniform(10, 60) + slope * t / 86400 for t in times])
+        times, _ = pad_series([t for t, _ in series.values()])
+        values, mask = pad_series([v for _, v in series.values()])
+        result = batch_saturation(times, values, mask)
+        for i, (t, v) in series.items():
+            expected = saturation_dates(list(zip(t, v)))
+            for threshold, date in expected.items():
+                crossing = result['crossing'][threshold][i]
+                if date is None:
+                    self.assertTrue(np.isnan(crossing))
+                else:
+                    want = datetime.fromisoformat(date).timestamp()
+                    self.assertAlmostEqual(crossing, want, delta=1.0)
+
+    @unittest.skipIf(np is None, 'numpy absent')
+    def test_rank_saturation_with_process_pool(self):
+        now = 1.79e9
+        series = {f'if{i}': ([now - 86400 * d for d in (3, 2, 1, 0)], [50 + i * k for k in range(4)])
+                  for i in range(40)}
+        serial = rank_saturation(series, now=now, workers=1)
+        self.assertEqual([r['key'] for r in serial[:3]], ['if39', 'if38', 'if37'])
+        self.assertIsNone(serial[-1]['days_to_80'])  # if0: tendance plate à 50 %
+        self.assertEqual(serial[0]['days_to_100'], 0.0)  # déjà saturée
+        if9 = next(r for r in serial if r['key'] == 'if9')
+        self.assertAlmostEqual(if9['days_to_80'], 3 / 9)
+        self.assertAlmostEqual(if9['days_to_100'], 23 / 9)
+        with mock.patch.object(predictive, 'POOL_MIN_SERIES', 10), \
+                mock.patch.object(predictive, 'POOL_CHUNK_SERIES', 8):
+            pooled = rank_saturation(series, now=now, top=10, workers=2)
+        self.assertEqual(pooled, serial[:10])
+
+
+class TestForecastCache(unittest.TestCase):
+    def test_lru_eviction_and_counters(self):
+        cache = ForecastCache(maxsize=2, ttl=None)
+        cache.put('a', 100, ('lin', 12), 1.0)
+        cache.put('b', 100, ('lin', 12), 2.0)
+        self.assertEqual(cache.get('a', 100, ('lin', 12)), (True, 1.0))  # 'a' devient récent
+        cache.put('c', 100, ('lin', 12), 3.0)  # évince 'b'
+        self.assertEqual(cache.get('b', 100, ('lin', 12)), (False, None))
+        self.assertEqual(cache.get('a', 100, ('lin', 24)), (False, None))  # autres paramètres
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['size']), (1, 2, 1, 2))
+        self.assertEqual(stats['hit_ratio'], round(1 / 3, 4))
+
+    def test_new_sample_invalidates_series(self):
+        cache = ForecastCache()
+        cache.put('a', 100, (), 'ancien')
+        cache.put('b', 100, (), 'autre')
+        self.assertEqual(cache.get('a', 160, ()), (False, None))  # nouvel échantillon: autre clé
+        cache.put('a', 160, (), 'nouveau')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()['invalidations'], 1)
+        calls = []
+        self.assertEqual(cache.cached('a', 160, (), lambda: calls.append(1)), 'nouveau')
+        self.assertEqual(cache.cached('c', 5, (), lambda: calls.append(1) or 'calculé'), 'calculé')
+        self.assertEqual(calls, [1])
+        self.assertEqual(cache.invalidate(['a', 'absent']), 1)
+        self.assertEqual(cache.get_many({'a': 160, 'b': 100}, ()), ({'b': 'autre'}, ['a']))
+
+    def test_ttl_expiry(self):
+        cache = ForecastCache(ttl=60)
+        with mock.patch.object(predictive.time, 'monotonic', return_value=1000.0):
+            cache.put('a', 1, (), 'v')
+        with mock.patch.object(predictive.time, 'monotonic', return_value=1059.0):
+            self.assertEqual(cache.get('a', 1, ()), (True, 'v'))
+        with mock.patch.object(predictive.time, 'monotonic', return_value=1061.0):
+            self.assertEqual(cache.get('a', 1, ()), (False, None))
+        self.assertEqual((cache.stats()['expirations'], len(cache)), (1, 0))
+        with self.assertRaises(ValueError):
+            ForecastCache(ttl=0)
+
+
+@unittest.skipIf(np is None, 'numpy absent')
+class TestPredictivePage(unittest.TestCase):
+    def setUp(self):
+        from app.timeseries import pipeline
+        self.pipeline_module = pipeline
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ['IPCM_INVENTORY_PATH'] = os.path.join(self.tmpdir.name, 'inv.json')
+        equipment_id = store.add_equipment({'name': 'ASR-DLA-01', 'location': 'Douala'})['id']
+        self.pipeline = pipeline.MetricPipeline()
+        self.equipment_id, self.octets, self.minute = equipment_id, 0, -5
+        for minute in range(0, 6 * 60 + 1, 5):
+            self.poll(minute)
+        self.previous, pipeline._PIPELINE = pipeline._PIPELINE, self.pipeline
+        self.client = app.test_client()
+
+    def poll(self, minute):
+        # Utilisation qui croît de 20 % à 50 % en six heures
+        rate = (0.2 + 0.3 * minute / 360) * 10 ** 9 / 8
+        self.octets += int(rate * 60 * (minute - self.minute))
+        self.minute = minute
+        row = {'equipment_id': self.equipment_id, 'ifIndex': 3, 'speed': 10 ** 9,
+               'in_octets': self.octets, 'out_octets': 0}
+        target = PollTarget('10.0.0.1', equipment_id=self.equipment_id)
+        self.pipeline.ingest([PollResult(target, {'interfaces': [row]})], 1792195200.0 + 60 * minute)
+
+    def tearDown(self):
+        self.pipeline_module._PIPELINE = self.previous
+        self.tmpdir.cleanup()
+        os.environ.pop('IPCM_INVENTORY_PATH', None)
+
+    def test_ranking_feeds_page(self):
+        rows = self.pipeline.saturation(tier='5m', now=1792195200.0 + 6 * 3600)
+        self.assertEqual(len(rows), 1)
+        self.assertAlmostEqual(rows[0]['slope_per_day'], 0.3 / 6 * 24 * 100, delta=2)
+        self.assertAlmostEqual(rows[0]['days_to_80'], 0.25, delta=0.02)
+        page = self.client.get('/predictive?tier=5m').get_data(as_text=True)
+        self.assertIn('ASR-DLA-01 · ifIndex 3', page)
+        self.assertIn('2026-10-17', page)
+        data = self.client.get('/api/predictive/saturation?tier=5m').get_json()
+        self.assertEqual(data['rows'][0]['date_100'], '2026-10-17')
+        self.assertEqual(self.client.get('/api/predictive/saturation?tier=1w').status_code, 400)
+        # Les débits collectés alimentent la capacité utilisée des agrégats par site
+        used = get_rollups().rollup('location')['Douala']['used_bps']
+        self.assertAlmostEqual(used, 0.5 * 10 ** 9, delta=10 ** 7)
+        self.assertIn('Aucun historique', self.client.get('/predictive?tier=1d').get_data(as_text=True))
+
+    def test_live_ranking_reads_online_regressions(self):
+        now = 1792195200.0 + 6 * 3600
+        with mock.patch.object(self.pipeline.store, 'series', side_effect=AssertionError('réajustement')):
+            rows = self.pipeline.saturation(now=now)
+        keys, slopes, intercepts = self.pipeline.forecasts.coeffs()
+        self.assertEqual((rows[0]['key'], rows[0]['slope_per_day']), (keys[0], slopes[0]))
+        self.assertEqual(rows[0]['samples'], 72)
+        self.assertAlmostEqual(rows[0]['slope_per_day'], 0.3 / 6 * 24 * 100, delta=2)
+        self.assertAlmostEqual(rows[0]['current'], 50, delta=1)
+        self.assertAlmostEqual(rows[0]['days_to_80'], 0.25, delta=0.02)
+        data = self.client.get('/api/predictive/saturation').get_json()
+        self.assertEqual((data['tier'], data['rows'][0]['date_80']), ('live', '2026-10-17'))
+        self.assertIn('ASR-DLA-01 · ifIndex 3', self.client.get('/predictive').get_data(as_text=True))
+
+    def test_ranking_is_cached_until_a_period_closes(self):
+        now = 1792195200.0 + 6 * 3600
+        first = self.pipeline.saturation(tier='5m', now=now)
+        self.assertEqual(self.pipeline.saturation(tier='5m', now=now), first)
+        self.assertEqual((self.pipeline.cache.hits, self.pipeline.cache.misses), (1, 1))
+        self.poll(363)  # période 6 h 00 encore ouverte: rien de nouveau à prévoir
+        self.pipeline.saturation(tier='5m', now=now)
+        self.assertEqual(self.pipeline.cache.hits, 2)
+        self.poll(365)  # clôt la période 6 h 00
+        again = self.pipeline.saturation(tier='5m', now=now)
+        self.assertEqual(self.pipeline.cache.misses, 2)
+        self.assertGreater(again[0]['last_time'], first[0]['last_time'])
+        self.assertEqual(len(self.pipeline.cache), 1)
+        metrics = self.client.get('/metrics').get_json()
+        self.assertEqual(metrics['forecast_cache']['hits'], 2)
+
+
+@unittest.skipIf(np is None, 'numpy absent')
+class TestPredictiveWithoutCollector(unittest.TestCase):
+    """Serveur web sans ordonnanceur: les pages lisent l'historique écrit par la collecte."""
+
+    def setUp(self):
+        from app.inventory.rollups import CapacityRollups
+        from app.inventory.interface_store import get_interface_backend
+        from app.inventory.store import get_backend
+        from app.timeseries import pipeline
+        from app.timeseries.segments import SegmentStore
+        self.pipeline_module = pipeline
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ['IPCM_INVENTORY_PATH'] = os.path.join(self.tmpdir.name, 'inv.json')
+        os.environ['IPCM_METRICS_DIR'] = os.path.join(self.tmpdir.name, 'metrics')
+        equipment_id = store.add_equipment({'name': 'ASR-DLA-01', 'location': 'Douala'})['id']
+        # Collecte d'un autre processus: ses agrégats de capacité ne sont pas ceux du serveur web
+        collector = pipeline.MetricPipeline(segments=SegmentStore(),
+                                            rollups=CapacityRollups(get_backend(), get_interface_backend()))
+        target, octets = PollTarget('10.0.0.1', equipment_id=equipment_id), 0
+        for minute in range(0, 6 * 60 + 1, 5):
+            octets += int((0.2 + 0.3 * minute / 360) * 10 ** 9 / 8 * 60 * 5)
+            row = {'equipment_id': equipment_id, 'ifIndex': 3, 'speed': 10 ** 9, 'in_octets': octets, 'out_octets': 0}
+            collector.ingest([PollResult(target, {'interfaces': [row]})], 1792195200.0 + 60 * minute)
+        collector.wait_persisted(timeout=10)
+        collector.persist(force=True)
+        self.previous, pipeline._PIPELINE = pipeline._PIPELINE, None
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.pipeline_module._PIPELINE = self.previous
+        self.pipeline_module._READERS.clear()
+        self.tmpdir.cleanup()
+        os.environ.pop('IPCM_INVENTORY_PATH', None)
+        os.environ.pop('IPCM_METRICS_DIR', None)
+
+    def test_pages_read_persisted_history(self):
+        page = self.client.get('/predictive?tier=5m').get_data(as_text=True)
+        self.assertIn('ASR-DLA-01 · ifIndex 3', page)
+        self.assertIsNone(self.pipeline_module.active_pipeline())
+        rows = self.client.get('/api/predictive/saturation?tier=5m').get_json()['rows']
+        self.assertEqual((len(rows), rows[0]['date_80']), (1, '2026-10-17'))
+        self.assertAlmostEqual(rows[0]['slope_per_day'], 0.3 / 6 * 24 * 100, delta=3)
+        # Sans régressions en continu, le niveau par défaut lit les agrégats 5 minutes
+        self.assertEqual(self.client.get('/api/predictive/saturation').get_json()['rows'], rows)
+        data = self.client.get('/api/reporting/percentiles?by=site').get_json()
+        self.assertEqual((data['windows'], data['rows'][0]['site']), (['2026-10'], 'Douala'))
+        self.assertEqual(data['rows'][0]['samples'], 71)  # moyennes 5 minutes closes (72 débits, dernière période ouverte)
+        used = get_rollups().rollup('location')['Douala']['used_bps']
+        self.assertAlmostEqual(used, 0.5 * 10 ** 9, delta=10 ** 7)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,124 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app import app
+from app.inventory import store
+from app.inventory.domains import DOMAINS, UNCLASSIFIED, domain_of, organize_by_domain
+from app.inventory.interface_store import apply_interface_mutations, get_interface_backend
+from app.inventory.rollups import DIMENSIONS, CapacityRollups, get_rollups, is_end_of_support
+
+GBPS = 10 ** 9
+
+
+class TestRollups(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ['IPCM_INVENTORY_PATH'] = os.path.join(self.tmpdir.name, 'inv.json')
+        os.environ['IPCM_INTERFACES_PATH'] = os.path.join(self.tmpdir.name, 'interfaces.json')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        os.environ.pop('IPCM_INVENTORY_PATH', None)
+        os.environ.pop('IPCM_INTERFACES_PATH', None)
+
+    def seed(self):
+        results = store.apply_mutations([
+            {'op': 'add', 'data': {'name': 'ASR-DLA-01', 'brand': 'Cisco', 'type': 'Routeur',
+                                   'location': 'Datacenter Douala', 'support_status': 'EoS 2027'}},
+            {'op': 'add', 'data': {'name': 'EX-YDE-02', 'brand': 'Juniper', 'type': 'Switch',
+                                   'location': 'Backbone Yaoundé', 'support_status': 'Support actif'}},
+            {'op': 'add', 'data': {'name': 'FW-03', 'brand': 'Fortinet', 'type': 'Firewall',
+                                   'location': 'Cœur Internet', 'support_status': 'Fin de support'}},
+        ])
+        ids = [r['id'] for r in results]
+        apply_interface_mutations(
+            [{'op': 'add', 'data': {'equipment_id': ids[0], 'ifIndex': i, 'speed': 10 * GBPS}} for i in (1, 2)]
+            + [{'op': 'add', 'data': {'equipment_id': ids[1], 'ifIndex': 1, 'speed': GBPS}}])
+        return ids
+
+    def assert_matches_rebuild(self, rollups):
+        fresh = CapacityRollups(store.get_backend(), get_interface_backend())
+        for dimension in DIMENSIONS:
+            self.assertEqual(rollups.rollup(dimension), fresh.rollup(dimension), dimension)
+        self.assertEqual(rollups.totals(), fresh.totals())
+
+    def test_classification(self):
+        self.assertEqual(domain_of({'location': 'Datacenter Douala'}), 'Datacenter')
+        self.assertEqual(domain_of({'name': 'SPINE-01'}), 'Fabric IP')
+        self.assertEqual(domain_of({'domain': 'backbone', 'location': 'Datacenter'}), 'Backbone')
+        self.assertEqual(domain_of({'name': 'ASR-DLA-01', 'location': 'Douala'}), UNCLASSIFIED)
+        self.assertTrue(is_end_of_support({'support_status': 'EoS 2025'}))
+        self.assertFalse(is_end_of_support({'support_status': 'Support actif'}))
+
+    def test_incremental_updates_match_rebuild(self):
+        rollups = get_rollups()
+        self.assertEqual(rollups.totals()['devices'], 0)
+        ids = self.seed()
+        with mock.patch.object(store.get_backend(), 'iter_items', side_effect=AssertionError('relecture')):
+            by_domain = rollups.rollup('domain')
+            self.assertEqual(by_domain['Datacenter'], {'devices': 1, 'eos': 1, 'ports': 2, 'capacity_bps': 20.0 * GBPS,
+                                                       'used_bps': 0.0, 'utilization': 0.0})
+            self.assertEqual(by_domain['Cœur Internet']['eos'], 1)
+            self.assertEqual(rollups.totals()['ports'], 3)
+            store.update_equipment(ids[0], {'location': 'Backbone Douala', 'support_status': 'Support actif'})
+            store.delete_equipment(ids[2])
+            apply_interface_mutations([{'op': 'update', 'id': 3, 'changes': {'speed': 10 * GBPS}},
+                                       {'op': 'delete', 'id': 1}])
+            by_domain = rollups.rollup('domain')
+            self.assertEqual(set(by_domain), {'Backbone'})
+            self.assertEqual(by_domain['Backbone']['devices'], 2)
+            self.assertEqual(by_domain['Backbone']['capacity_bps'], 20.0 * GBPS)
+            self.assertEqual(rollups.totals()['eos'], 0)
+        self.assert_matches_rebuild(rollups)
+
+    def test_usage_and_unnotified_writes(self):
+        ids = self.seed()
+        rollups = get_rollups()
+        rollups.rollup('brand')
+        tag = rollups.etag()
+        changed = rollups.record_usage([(ids[0], 1), (ids[0], 2), (ids[1], 1), (ids[0], 3)],
+                                       [4 * GBPS, 1 * GBPS, float('nan'), 2 * GBPS])
+        self.assertEqual(changed, 1)
+        cisco = rollups.rollup('brand')['Cisco']
+        self.assertEqual((cisco['used_bps'], cisco['utilization']), (7.0 * GBPS, 35.0))
+        rollups.record_usage([(ids[0], 3)], [0.0])
+        self.assertEqual(rollups.rollup('brand')['Cisco']['used_bps'], 5.0 * GBPS)
+        self.assertNotEqual(rollups.etag(), tag)
+        # Remplacement complet, non notifié: détecté par la version et reconstruit
+        store.save_inventory([{'id': ids[0], 'name': 'ASR-DLA-01', 'brand': 'Huawei'}])
+        self.assertEqual(set(rollups.rollup('brand')), {'Huawei'})
+        self.assertEqual(rollups.rollup('brand')['Huawei']['used_bps'], 5.0 * GBPS)  # débits conservés
+        self.assertEqual((rollups.totals()['devices'], rollups.totals()['ports']), (1, 2))
+
+    def test_sqlite_backend_notifies(self):
+        os.environ['IPCM_INVENTORY_PATH'] = os.path.join(self.tmpdir.name, 'inv.db')
+        ids = self.seed()
+        rollups = get_rollups()
+        self.assertEqual(rollups.totals()['devices'], 3)
+        with mock.patch.object(store.get_backend(), 'iter_items', side_effect=AssertionError('relecture')):
+            store.update_equipment(ids[1], {'type': 'Routeur'})
+            self.assertEqual(rollups.rollup('type')['Routeur']['devices'], 2)
+        self.assert_matches_rebuild(rollups)
+
+    def test_pages_read_rollups(self):
+        self.seed()
+        domains = organize_by_domain()
+        self.assertEqual(list(domains)[:len(DOMAINS)], list(DOMAINS))
+        self.assertEqual((domains['LAN']['devices'], domains['Backbone']['ports']), (0, 1))
+        data = self.client.get('/api/inventory/rollups?by=location').get_json()
+        self.assertEqual(data['groups']['Datacenter Douala']['capacity_bps'], 20.0 * GBPS)
+        self.assertEqual(data['totals']['devices'], 3)
+        self.assertEqual(self.client.get('/api/inventory/rollups?by=model').status_code, 400)
+        first = self.client.get('/dashboard')
+        self.assertIn('Capacité par domaine', first.get_data(as_text=True))
+        apply_interface_mutations([{'op': 'add', 'data': {'equipment_id': 3, 'ifIndex': 1, 'speed': GBPS}}])
+        again = self.client.get('/dashboard', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(again.status_code, 200)
+        self.assertIn('Capacité par site', self.client.get('/reporting').get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
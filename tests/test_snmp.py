@@ -1,8 +1,69 @@
 """
 Module d'exemple de test SNMP IPCM
 """
+import asyncio
+import bisect
+import os
+import tempfile
 import unittest
+from app.inventory import store
+from app.snmp import ber
 from app.snmp.collector import collect_interface_data
+from app.snmp.poller import FleetPoller, PollTarget, SnmpClient, poll_fleet, targets_from_inventory
+from app.snmp import tables
+from app.snmp.benchmark import percentile, run_benchmark
+from app.snmp.simulator import SimulatorOptions, SnmpSimulator
+
+SYS_NAME = '1.3.6.1.2.1.1.5.0'
+
+
+class _Responder(asyncio.DatagramProtocol):
+    """Agent minimal: répond aux GET/GETBULK après ``delay``, ignore les ``drop`` premières requêtes."""
+
+    def __init__(self, values, delay=0.0, drop=0, stats=None):
+        self.values, self.delay, self.drop = values, delay, drop
+        self.oids = sorted(ber.Oid(o) for o in values)
+        self.stats = stats if stats is not None else {}
+        for key in ('active', 'peak', 'requests'):
+            self.stats.setdefault(key, 0)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if self.drop:
+            self.drop -= 1
+            return
+        asyncio.get_running_loop().create_task(self._answer(ber.decode_message(data), addr))
+
+    async def _answer(self, request, addr):
+        self.stats['active'] += 1
+        self.stats['peak'] = max(self.stats['peak'], self.stats['active'])
+        await asyncio.sleep(self.delay)
+        self.stats['active'] -= 1
+        self.stats['requests'] += 1
+        if request.pdu_type == ber.GET_REQUEST:
+            varbinds = [(oid, self.values.get(str(oid), ber.NO_SUCH_OBJECT)) for oid, _ in request.varbinds]
+        else:
+            varbinds = []
+            cursors = [oid for oid, _ in request.varbinds]
+            for _ in range(request.error_index):
+                for i, cursor in enumerate(cursors):
+                    position = bisect.bisect_right(self.oids, cursor)
+                    if position < len(self.oids):
+                        cursors[i] = self.oids[position]
+                        varbinds.append((cursors[i], self.values[str(cursors[i])]))
+                    else:
+                        varbinds.append((cursor, ber.END_OF_MIB_VIEW))
+        self.transport.sendto(ber.encode_message(ber.SnmpMessage(
+            ber.RESPONSE, request.request_id, request.community, varbinds=varbinds)), addr)
+
+
+async def _serve(**options):
+    transport, protocol = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: _Responder(**options), local_addr=('127.0.0.1', 0))
+    return transport, transport.get_extra_info('sockname')[1]
+
 
 class TestSNMP(unittest.TestCase):
     def test_snmp_collect(self):
@@ -10,5 +71,186 @@ class TestSNMP(unittest.TestCase):
         result = collect_interface_data('127.0.0.1', 'public', '1.3.6.1.2.1.1.1.0')
         self.assertTrue(result is None or isinstance(result, dict))
 
+    def test_ber_round_trip(self):
+        message = ber.SnmpMessage(ber.RESPONSE, 42, b'public', varbinds=[
+            (ber.Oid('1.3.6.1.2.1.31.1.1.1.6.1'), ber.Counter64(2 ** 64 - 1)),
+            (ber.Oid('1.3.6.1.2.1.2.2.1.2.1'), b'GigabitEthernet0/1'),
+            (ber.Oid('1.3.6.1.2.1.2.2.1.8.1'), 1),
+            (ber.Oid('1.3.6.1.2.1.2.2.1.8.2'), ber.END_OF_MIB_VIEW),
+        ])
+        decoded = ber.decode_message(ber.encode_message(message))
+        self.assertEqual(decoded, message)
+        self.assertIsInstance(decoded.varbinds[0][1], ber.Counter64)
+        with self.assertRaises(ValueError):
+            ber.decode_message(ber.encode_message(message)[:-3])
+
+    def test_poll_results_retries_and_timeouts(self):
+        async def scenario():
+            ok, ok_port = await _serve(values={SYS_NAME: b'R1'})
+            flaky, flaky_port = await _serve(values={SYS_NAME: b'R2'}, drop=1)
+            silent, silent_port = await _serve(values={}, drop=10 ** 6)
+            targets = [PollTarget('127.0.0.1', port=ok_port, name='ok'),
+                       PollTarget('127.0.0.1', port=flaky_port, name='flaky'),
+                       PollTarget('127.0.0.1', port=silent_port, name='silent'),
+                       PollTarget('not-an-ip', name='invalid')]
+            try:
+                async with SnmpClient(timeout=0.2, retries=1) as client:
+                    results = [r async for r in FleetPoller(client).poll(targets, [SYS_NAME, '1.3.6.1.2.1.1.6.0'])]
+                    return results, client.stats
+            finally:
+                for transport in (ok, flaky, silent):
+                    transport.close()
+
+        results, stats = asyncio.run(scenario())
+        by_name = {r.target.name: r for r in results}
+        self.assertEqual(by_name['ok'].values, {SYS_NAME: b'R1'})
+        self.assertEqual(by_name['flaky'].values, {SYS_NAME: b'R2'})
+        self.assertIn('pas de réponse', by_name['silent'].error)
+        self.assertFalse(by_name['invalid'].ok)
+        # Les résultats arrivent au fil de l'eau: la cible muette termine en dernier
+        self.assertEqual(results[-1].target.name, 'silent')
+        self.assertEqual((stats['retries'], stats['timeouts']), (2, 1))
+
+    def test_unexpected_collector_error_is_a_failed_result(self):
+        async def collect(poller, target):
+            if target.name == 'bad':
+                raise KeyError('ifDescr')
+            return {'ok': True}
+
+        async def scenario():
+            async with SnmpClient() as client:
+                targets = [PollTarget('127.0.0.1', name='bad'), PollTarget('127.0.0.1', name='good')]
+                return [r async for r in FleetPoller(client).run(targets, collect)]
+
+        with self.assertLogs('app.snmp.poller', 'ERROR'):
+            results = {r.target.name: r for r in asyncio.run(scenario())}
+        self.assertTrue(results['good'].ok)
+        self.assertFalse(results['bad'].ok)
+        self.assertIn('KeyError', results['bad'].error)
+
+    def test_concurrency_limits(self):
+        oids = [f'1.3.6.1.2.1.1.9.1.2.{i}' for i in range(60)]
+
+        async def scenario(max_in_flight, max_per_device, devices):
+            stats = {'active': 0, 'peak': 0}
+            servers = [await _serve(values={o: 1 for o in oids}, delay=0.02, stats=stats) for _ in range(devices)]
+            try:
+                async with SnmpClient(timeout=2) as client:
+                    poller = FleetPoller(client, max_in_flight=max_in_flight, max_per_device=max_per_device)
+                    targets = [PollTarget('127.0.0.1', port=port) for _, port in servers]
+                    results = [r async for r in poller.poll(targets, oids)]
+            finally:
+                for transport, _ in servers:
+                    transport.close()
+            return results, stats['peak']
+
+        results, peak = asyncio.run(scenario(max_in_flight=64, max_per_device=1, devices=1))
+        self.assertEqual(len(results[0].values), 60)
+        self.assertEqual(peak, 1)
+        results, peak = asyncio.run(scenario(max_in_flight=4, max_per_device=3, devices=10))
+        self.assertTrue(all(r.ok for r in results))
+        self.assertLessEqual(peak, 4)
+
+    def test_getbulk_interface_walk(self):
+        values = {'1.3.6.1.2.1.1.5.0': b'SW1', '1.3.6.1.2.1.2.2.1.1.1': 1}
+        for port in range(1, 49):
+            values[f'{tables.IF_DESCR}.{port}'] = f'GigabitEthernet1/0/{port}'.encode()
+            values[f'{tables.IF_OPER_STATUS}.{port}'] = 1 if port % 2 else 2
+            values[f'{tables.IF_HIGH_SPEED}.{port}'] = ber.Gauge32(1000)
+            values[f'{tables.IF_HC_IN_OCTETS}.{port}'] = ber.Counter64(port * 10 ** 12)
+            values[f'{tables.IF_HC_OUT_OCTETS}.{port}'] = ber.Counter64(port)
+        values[f'{tables.IF_ALIAS}.1'] = b'uplink'
+        values['1.3.6.1.2.1.31.1.1.1.19.1'] = 0
+
+        async def scenario():
+            stats = {}
+            transport, port = await _serve(values=values, stats=stats)
+            try:
+                async with SnmpClient(timeout=1) as client:
+                    poller = FleetPoller(client)
+                    target = PollTarget('127.0.0.1', port=port, equipment_id=7)
+                    results = [r async for r in tables.poll_interfaces(poller, [target], max_repetitions=16)]
+            finally:
+                transport.close()
+            return results, stats['requests']
+
+        results, requests = asyncio.run(scenario())
+        rows = results[0].values['interfaces']
+        self.assertEqual(len(rows), 48)
+        self.assertEqual(rows[0], {'equipment_id': 7, 'name': 'GigabitEthernet1/0/1', 'ifIndex': 1,
+                                   'description': 'uplink', 'speed': 1_000_000_000, 'status': 'up',
+                                   'in_octets': 10 ** 12, 'out_octets': 1})
+        self.assertEqual(rows[47]['status'], 'down')
+        self.assertEqual(rows[47]['in_octets'], 48 * 10 ** 12)
+        # 48 lignes x 6 colonnes en 4 PDU (3 pages de 16 + fin de table)
+        self.assertEqual(requests, 4)
+
+    def test_simulator_counters_and_loss(self):
+        clock = {'now': 1000.0}
+        options = SimulatorOptions(ports=8, counter_rate=1000.0, loss=0.2, seed=3)
+
+        async def scenario():
+            async with SnmpSimulator(5, options, clock=lambda: clock['now']) as simulator:
+                async with SnmpClient(timeout=0.1, retries=5) as client:
+                    poller = FleetPoller(client)
+                    first = [r async for r in tables.poll_interfaces(poller, simulator.targets())]
+                    clock['now'] += 60
+                    second = [r async for r in tables.poll_interfaces(poller, simulator.targets())]
+                return first, second, simulator.stats, simulator.devices
+
+        first, second, stats, devices = asyncio.run(scenario())
+        self.assertTrue(all(r.ok for r in first + second))
+        self.assertGreater(stats['dropped'], 0)
+        before = {r.target.equipment_id: r.values['interfaces'] for r in first}
+        for result in second:
+            device = devices[result.target.equipment_id - 1]
+            self.assertEqual(len(result.values['interfaces']), 8)
+            for old, new in zip(before[result.target.equipment_id], result.values['interfaces']):
+                # Compteurs 64 bits: la différence modulo 2^64 suit le débit du port, bouclage compris
+                delta = (new['in_octets'] - old['in_octets']) % 2 ** 64
+                self.assertEqual(delta, int(device.rates_in[new['ifIndex'] - 1] * 60))
+
+    def test_simulator_wrong_community(self):
+        async def scenario():
+            async with SnmpSimulator(1) as simulator:
+                target = simulator.targets()[0]
+                async with SnmpClient(timeout=0.05, retries=0) as client:
+                    wrong = PollTarget(target.host, community='private', port=target.port)
+                    return [r async for r in FleetPoller(client).poll([target, wrong])]
+
+        results = {r.target.community: r for r in asyncio.run(scenario())}
+        self.assertEqual(results['public'].values['1.3.6.1.2.1.1.5.0'], b'SIM-00001')
+        self.assertFalse(results['private'].ok)
+
+    def test_benchmark(self):
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 50), 3)
+        self.assertEqual(percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 95), 10)
+        self.assertEqual((percentile(range(1, 101), 95), percentile(range(1, 101), 99)), (95, 99))
+        report = run_benchmark(40, SimulatorOptions(ports=24, latency=0.002), max_in_flight=16)
+        self.assertEqual((report['ok'], report['failed']), (40, 0))
+        self.assertEqual(report['interfaces'], 40 * 24)
+        # 24 lignes x 6 colonnes: 2 pages de 16 par équipement
+        self.assertEqual(report['pdus'], 80)
+        self.assertLessEqual(report['latency']['p50'], report['latency']['p99'])
+        # Garde-fou large: quelques dizaines d'équipements par seconde au minimum
+        self.assertGreater(report['devices_per_s'], 20)
+
+    def test_targets_from_inventory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.environ['IPCM_INVENTORY_PATH'] = os.path.join(tmpdir, 'inv.json')
+            try:
+                store.save_inventory([
+                    {'id': 1, 'name': 'R1', 'ip_address': '10.0.0.1'},
+                    {'id': 2, 'name': 'R2', 'ip_address': '', 'snmp_community': 'x'},
+                    {'id': 3, 'name': 'R3', 'ip_address': '10.0.0.3', 'snmp_community': 'secret'},
+                ])
+                targets = targets_from_inventory('orange')
+                results = poll_fleet([], timeout=0.1)
+            finally:
+                os.environ.pop('IPCM_INVENTORY_PATH', None)
+        self.assertEqual([(t.equipment_id, t.host, t.community) for t in targets],
+                         [(1, '10.0.0.1', 'orange'), (3, '10.0.0.3', 'secret')])
+        self.assertEqual(results, [])
+
 if __name__ == '__main__':
     unittest.main()
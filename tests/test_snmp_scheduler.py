@@ -0,0 +1,140 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from app import app
+from app.inventory import store
+from app.snmp.poller import FleetPoller, PollResult, PollTarget, SnmpClient
+from app.snmp.scheduler import (
+    MAX_BACKOFF_FACTOR, PollScheduler, active_scheduler_stats, classify_tier, schedule_from_inventory,
+)
+from app.snmp.simulator import SnmpSimulator
+
+
+async def _get_sysname(poller, target):
+    return await poller.get(target, ['1.3.6.1.2.1.1.5.0'])
+
+
+class TestPollScheduler(unittest.TestCase):
+    def test_classify_tier(self):
+        self.assertEqual(classify_tier({'name': 'ASBR_OCAM_01', 'type': 'ROUTEUR'}), 'core')
+        self.assertEqual(classify_tier({'name': 'SW-AGENCE', 'type': 'Switch', 'domain': 'LAN'}), 'access')
+        self.assertEqual(classify_tier({'name': 'PLANET-R1', 'type': 'Routeur'}), 'distribution')
+        self.assertEqual(classify_tier({'name': 'ASBR1', 'poll_tier': 'Access'}), 'access')
+
+    def test_schedule_from_inventory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.environ['IPCM_INVENTORY_PATH'] = os.path.join(tmpdir, 'inv.json')
+            try:
+                store.save_inventory([
+                    {'id': 1, 'name': 'ASBR1', 'ip_address': '10.0.0.1'},
+                    {'id': 2, 'name': 'CPE-2', 'ip_address': '10.0.0.2'},
+                    {'id': 3, 'name': 'R3', 'ip_address': 'n/a'},
+                ])
+                schedule = schedule_from_inventory()
+            finally:
+                os.environ.pop('IPCM_INVENTORY_PATH', None)
+        self.assertEqual([(t.equipment_id, i) for t, i in schedule], [(1, 60.0), (2, 900.0)])
+
+    def test_even_spread_and_jitter(self):
+        scheduler = PollScheduler(FleetPoller(SnmpClient()), _get_sysname, schedule=list, clock=lambda: 0.0, seed=1)
+        targets = [(PollTarget('10.0.0.%d' % i, equipment_id=i), 100.0) for i in range(1, 11)]
+        scheduler.sync(targets + [(PollTarget('10.0.1.1', equipment_id=99), 900.0)])
+        dues = sorted(entry.due for entry in scheduler._entries.values() if entry.interval == 100.0)
+        gaps = [round(b - a, 6) for a, b in zip(dues, dues[1:])]
+        self.assertEqual(gaps, [10.0] * 9)
+        self.assertLess(dues[0], 10.0)
+        # Gigue bornée autour du créneau, sans dérive d'un cycle à l'autre
+        entry = scheduler._entries[(1, '10.0.0.1', 161)]
+        slot = entry.slot
+        for cycle in range(1, 6):
+            due = scheduler.next_due(entry, now=0.0)
+            self.assertAlmostEqual(entry.slot, slot + cycle * 100.0)
+            self.assertLessEqual(abs(due - entry.slot), 10.0)
+        # Équipement retiré: plus planifié
+        scheduler.sync(targets[1:])
+        self.assertNotIn((1, '10.0.0.1', 161), scheduler._entries)
+        self.assertEqual(len(scheduler._entries), 9)
+
+    def test_backoff(self):
+        scheduler = PollScheduler(FleetPoller(SnmpClient()), _get_sysname, schedule=list, clock=lambda: 0.0,
+                                  jitter=0.0)
+        target = PollTarget('10.0.0.1', equipment_id=1)
+        scheduler.sync([(target, 60.0)])
+        entry = scheduler._entries[(1, '10.0.0.1', 161)]
+        gaps = []
+        for _ in range(6):
+            before = entry.slot
+            scheduler.record(entry, PollResult(target, error='timeout', timed_out=True))
+            scheduler.next_due(entry, now=0.0)
+            gaps.append(round(entry.slot - before, 6))
+        self.assertEqual(gaps, [60.0, 120.0, 240.0, 480.0, 60.0 * MAX_BACKOFF_FACTOR, 60.0 * MAX_BACKOFF_FACTOR])
+        self.assertEqual(scheduler.stats()['backed_off'], 1)
+        scheduler.record(entry, PollResult(target, values={'x': 1}))
+        self.assertEqual(entry.backoff, 1)
+        self.assertEqual(scheduler.stats()['timeouts'], 6)
+
+    def test_crashing_collect_keeps_device_scheduled(self):
+        class CrashingPoller(FleetPoller):
+            async def collect_one(self, target, collect):
+                raise RuntimeError('boom')
+
+        async def scenario():
+            threads = []
+            target = PollTarget('10.0.0.1', equipment_id=1)
+            scheduler = PollScheduler(CrashingPoller(SnmpClient()), _get_sysname, schedule=lambda: [(target, 0.05)],
+                                      on_result=lambda r: threads.append((r.ok, threading.get_ident())),
+                                      jitter=0.0)
+            stop = asyncio.Event()
+            runner = asyncio.create_task(scheduler.run(stop))
+            await asyncio.sleep(0.3)
+            stop.set()
+            await runner
+            return threads, scheduler._entries[(1, '10.0.0.1', 161)]
+
+        with self.assertLogs('app.snmp.scheduler', 'ERROR'):
+            calls, entry = asyncio.run(scenario())
+        self.assertGreaterEqual(len(calls), 2)  # toujours planifié après l'exception
+        self.assertFalse(any(ok for ok, _ in calls))
+        self.assertNotIn(threading.get_ident(), {ident for _, ident in calls})
+        self.assertFalse(entry.running)
+        self.assertGreater(entry.backoff, 1)
+
+    def test_run_against_simulator(self):
+        async def scenario():
+            results, snapshots = [], []
+            async with SnmpSimulator(6) as simulator:
+                schedule = [(t, 0.3) for t in simulator.targets()]
+                schedule.append((PollTarget('127.0.0.1', port=9, equipment_id=999), 0.3))
+                async with SnmpClient(timeout=0.05, retries=0) as client:
+                    scheduler = PollScheduler(FleetPoller(client), _get_sysname, schedule=lambda: schedule,
+                                              on_result=results.append, seed=2)
+                    stop = asyncio.Event()
+                    runner = asyncio.create_task(scheduler.run(stop))
+                    await asyncio.sleep(1.0)
+                    snapshots.append(active_scheduler_stats())
+                    with app.test_client() as http:
+                        snapshots.append(http.get('/metrics').get_json())
+                    stop.set()
+                    await runner
+            return results, snapshots, active_scheduler_stats()
+
+        results, (stats, metrics), after = asyncio.run(scenario())
+        counts = {}
+        for result in results:
+            counts[result.target.equipment_id] = counts.get(result.target.equipment_id, 0) + 1
+        for device in range(1, 7):
+            self.assertGreaterEqual(counts[device], 3)
+        # L'équipement muet recule: moins de collectes que les autres
+        self.assertLess(counts[999], min(counts[d] for d in range(1, 7)))
+        self.assertEqual(stats['devices'], 7)
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertGreater(stats['polls'], 18)
+        self.assertLess(stats['lag_s']['max'], 0.2)
+        self.assertEqual(metrics['snmp_scheduler']['devices'], 7)
+        self.assertIsNone(after)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,248 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app.inventory.utilization import CounterRateEngine
+
+try:
+    import numpy as np
+    from app.timeseries import segments as segments_module
+    from app.timeseries.segments import SegmentStore, write_segment
+    from app.timeseries.store import TimeSeriesStore, nan_percentile
+except Exception:
+    np = None
+
+DAY = 86400
+
+
+@unittest.skipIf(np is None, 'numpy absent')
+class TestTimeSeriesStore(unittest.TestCase):
+    def test_five_minute_rollup(self):
+        store = TimeSeriesStore(capacity=4)
+        samples = [10, 20, 30, 40, 50]
+        for i, value in enumerate(samples):
+            store.append('a', value, 60 * i)
+        self.assertEqual(len(store.series('a')['time']), 0)  # période encore ouverte
+        store.append('a', 0, 300)
+        rows = store.series_rows('a')
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['time'], 0)
+        self.assertEqual((rows[0]['min'], rows[0]['avg'], rows[0]['max'], rows[0]['count']), (10, 30, 50, 5))
+        self.assertAlmostEqual(rows[0]['p95'], np.percentile(samples, 95), places=4)
+
+    def test_hourly_and_daily_rollups(self):
+        store = TimeSeriesStore(capacity=2)
+        rng = np.random.default_rng(3)
+        values = rng.random(DAY // 60 + 1) * 100
+        for i, value in enumerate(values):
+            store.append_batch(['a', 'b'], [value, 2 * value], 60 * i)
+        fine = store.series('a', '5m')
+        self.assertEqual(len(fine['time']), 288)
+        hour = store.series('a', '1h')
+        self.assertEqual(len(hour['time']), 24)
+        first = values[:60]
+        self.assertAlmostEqual(hour['avg'][0], first.mean(), places=3)
+        self.assertAlmostEqual(hour['min'][0], first.min(), places=3)
+        self.assertAlmostEqual(hour['max'][0], first.max(), places=3)
+        self.assertAlmostEqual(hour['p95'][0], np.percentile(fine['avg'][:12], 95), places=3)
+        day = store.series('b', '1d')
+        self.assertEqual((list(day['time']), list(day['count'])), ([0.0], [DAY // 60]))
+        self.assertAlmostEqual(day['avg'][0], 2 * values[:-1].mean(), places=2)
+        self.assertAlmostEqual(day['p95'][0], np.percentile(store.series('b')['avg'], 95), places=2)
+        self.assertEqual(len(store.series('a', '1h', start=3600, end=7200)['time']), 2)
+
+    def test_bounded_memory_and_ring_wrap(self):
+        store = TimeSeriesStore(capacity=8, retention={'5m': 288, '1h': 24, '1d': 3})
+        before = store.memory_bytes()
+        for step in range(0, 5 * DAY + 1, 300):
+            store.append_batch(range(8), np.full(8, float(step // DAY)), step)
+        self.assertEqual(store.memory_bytes(), before)
+        self.assertEqual(list(store.series(0, '1d')['avg']), [2.0, 3.0, 4.0])
+        self.assertEqual(len(store.series(0, '1h')['time']), 24)
+        self.assertEqual(store.series(0, '1h')['time'][-1], 5 * DAY - 3600)
+        times, values = store.raw(0)
+        self.assertEqual((len(times), times[-1], values[-1]), (32, 5 * DAY, 5.0))
+
+    def test_skips_nan_and_stale_samples(self):
+        store = TimeSeriesStore(capacity=1)
+        self.assertEqual(store.append_batch(['a', 'b'], [1.0, float('nan')], 100), 1)
+        self.assertEqual(store.append_batch(['a'], [2.0], 100), 0)
+        self.assertEqual(len(store), 2)  # la série grandit au-delà de la capacité initiale
+        self.assertEqual(list(store.raw('a')[1]), [1.0])
+        store.forget(['a'])
+        self.assertEqual(len(store.raw('a')[0]), 0)
+        with self.assertRaises(ValueError):
+            TimeSeriesStore(retention={'5m': 12})
+
+    def test_append_rates(self):
+        engine, store = CounterRateEngine(), TimeSeriesStore()
+        row = {'equipment_id': 1, 'ifIndex': 2, 'speed': 8000, 'in_octets': 0, 'out_octets': 0}
+        store.append_rates(engine.update([row], 0), 0)
+        store.append_rates(engine.update([dict(row, in_octets=250)], 1), 1)
+        self.assertEqual(store.keys(), [(1, 2)])
+        self.assertEqual(list(store.raw((1, 2))[1]), [25.0])
+
+    def test_nan_percentile(self):
+        values = np.random.default_rng(1).random((200, 9))
+        values[values < 0.3] = np.nan
+        values[0] = np.nan
+        with np.errstate(all='ignore'), self.assertWarns(RuntimeWarning):
+            expected = np.nanpercentile(values, 95, axis=1)
+        np.testing.assert_allclose(nan_percentile(values, 95), expected)
+
+
+@unittest.skipIf(np is None, 'numpy absent')
+class TestSegments(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+
+    def test_write_and_query_zero_copy(self):
+        times = np.arange(0, 1000, 10, dtype=np.float64)
+        series = {(1, 1): {'time': times, 'value': times / 10}, (1, 2): {'time': times[:3], 'value': [1, 2, 3]}}
+        SegmentStore(self.dir).write('raw', series)
+        store = SegmentStore(self.dir)  # redémarrage: seuls les index sont relus
+        self.assertEqual(store.last_time('raw'), 990)
+        data = store.query((1, 1), start=100, end=200)
+        self.assertEqual(list(data['time']), [float(t) for t in range(100, 201, 10)])
+        self.assertEqual(list(data['value']), [float(v) for v in range(10, 21)])
+        self.assertIsInstance(data['value'].base, np.memmap)
+        self.assertFalse(data['time'].flags.writeable)
+        self.assertEqual(list(store.query((1, 2))['value']), [1.0, 2.0, 3.0])
+        self.assertEqual(len(store.query((9, 9))['time']), 0)
+
+    def test_query_across_segments(self):
+        store = SegmentStore(self.dir)
+        store.write('raw', {'a': {'time': [0, 10], 'value': [1, 2]}})
+        store.write('raw', {'a': {'time': [20, 30], 'value': [3, 4]}, 'b': {'time': [25], 'value': [9]}})
+        self.assertEqual([len(s) for s in store.segments('raw')], [1, 2])
+        self.assertEqual(list(store.query('a', start=5)['value']), [2.0, 3.0, 4.0])
+        self.assertEqual(list(store.query('b', start=5)['time']), [25.0])
+
+    def test_write_rollups_incrementally(self):
+        memory = TimeSeriesStore(capacity=2)
+        for step in range(0, 3601, 60):
+            memory.append_batch([('r1', 1), ('r1', 2)], [step / 60, 1.0], step)
+        disk = SegmentStore(self.dir)
+        self.assertEqual(len(disk.write_rollups(memory, '5m', end=1500)), 2)
+        self.assertEqual(len(disk.write_rollups(memory, '5m').keys()), 2)
+        self.assertIsNone(disk.write_rollups(memory, '5m'))
+        reloaded = SegmentStore(self.dir)
+        data = reloaded.query(('r1', 1), '5m')
+        expected = memory.series(('r1', 1), '5m')
+        for name in ('time', 'min', 'avg', 'max', 'p95'):
+            np.testing.assert_allclose(data[name], expected[name], rtol=1e-6)
+
+    def test_write_rollups_tracks_each_series(self):
+        # 'core' collecté chaque minute, 'access' toutes les 15 minutes: ses périodes se closent plus tard
+        memory, disk = TimeSeriesStore(capacity=2), SegmentStore(self.dir)
+        for step in range(0, 1201, 60):
+            memory.append('core', 1.0, step)
+        memory.append_batch(['access'], [2.0], [0])
+        memory.append_batch(['access'], [3.0], [900])
+        disk.write_rollups(memory, '5m')
+        memory.append('access', 4.0, 1800)
+        disk.write_rollups(memory, '5m')
+        self.assertIsNone(disk.write_rollups(memory, '5m'))
+        for store in (disk, SegmentStore(self.dir)):
+            self.assertEqual(list(store.query('access', '5m')['time']), [0.0, 900.0])
+            self.assertEqual(store.last_times('5m'), {'core': 900.0, 'access': 900.0})
+        self.assertEqual(list(disk.query('core', '5m')['time']), [0.0, 300.0, 600.0, 900.0])
+
+    def test_pipeline_persists_history_beyond_the_rings(self):
+        from app.snmp.poller import PollResult, PollTarget
+        from app.timeseries.pipeline import MetricPipeline
+        target, key = PollTarget('10.0.0.1', equipment_id=1), (1, 1)
+        pipe = MetricPipeline(store=TimeSeriesStore(capacity=1), segments=SegmentStore(self.dir))
+        for minute in range(0, 26 * 60 + 1, 5):  # 26 h: les anneaux 5 minutes (24 h) ont bouclé
+            row = {'equipment_id': 1, 'ifIndex': 1, 'speed': 8000, 'in_octets': 500 * 60 * minute, 'out_octets': 0}
+            pipe.ingest([PollResult(target, {'interfaces': [row]})], 60 * minute)
+        self.assertTrue(pipe.wait_persisted(timeout=10))
+        self.assertGreater(len(os.listdir(self.dir)), 0)  # écrit au fil de la collecte, sans appel explicite
+        pipe.persist(force=True)
+        memory = pipe.store.series(key, '5m')['time']
+        history = pipe.history(key, '5m')
+        self.assertEqual(len(memory), 288)
+        self.assertEqual(list(history['time']), list(np.arange(300.0, memory[-1] + 1, 300)))
+        np.testing.assert_allclose(history['avg'], 50.0, rtol=1e-5)
+        self.assertEqual(len(pipe.history(key, '5m', start=memory[0])['time']), 288)
+        self.assertEqual(pipe.saturation(tier='5m')[0]['samples'], len(history['time']))
+        # Redémarrage: l'historique est relu depuis les segments
+        restarted = MetricPipeline(segments=SegmentStore(self.dir))
+        self.assertEqual(list(restarted.history(key, '5m')['time']), list(history['time']))
+
+    def test_ingest_does_not_wait_for_disk_writes(self):
+        import threading
+        from app.timeseries.pipeline import MetricPipeline
+        release, started = threading.Event(), threading.Event()
+
+        def slow_write(*args, **kwargs):
+            started.set()
+            release.wait(10)
+
+        disk = SegmentStore(self.dir)
+        pipe = MetricPipeline(store=TimeSeriesStore(capacity=1), segments=disk)
+        with mock.patch.object(disk, 'write_rollups', side_effect=slow_write):
+            pipe.ingest([], 0)
+            self.assertTrue(started.wait(10))
+            pipe.ingest([], 3600)  # écriture en cours: pas de second thread, pas d'attente
+            self.assertFalse(pipe.wait_persisted(timeout=0.01))
+            release.set()
+            self.assertTrue(pipe.wait_persisted(timeout=10))
+
+    def test_compaction_merges_closed_days(self):
+        store = SegmentStore(self.dir)
+        for hour in range(0, 24 * 3, 6):  # trois jours, quatre segments par jour
+            t = 3600.0 * hour
+            store.write('5m', {'a': {'time': [t, t + 300], 'value': [hour, hour + 1]},
+                               ('b', hour // 6 % 2): {'time': [t], 'value': [1]}})
+        expected = store.query('a', '5m')
+        self.assertEqual(store.compact('5m'), 2)  # le troisième jour reste ouvert
+        self.assertEqual(len(store.segments('5m')), 2 + 4)
+        for reader in (store, SegmentStore(self.dir)):
+            np.testing.assert_array_equal(reader.query('a', '5m')['time'], expected['time'])
+            np.testing.assert_array_equal(reader.query('a', '5m')['value'], expected['value'])
+            self.assertEqual(len(reader.query(('b', 1), '5m')['time']), 6)
+        self.assertEqual(store.compact('5m'), 0)
+        self.assertEqual(len([n for n in os.listdir(self.dir) if n.endswith('.seg')]), 6)
+
+    def test_interrupted_compaction_is_resumed(self):
+        store = SegmentStore(self.dir)
+        for day in range(3):
+            for t in (day * DAY, day * DAY + 3600):
+                store.write('5m', {'a': {'time': [t], 'value': [t]}})
+        with mock.patch.object(segments_module, '_remove'):  # interruption avant la suppression des sources
+            self.assertEqual(store.compact('5m'), 2)
+        self.assertEqual(len([n for n in os.listdir(self.dir) if n.endswith('.seg')]), 8)
+        restarted = SegmentStore(self.dir)  # les sources remplacées sont ignorées...
+        self.assertEqual(len(restarted.segments('5m')), 4)
+        self.assertEqual(len(restarted.query('a', '5m')['time']), 6)
+        restarted.compact('5m')  # ... puis supprimées
+        self.assertEqual(len([n for n in os.listdir(self.dir) if n.endswith('.seg')]), 4)
+
+    def test_indexes_load_lazily_and_stay_bounded(self):
+        store = SegmentStore(self.dir)
+        for i in range(6):
+            store.write('raw', {'a': {'time': [10 * i], 'value': [i]}, 'b': {'time': [10 * i], 'value': [i]}})
+        store.last_times('raw')  # marques enregistrées à chaque écriture
+        reader = SegmentStore(self.dir)
+        self.assertTrue(all(s._series is None for s in reader.segments('raw')))
+        self.assertEqual(reader.last_times('raw'), {'a': 50.0, 'b': 50.0})
+        self.assertTrue(all(s._series is None for s in reader.segments('raw')))  # lues dans le fichier de marques
+        with mock.patch.object(segments_module, 'MAX_LOADED_SEGMENTS', 2):
+            self.assertEqual(list(reader.query('a', start=15)['value']), [2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(sum(s._series is not None for s in reader.segments('raw')), 2)
+
+    def test_rejects_bad_input_and_foreign_files(self):
+        with self.assertRaises(ValueError):
+            write_segment(self.dir, 'raw', {'a': {'time': [2, 1], 'value': [0, 0]}})
+        with self.assertRaises(ValueError):
+            write_segment(self.dir, 'raw', {'a': {'time': [1, 2], 'value': [0]}})
+        with open(os.path.join(self.dir, 'raw-0-1.idx.json'), 'w') as f:
+            f.write('{"format": 0}')
+        self.assertEqual(SegmentStore(self.dir).segments('raw'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
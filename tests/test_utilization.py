@@ -0,0 +1,103 @@
+import math
+import random
+import unittest
+from app.inventory.interfaces import Interface
+from app.inventory.utilization import CounterRateEngine, calculate_utilization
+from app.snmp.poller import PollResult, PollTarget
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+GBPS = 1_000_000_000
+
+
+def _row(index, in_octets, out_octets, speed=GBPS, **extra):
+    return {'equipment_id': 1, 'ifIndex': index, 'in_octets': in_octets, 'out_octets': out_octets,
+            'speed': speed, **extra}
+
+
+@unittest.skipIf(np is None, 'numpy absent')
+class TestCounterRateEngine(unittest.TestCase):
+    def test_rates_and_utilization(self):
+        engine = CounterRateEngine()
+        first = engine.update([_row(1, 10 ** 9, 0)], timestamp=0)
+        self.assertEqual(first.rows()[0]['status'], 'first')
+        self.assertIsNone(first.rows()[0]['in_bps'])
+        batch = engine.update([_row(1, 10 ** 9 + 7_500_000_000, 750_000_000)], timestamp=60)
+        row = batch.rows()[0]
+        self.assertEqual(row['status'], 'ok')
+        self.assertAlmostEqual(row['in_bps'], 1e9)
+        self.assertAlmostEqual(row['in_utilization'], 100.0)
+        self.assertAlmostEqual(row['out_utilization'], 10.0)
+        self.assertAlmostEqual(float(batch.utilization[0]), 100.0)
+
+    def test_counter_wrap_and_reset(self):
+        engine = CounterRateEngine()
+        engine.update([_row(1, 2 ** 32 - 1000, 0, counter_bits=32),
+                       _row(2, 2 ** 64 - 1000, 0),
+                       _row(3, 5 * 10 ** 12, 0),
+                       _row(4, 0, 0, speed=10 ** 6)], timestamp=100)
+        batch = engine.update([_row(1, 1000, 0, counter_bits=32),
+                               _row(2, 1000, 0),
+                               _row(3, 10 ** 6, 0),
+                               _row(4, 10 ** 9, 0, speed=10 ** 6)], timestamp=110)
+        rows = batch.rows()
+        # Bouclage 32 bits: 2000 octets en 10 s
+        self.assertEqual((rows[0]['status'], rows[0]['in_bps']), ('ok', 1600.0))
+        # Compteur 64 bits qui décroît: remise à zéro, pas de débit
+        self.assertEqual(rows[1]['status'], 'reset')
+        self.assertEqual(rows[2]['status'], 'reset')
+        # Débit impossible pour un lien à 1 Mbit/s
+        self.assertEqual(rows[3]['status'], 'reset')
+        # L'échantillon remis à zéro sert de nouvelle référence
+        batch = engine.update([_row(3, 10 ** 6 + 1250, 0)], timestamp=120)
+        self.assertEqual(batch.rows()[0]['in_bps'], 1000.0)
+
+    def test_stale_sample_keeps_reference(self):
+        engine = CounterRateEngine()
+        engine.update([_row(1, 1000, 0)], timestamp=10)
+        self.assertEqual(engine.update([_row(1, 2000, 0)], timestamp=10).rows()[0]['status'], 'stale')
+        self.assertEqual(engine.update([_row(1, 2000, 0)], timestamp=20).rows()[0]['in_bps'], 800.0)
+
+    def test_vectorized_matches_reference(self):
+        rng = random.Random(5)
+        engine = CounterRateEngine(capacity=16)
+        count = 5000
+        before = [(rng.randrange(2 ** 64), rng.randrange(2 ** 64)) for _ in range(count)]
+        deltas = [(rng.randrange(10 ** 10), rng.randrange(10 ** 10)) for _ in range(count)]
+        engine.update([_row(i, a, b, speed=10 * GBPS) for i, (a, b) in enumerate(before)], timestamp=0)
+        batch = engine.update([_row(i, (a + da) % 2 ** 64, (b + db) % 2 ** 64, speed=10 * GBPS)
+                               for i, ((a, b), (da, db)) in enumerate(zip(before, deltas))], timestamp=300)
+        self.assertEqual(len(engine), count)
+        for i in (0, 17, count - 1):
+            da, db = deltas[i]
+            wrapped = before[i][0] + da >= 2 ** 64 or before[i][1] + db >= 2 ** 64
+            if wrapped:
+                self.assertEqual(batch.rows()[i]['status'], 'reset')
+                continue
+            self.assertTrue(math.isclose(batch.in_bps[i], da * 8 / 300))
+            self.assertTrue(math.isclose(batch.out_utilization[i], db * 8 / 300 / (10 * GBPS) * 100))
+
+    def test_update_from_results(self):
+        engine = CounterRateEngine()
+        target = PollTarget('10.0.0.1', equipment_id=1)
+        engine.update_from_results([PollResult(target, {'interfaces': [_row(1, 0, 0)]}),
+                                    PollResult(target, error='timeout', timed_out=True)], timestamp=0)
+        batch = engine.update_from_results([PollResult(target, {'interfaces': [_row(1, 125, 0)]})], timestamp=1)
+        self.assertEqual(batch.keys, [(1, 1)])
+        self.assertEqual(batch.rows()[0]['in_bps'], 1000.0)
+
+    def test_calculate_utilization(self):
+        engine = CounterRateEngine()
+        interface = Interface(equipment_id=3, ifIndex=1, speed=8000, in_octets=0, out_octets=0)
+        self.assertIsNone(calculate_utilization(interface, engine, timestamp=0))  # deux échantillons nécessaires
+        interface.out_octets = 500
+        self.assertEqual(calculate_utilization(interface, engine, timestamp=1), 50.0)
+        # Sans moteur: pas d'échantillon précédent, donc pas d'utilisation (et pas de calcul sur les cumuls)
+        self.assertIsNone(calculate_utilization(interface))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app.inventory import workbook_cache
+from app.inventory.workbook_cache import load_workbook_snapshot
+
+try:
+    import openpyxl
+except Exception:
+    openpyxl = None
+
+
+@unittest.skipIf(openpyxl is None, 'openpyxl absent')
+class TestWorkbookCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmpdir.name, 'cache')
+        self.path = os.path.join(self.tmpdir.name, 'capacity.xlsx')
+        self._write(rows=3)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, rows):
+        wb = openpyxl.Workbook()
+        first = wb.active
+        first.title = 'Routeurs'
+        first.append(['IP Capacity Management'])
+        first.append(['Nom du réseau', 'IP de management', None, 'Modèle'])
+        for i in range(rows):
+            first.append([f'R{i}', f'10.0.0.{i}', None, 'NE40E'])
+        second = wb.create_sheet('Switches')
+        second.append(['Nom', 'Nom', None])
+        second.append(['SW1', 'bis', None])
+        second.append([None, None, None])
+        wb.save(self.path)
+
+    def test_parse_all_sheets(self):
+        snapshot = load_workbook_snapshot(self.path, cache_dir=self.cache_dir)
+        self.assertEqual(list(snapshot.sheets), ['Routeurs', 'Switches'])
+        routers = snapshot.sheet()
+        self.assertEqual(routers.header, ['Nom du réseau', 'IP de management', 'Modèle'])
+        self.assertEqual(routers.header_row, 2)
+        self.assertEqual(len(routers), 3)
+        self.assertEqual(routers.column('IP de management')[2], '10.0.0.2')
+        self.assertEqual(next(routers.iter_rows())['Modèle'], 'NE40E')
+        switches = snapshot.sheet('Switches')
+        self.assertEqual(switches.header, ['Nom', 'Nom.1'])
+        self.assertEqual(len(switches), 1)
+
+    def test_snapshot_reused_until_content_changes(self):
+        first = load_workbook_snapshot(self.path, workers=1, cache_dir=self.cache_dir)
+        with mock.patch.object(workbook_cache, '_parse_workbook') as parse:
+            again = load_workbook_snapshot(self.path, cache_dir=self.cache_dir)
+            parse.assert_not_called()
+        self.assertEqual(again.digest, first.digest)
+        self.assertEqual(again.sheet().columns, first.sheet().columns)
+
+        self._write(rows=5)
+        changed = load_workbook_snapshot(self.path, workers=1, cache_dir=self.cache_dir)
+        self.assertNotEqual(changed.digest, first.digest)
+        self.assertEqual(len(changed.sheet()), 5)
+        # L'instantané du contenu précédent est supprimé
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_failed_snapshot_write_leaves_no_temp_file(self):
+        for error in (OSError('disque plein'), workbook_cache.pickle.PicklingError('non sérialisable')):
+            with mock.patch.object(workbook_cache.pickle, 'dump', side_effect=error):
+                snapshot = load_workbook_snapshot(self.path, workers=1, cache_dir=self.cache_dir)
+            self.assertEqual(len(snapshot.sheet()), 3)
+            self.assertEqual(os.listdir(self.cache_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()